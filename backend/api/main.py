@@ -1,22 +1,39 @@
 import os
-import sqlite3
 import json
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import Body, FastAPI, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List
 from datetime import datetime
 import pandas as pd
 
 # ------------------------------
 # External service imports
 # ------------------------------
-from explain_service.explain import compute_shap_attributions, nl_explanation, get_model
-from what_if_engine.engine import WhatIfEngine
-from auditor_engine.core import EthicalAIAuditor
-from consent.policy import update_consent, get_user_consents
-from verifiable.merkle import merkle_root, sha256
-from auditor_engine.twin import save_twin, get_twin
-from auditor_engine.appeals import create_appeal, list_appeals
+from explain_service.explain import (
+    compute_shap_attributions_batch, get_attributor, get_model,
+    nl_explanation, nl_explanations,
+)
+from explain_service.cache import ResultCache
+from explain_service.registry import ModelRegistry, RoutingStore, VersionExists
+from auditor_engine.incremental import IncrementalAuditor
+from auditor_engine.drift.windows import DriftMonitor
+from consent.policy import CURRENT as CONSENT_CACHE, current_consents, denied_features, iter_user_consents, update_consent
+from verifiable.merkle import merkle_root, sha256, verify_consistency, verify_inclusions
+from verifiable.accumulator import MerkleLog
+from verifiable.epochs import EpochAnchorer
+from auditor_engine.twin import (
+    PatchError, VersionConflict, add_annotation, get_twin_versioned, iter_annotations, patch_twin, save_twin,
+)
+from auditor_engine.receipts import ReceiptService
+from auditor_engine.appeals import create_appeal, iter_appeals, list_appeals
 from auditor_engine.zk import generate_zk_proof
+from auditor_engine.replay import shadow_replay
+from storage.sqlite import query_one, close_all
+from storage.migrations import migrate
+from storage.pagination import DEFAULT_LIMIT, MAX_LIMIT, iter_rows, ndjson, next_cursor
+from storage.archive import LedgerArchive
+from storage.writebehind import WriteBehindLogger
 
 
 # ============================================================
@@ -28,64 +45,23 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))   # api/
 DB_ACTIONS = os.path.join(BASE_DIR, "action_logs.db")
 RECEIPTS_DB = os.path.join(BASE_DIR, "receipts.db")
 INCIDENTS_DB = os.path.join(BASE_DIR, "incidents.db")
+MODELS_DB = os.path.join(BASE_DIR, "models.db")
+ARCHIVE_DIR = os.path.join(BASE_DIR, "archive")
 
 
 # ============================================================
 # INIT DATABASES
 # ============================================================
 def init_actions_db():
-    conn = sqlite3.connect(DB_ACTIONS)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS action_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT,
-            inputs TEXT,
-            output TEXT,
-            explanation TEXT,
-            model_version TEXT,
-            created_at TEXT,
-            hash TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    migrate(DB_ACTIONS, "actions")
 
 
 def init_receipts_db():
-    conn = sqlite3.connect(RECEIPTS_DB)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS receipts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            action_rowid INTEGER,
-            user_id TEXT,
-            summary TEXT,
-            reasons TEXT,
-            used_data TEXT,
-            alternatives TEXT,
-            audit_anchor TEXT,
-            timestamp TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    migrate(RECEIPTS_DB, "receipts")
 
 
 def init_incidents_db():
-    conn = sqlite3.connect(INCIDENTS_DB)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS incidents (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            test TEXT,
-            value REAL,
-            severity TEXT,
-            created_at TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    migrate(INCIDENTS_DB, "incidents")
 
 
 init_actions_db()
@@ -96,9 +72,73 @@ init_incidents_db()
 # ============================================================
 # MODEL + SERVICES
 # ============================================================
-MODEL = get_model()
-WHATIF = WhatIfEngine(MODEL)
-AUDITOR = EthicalAIAuditor()
+# decisions past the retention window live in date-partitioned columnar files
+LEDGER_ARCHIVE = LedgerArchive(DB_ACTIONS, ARCHIVE_DIR)
+INCREMENTAL_AUDITOR = IncrementalAuditor(DB_ACTIONS, archive=LEDGER_ARCHIVE)
+# hourly feature histograms for drift against a reference window
+DRIFT_MONITOR = DriftMonitor(DB_ACTIONS, archive=LEDGER_ARCHIVE)
+
+# append-only Merkle tree over action hashes; seeded from any rows logged before it existed
+MERKLE_LOG = MerkleLog(DB_ACTIONS)
+MERKLE_LOG.sync(LEDGER_ARCHIVE)
+
+# receipts are anchored in batches: one signed root per epoch of 1000 receipts / 60 s
+EPOCH_ANCHORER = EpochAnchorer(RECEIPTS_DB, max_receipts=1000, max_seconds=60,
+                               signing_key=os.getenv("ANCHOR_SIGNING_KEY"))
+
+# one receipt per action: idempotent, cached, anchored when first issued
+RECEIPTS = ReceiptService(DB_ACTIONS, RECEIPTS_DB, archive=LEDGER_ARCHIVE,
+                          anchorer=EPOCH_ANCHORER, merkle_log=MERKLE_LOG)
+
+# memoized results, keyed by model version + quantized features; live versions share them
+ATTRIBUTION_CACHE = ResultCache(maxsize=8192, ttl=600, multi_version=True)
+EXPLAIN_CACHE = ResultCache(maxsize=4096, ttl=600, multi_version=True)
+WHATIF_CACHE = ResultCache(maxsize=2048, ttl=300, multi_version=True)
+
+# hot keys of the default version recomputed for a new one before it takes traffic
+WARMUP_KEYS = 256
+
+
+def warm_caches(entry):
+    # explanations are per user and cost an LLM call; they are left to fill on demand
+    if not MODELS.versions():
+        return
+    default = MODELS.default.version
+    for features, extra in ATTRIBUTION_CACHE.recent(default, WARMUP_KEYS):
+        ATTRIBUTION_CACHE.get_or_compute(entry.version, features, lambda: entry.attributions(features), extra)
+    for features, extra in WHATIF_CACHE.recent(default, WARMUP_KEYS):
+        if extra[0] == "single":
+            search, args = entry.whatif.search_counterfactuals, {"mode": extra[1]}
+        else:
+            search, args = entry.whatif.search_joint_counterfactuals, {"k": extra[1], "max_features": extra[2]}
+        WHATIF_CACHE.get_or_compute(entry.version, features, lambda: search(features, **args), extra)
+
+
+# live model versions: pinned / canary / default routing, hot-swapped without a restart.
+# The routing is kept in models.db, so a change made through any worker reaches them all.
+MODELS = ModelRegistry(caches=(ATTRIBUTION_CACHE, EXPLAIN_CACHE, WHATIF_CACHE), warmers=(warm_caches,),
+                       store=RoutingStore(MODELS_DB),
+                       build=lambda version, params: get_model().with_params(version, **params))
+MODELS.register(get_model(), attributor=get_attributor())
+
+
+def route_model(pinned: str = None, user_id: str = None):
+    try:
+        return MODELS.route(pinned, user_id)
+    except KeyError:
+        raise HTTPException(404, f"unknown model version {pinned}")
+
+
+def cached_attributions(entry, features: dict):
+    return ATTRIBUTION_CACHE.get_or_compute(
+        entry.version, features, lambda: entry.attributions(features))
+
+
+def cached_explanation(entry, features: dict, atts, user_id: str):
+    return EXPLAIN_CACHE.get_or_compute(
+        entry.version, features,
+        lambda: nl_explanation(atts, context={"user_id": user_id}),
+        extra=(user_id,))
 
 
 # ============================================================
@@ -119,6 +159,11 @@ class ExplainInput(InputData):
     user_id: str = "anonymous"
 
 
+class WhatIfInput(InputData):
+    # routes the request like /decision, so a canaried user's counterfactuals come from the canary
+    user_id: str = "anonymous"
+
+
 class ConsentUpdate(BaseModel):
     user_id: str
     feature: str
@@ -131,97 +176,90 @@ class Appeal(BaseModel):
     action_id: int
 
 
+class ReceiptBatchGenerate(BaseModel):
+    action_ids: List[int]
+
+
+class ModelVersion(BaseModel):
+    # a new version of the default model with any of its parameters replaced
+    version: str
+    coef: List[float] | None = None
+    threshold: float | None = None
+    baseline: List[float] | None = None
+
+
+class ShadowReplay(ModelVersion):
+    after_id: int = 0
+    upto_id: int | None = None
+    # one spawned process each, so never more than this host has cores
+    workers: int | None = Field(None, ge=1, le=os.cpu_count() or 1)
+
+
+class ReceiptBatchVerify(BaseModel):
+    receipts: List[dict]
+    tree_size: int | None = None
+    root: str | None = None
+
+
 # ============================================================
-# RECEIPT HELPERS
+# LIST HELPERS
 # ============================================================
-def generate_receipt_for_action(action_rowid: int):
-    conn = sqlite3.connect(DB_ACTIONS)
-    c = conn.cursor()
-    row = c.execute(
-        "SELECT user_id, inputs, output, explanation, created_at FROM action_logs WHERE id=?",
-        (action_rowid,)
-    ).fetchone()
-    conn.close()
-
-    if not row:
-        return None
+def paged(name: str, fetch, key, limit: int = None, format: str = "json"):
+    """A keyset page {name: [...], next_after_id}, or with format=ndjson every
+    remaining row (up to limit) streamed one JSON line at a time.
 
-    user_id, inputs_json, output_json, explanation, ts = row
+    fetch(limit) returns an iterator of rows; key picks the cursor out of a row.
+    """
+    if format not in ("json", "ndjson"):
+        raise HTTPException(400, "format must be 'json' or 'ndjson'")
+    if limit is not None and not 1 <= limit <= MAX_LIMIT:
+        raise HTTPException(400, f"limit must be between 1 and {MAX_LIMIT}")
+    if format == "ndjson":
+        return StreamingResponse(ndjson(fetch(limit)), media_type="application/x-ndjson")
+    limit = limit or DEFAULT_LIMIT
+    items = list(fetch(limit))
+    return {name: items, "next_after_id": next_cursor(items, limit, key)}
 
-    inputs = json.loads(inputs_json)
-    output = json.loads(output_json)
-    reasons = [s.strip() for s in explanation.split(".") if s.strip()]
 
-    alternatives = [
-        "Increase credit score to 650",
-        "Reduce spending ratio below 40%",
-        "Increase income by ₹10,000"
-    ]
+def require_consent(user_id: str, features):
+    # decision-time check against the cached current consent, no history scan
+    denied = denied_features(user_id, features)
+    if denied:
+        raise HTTPException(403, f"consent withdrawn for: {', '.join(denied)}")
 
-    receipt = {
-        "receipt_id": f"r_{action_rowid}_{int(datetime.utcnow().timestamp())}",
-        "action_id": action_rowid,
-        "user_id": user_id,
-        "summary": f"Loan decision: {output['decision']}",
-        "reasons": reasons,
-        "used_data": inputs,
-        "alternatives": alternatives,
-        "audit_anchor": None,
-        "timestamp": ts
-    }
 
-    # Save to DB
-    conn = sqlite3.connect(RECEIPTS_DB)
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO receipts(action_rowid, user_id, summary, reasons, used_data,
-                             alternatives, audit_anchor, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        action_rowid,
-        user_id,
-        receipt["summary"],
-        json.dumps(reasons),
-        json.dumps(inputs),
-        json.dumps(alternatives),
-        None,
-        ts
-    ))
-    conn.commit()
-    conn.close()
-
-    return receipt
-
-
-def attach_anchor_to_receipt(receipt: dict):
-    leaf = sha256(json.dumps(receipt, sort_keys=True).encode())
-    root = merkle_root([leaf])
-
-    receipt["audit_anchor"] = {
-        "merkle_root": root,
-        "batch_timestamp": datetime.utcnow().isoformat()
-    }
-    return receipt
+# ============================================================
+# RECEIPT HELPERS
+# ============================================================
+def get_action_hash(action_rowid: int):
+    row = query_one(DB_ACTIONS, "SELECT hash FROM action_logs WHERE id=?", (action_rowid,))
+    if row:
+        return row[0]
+    archived = LEDGER_ARCHIVE.lookup(action_rowid)
+    return archived["hash"] if archived else None
 
 
-def get_receipts_for_user(user_id: str):
-    conn = sqlite3.connect(RECEIPTS_DB)
-    c = conn.cursor()
-    rows = c.execute(
-        "SELECT id, action_rowid, summary, timestamp FROM receipts WHERE user_id=?",
-        (user_id,)
-    ).fetchall()
-    conn.close()
+def verify_action_log_anchors(receipts: list, tree_size: int, root: bytes):
+    """Check each receipt's action_log anchor against one log root; one bool per receipt."""
+    anchors = [(r.get("audit_anchor") or {}).get("action_log") or {} for r in receipts]
+    claimed = MERKLE_LOG.leaf_indices({r.get("action_id") for r in receipts})
 
-    return [
-        {
-            "receipt_id": f"r_{r[0]}",
-            "action_id": r[1],
-            "summary": r[2],
-            "timestamp": r[3]
-        }
-        for r in rows
-    ]
+    items, owners = [], []
+    for i, (r, a) in enumerate(zip(receipts, anchors)):
+        leaf_index = a.get("leaf_index")
+        # the anchored leaf must be this receipt's action, and already in the tree
+        if leaf_index is None or claimed.get(r.get("action_id")) != leaf_index or leaf_index >= tree_size:
+            continue
+        items.append((leaf_index, a.get("leaf") or ""))
+        owners.append(i)
+
+    paths = MERKLE_LOG.inclusion_proofs({i for i, _ in items}, tree_size)
+    ok = verify_inclusions(root, tree_size, [(i, leaf, paths[i]) for i, leaf in items])
+
+    results = [False] * len(receipts)
+    for i, good in zip(owners, ok):
+        results[i] = good
+    return results
 
 
 # ============================================================
@@ -229,140 +267,489 @@ def get_receipts_for_user(user_id: str):
 # ============================================================
 
 # ------------------ DECISION ------------------
-@app.post("/decision")
-def decision(req: DecisionInput):
-    features = {k: req.dict()[k] for k in MODEL.feature_names}
+ACTION_INSERT_SQL = """
+    INSERT INTO action_logs(user_id, inputs, output, explanation, model_version, created_at, hash,
+                            income, age, credit_score, spending_ratio, decision)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# decisions are group-committed off the request path
+ACTION_LOGGER = WriteBehindLogger(
+    DB_ACTIONS, ACTION_INSERT_SQL,
+    # the Merkle leaf commits in the same transaction as the row (hash is column 6)
+    after_insert=lambda conn, rows, ids: MERKLE_LOG.append(conn, [r[6] for r in rows], ids))
 
-    pred = MODEL.predict(pd.DataFrame([features]))[0]
-    atts = compute_shap_attributions(features)
-    preview = nl_explanation(atts, context={"user_id": req.user_id})
 
+def build_action_row(user_id: str, features: dict, pred: str, preview: str, created_at: str,
+                     model_version: str):
     action = {
-        "user_id": req.user_id,
+        "user_id": user_id,
         "inputs": features,
         "output": {"decision": pred},
         "explanation": preview,
-        "model_version": "demo-v1",
-        "created_at": datetime.utcnow().isoformat()
+        "model_version": model_version,
+        "created_at": created_at
     }
 
     h = sha256(json.dumps(action, sort_keys=True).encode())
 
-    conn = sqlite3.connect(DB_ACTIONS)
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO action_logs(user_id, inputs, output, explanation, model_version, created_at, hash)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (
-        req.user_id,
+    return (
+        user_id,
         json.dumps(features),
         json.dumps(action["output"]),
         preview,
-        "demo-v1",
-        action["created_at"],
-        h
-    ))
-    conn.commit()
-    conn.close()
+        model_version,
+        created_at,
+        h,
+        # typed columns for the auditor / replay
+        features["income"],
+        features["age"],
+        features["credit_score"],
+        features["spending_ratio"],
+        1 if pred == "approved" else 0
+    )
 
-    return {"decision": pred, "explanation_preview": preview, "attributions": atts}
+
+@app.post("/decision")
+def decision(req: DecisionInput, durable: bool = False, x_model_version: str | None = Header(None)):
+    model = route_model(x_model_version, req.user_id)
+    require_consent(req.user_id, model.feature_names)
+    features = {k: req.dict()[k] for k in model.feature_names}
+
+    pred = model.model.predict(features)[0]
+    atts = cached_attributions(model, features)
+    preview = cached_explanation(model, features, atts, req.user_id)
+
+    row = build_action_row(req.user_id, features, pred, preview, datetime.utcnow().isoformat(), model.version)
+
+    result = {"decision": pred, "explanation_preview": preview, "attributions": atts,
+              "model_version": model.version}
+    if durable:
+        # caller needs the committed row
+        result["action_id"] = ACTION_LOGGER.submit(row, wait=True)
+    else:
+        ACTION_LOGGER.submit(row)
+    return result
+
+
+@app.post("/decision/batch")
+def decision_batch(reqs: List[DecisionInput], x_model_version: str | None = Header(None)):
+    if not reqs:
+        return {"results": []}
+    models = [route_model(x_model_version, r.user_id) for r in reqs]
+    for user_id, model in {r.user_id: m for r, m in zip(reqs, models)}.items():
+        require_consent(user_id, model.feature_names)
+
+    features = [{k: getattr(r, k) for k in m.feature_names} for r, m in zip(reqs, models)]
+
+    # one vectorized pass per model version in the batch
+    preds, atts = [None] * len(reqs), [None] * len(reqs)
+    by_version = {}
+    for i, m in enumerate(models):
+        by_version.setdefault(m.version, (m, []))[1].append(i)
+    for m, idx in by_version.values():
+        rows = [features[i] for i in idx]
+        for i, p, a in zip(idx, m.model.predict(pd.DataFrame(rows, columns=m.feature_names)),
+                           compute_shap_attributions_batch(rows, m.model, m.attributor)):
+            preds[i], atts[i] = p, a
+    previews = nl_explanations(atts, [{"user_id": r.user_id} for r in reqs])
+
+    created_at = datetime.utcnow().isoformat()
+    rows = [
+        build_action_row(r.user_id, f, p, e, created_at, m.version)
+        for r, f, p, e, m in zip(reqs, features, preds, previews, models)
+    ]
+
+    # the whole batch is committed in one transaction
+    action_ids = ACTION_LOGGER.submit_many(rows, wait=True)
+
+    return {"results": [
+        {
+            "action_id": action_ids[i],
+            "user_id": reqs[i].user_id,
+            "decision": preds[i],
+            "explanation_preview": previews[i],
+            "attributions": atts[i],
+            "model_version": models[i].version,
+            "hash": rows[i][6]
+        }
+        for i in range(len(rows))
+    ]}
 
 
 # ------------------ EXPLAIN ------------------
 @app.post("/explain")
-def explain(req: ExplainInput):
-    features = {k: req.dict()[k] for k in MODEL.feature_names}
-    atts = compute_shap_attributions(features)
-    text = nl_explanation(atts, context={"user_id": req.user_id})
-    return {"explanation": text, "attributions": atts}
+def explain(req: ExplainInput, x_model_version: str | None = Header(None)):
+    model = route_model(x_model_version, req.user_id)
+    require_consent(req.user_id, model.feature_names)
+    features = {k: req.dict()[k] for k in model.feature_names}
+    atts = cached_attributions(model, features)
+    text = cached_explanation(model, features, atts, req.user_id)
+    return {"explanation": text, "attributions": atts, "model_version": model.version}
 
 
 # ------------------ WHAT-IF ------------------
+# most joint counterfactuals one request may ask for
+WHATIF_MAX_K = 20
+
 @app.post("/what-if")
-def what_if_api(req: InputData):
-    cf = WHATIF.search_counterfactuals(req.dict())
-    return {"input": req.dict(), "counterfactuals": cf, "model_version": "demo-v1"}
+def what_if_api(req: WhatIfInput, mode: str = "bisect", x_model_version: str | None = Header(None)):
+    if mode not in ("bisect", "grid"):
+        raise HTTPException(400, "mode must be 'bisect' or 'grid'")
+    model = route_model(x_model_version, req.user_id)
+    features = {k: req.dict()[k] for k in model.feature_names}
+    cf = WHATIF_CACHE.get_or_compute(
+        model.version, features,
+        lambda: model.whatif.search_counterfactuals(features, mode=mode),
+        extra=("single", mode))
+    return {"input": features, "counterfactuals": cf, "model_version": model.version}
+
+
+@app.post("/what-if/joint")
+def what_if_joint_api(req: WhatIfInput, k: int = Query(3, ge=1, le=WHATIF_MAX_K),
+                      max_features: int = Query(3, ge=1, le=len(get_model().feature_names)),
+                      x_model_version: str | None = Header(None)):
+    model = route_model(x_model_version, req.user_id)
+    features = {f: req.dict()[f] for f in model.feature_names}
+    cf = WHATIF_CACHE.get_or_compute(
+        model.version, features,
+        lambda: model.whatif.search_joint_counterfactuals(features, k=k, max_features=max_features),
+        extra=("joint", k, max_features))
+    return {"input": features, "counterfactuals": cf, "model_version": model.version}
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "attributions": ATTRIBUTION_CACHE.stats(),
+        "explanations": EXPLAIN_CACHE.stats(),
+        "what_if": WHATIF_CACHE.stats(),
+        "consent": CONSENT_CACHE.stats()
+    }
 
 
 # ------------------ CONSENT ------------------
 @app.post("/consent/update")
 def consent_update_api(req: ConsentUpdate):
-    update_consent(req.user_id, req.feature, req.allowed, req.expiry)
+    try:
+        update_consent(req.user_id, req.feature, req.allowed, req.expiry)
+    except ValueError:
+        raise HTTPException(400, "expiry must be an ISO date or datetime")
     return {"status": "ok"}
 
 
+@app.get("/consent/{user_id}/current")
+def fetch_current_consent(user_id: str):
+    return {"consents": current_consents(user_id)}
+
+
 @app.get("/consent/{user_id}")
-def fetch_consent(user_id: str):
-    return get_user_consents(user_id)
+def fetch_consent(user_id: str, after_id: int = None, limit: int = None, format: str = "json"):
+    # newest first: after_id continues towards older entries
+    return paged("consents", lambda n: iter_user_consents(user_id, after_id, n), "id", limit, format)
 
 
 # ------------------ AUDIT ------------------
 @app.post("/audit/run")
-def audit_run():
-    conn = sqlite3.connect(DB_ACTIONS)
-    rows = conn.execute("SELECT inputs, output FROM action_logs").fetchall()
-    conn.close()
+def audit_run(mode: str = "incremental"):
+    if mode not in ("incremental", "full"):
+        raise HTTPException(400, "mode must be 'incremental' or 'full'")
 
-    if not rows:
+    result = INCREMENTAL_AUDITOR.run(mode=mode)
+    if not result["total_rows"]:
         raise HTTPException(400, "no logs")
+    return result
+
+
+@app.get("/audit/drift")
+def audit_drift(window_hours: int = 24, end: str = None, reference: str = "baseline", series: bool = False):
+    if window_hours < 1:
+        raise HTTPException(400, "window_hours must be >= 1")
+    try:
+        return DRIFT_MONITOR.report(window_hours * 3600, end, reference, series)
+    except ValueError:
+        raise HTTPException(400, "end must be an ISO datetime")
 
-    df = []
-    for inputs_json, output_json in rows:
-        inp = json.loads(inputs_json)
-        out = json.loads(output_json)
-        inp["decision"] = out["decision"]
-        df.append(inp)
 
-    df_pd = pd.DataFrame(df)
-    return AUDITOR.run_audit(df_pd, sensitive_col=None)
+@app.post("/audit/drift/reference")
+def audit_drift_reference(start: str, end: str, reference: str = "baseline"):
+    DRIFT_MONITOR.update()
+    try:
+        return DRIFT_MONITOR.set_reference(start, end, reference)
+    except ValueError:
+        raise HTTPException(400, "start and end must be ISO datetimes")
 
 
 @app.get("/audit/incidents")
-def audit_incidents():
-    conn = sqlite3.connect(INCIDENTS_DB)
-    rows = conn.execute("SELECT id, test, value, severity, created_at FROM incidents").fetchall()
-    conn.close()
-
-    return {"incidents": [
-        {"id": r[0], "test": r[1], "value": r[2], "severity": r[3], "created_at": r[4]}
-        for r in rows
-    ]}
+def audit_incidents(after_id: int = None, limit: int = None, format: str = "json"):
+    def fetch(n):
+        rows = iter_rows(INCIDENTS_DB, "SELECT id, test, value, severity, created_at FROM incidents",
+                         "id", after_id=after_id, limit=n)
+        return ({"id": r[0], "test": r[1], "value": r[2], "severity": r[3], "created_at": r[4]} for r in rows)
+
+    return paged("incidents", fetch, "id", limit, format)
+
+
+# ------------------ MODELS ------------------
+def new_model_version(req: ModelVersion):
+    try:
+        return MODELS.default.model.with_params(req.version, req.coef, req.threshold, req.baseline)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@app.get("/models")
+def models_list():
+    return MODELS.stats()
+
+
+@app.post("/models")
+def models_register(req: ModelVersion, default: bool = False):
+    # warmed (caches included) before it can be routed to
+    model = new_model_version(req)
+    try:
+        entry = MODELS.register(model, default=default, params=model.params())
+    except VersionExists as e:
+        raise HTTPException(409, str(e))
+    except ValueError:
+        raise HTTPException(400, f"model version {req.version} failed its warm-up run")
+    return {"version": entry.version, "warmup_seconds": entry.warmup_seconds, "routing": MODELS.stats()}
+
+
+@app.post("/models/canary")
+def models_canary(version: str = None, percent: float = 0.0):
+    try:
+        MODELS.set_canary(version, percent)
+    except KeyError:
+        raise HTTPException(404, f"unknown model version {version}")
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return MODELS.stats()
+
+
+@app.post("/models/{version}/default")
+def models_set_default(version: str):
+    try:
+        MODELS.set_default(version)
+    except KeyError:
+        raise HTTPException(404, f"unknown model version {version}")
+    return MODELS.stats()
+
+
+@app.delete("/models/{version}")
+def models_retire(version: str):
+    try:
+        MODELS.retire(version)
+    except KeyError:
+        raise HTTPException(404, f"unknown model version {version}")
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+    return MODELS.stats()
+
+
+# ------------------ SHADOW REPLAY ------------------
+@app.post("/replay/shadow")
+def replay_shadow(req: ShadowReplay):
+    # score past decisions with a candidate model, without serving it: a registered
+    # version as is, or the default with the given parameters replaced
+    production = MODELS.default.model
+    if req.version in MODELS.versions() and all(v is None for v in (req.coef, req.threshold, req.baseline)):
+        candidate = MODELS.get(req.version).model
+    else:
+        candidate = new_model_version(req)
+    ACTION_LOGGER.flush()
+    return shadow_replay(candidate, DB_ACTIONS, production, archive=LEDGER_ARCHIVE, after_id=req.after_id,
+                         upto_id=req.upto_id, workers=req.workers)
 
 
 # ------------------ RECEIPTS ------------------
+# declared before /receipts/generate/{action_rowid}, which would otherwise capture "batch"
+@app.post("/receipts/generate/batch")
+def api_generate_receipts_batch(req: ReceiptBatchGenerate):
+    receipts = RECEIPTS.generate_many(req.action_ids)
+    return {
+        "receipts": [receipts[a] for a in dict.fromkeys(req.action_ids) if a in receipts],
+        "missing": [a for a in dict.fromkeys(req.action_ids) if a not in receipts]
+    }
+
+
 @app.post("/receipts/generate/{action_rowid}")
 def api_generate_receipt(action_rowid: int):
-    r = generate_receipt_for_action(action_rowid)
+    r = RECEIPTS.generate(action_rowid)
     if not r:
         raise HTTPException(404, "action not found")
-    return attach_anchor_to_receipt(r)
+    return r
 
 
-@app.get("/receipts/{user_id}")
-def api_get_receipts(user_id: str):
-    return {"receipts": get_receipts_for_user(user_id)}
+@app.get("/receipts/id/{receipt_id}")
+def api_get_receipt(receipt_id: str):
+    r = RECEIPTS.get(receipt_id)
+    if not r:
+        raise HTTPException(404, "receipt not found")
+    return r
 
 
+# declared before /receipts/{user_id}, which would otherwise capture "merkle"
 @app.get("/receipts/merkle")
-def receipts_merkle():
-    conn = sqlite3.connect(DB_ACTIONS)
-    rows = conn.execute("SELECT hash FROM action_logs").fetchall()
-    conn.close()
+def receipts_merkle(tree_size: int = None):
+    # RFC 6962 root of the action log, maintained on every insert
+    if tree_size is None:
+        tree_size, root = MERKLE_LOG.head()
+    else:
+        try:
+            root = MERKLE_LOG.root(tree_size)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+    return {"merkle_root": root.hex(), "tree_size": tree_size}
+
+
+@app.get("/receipts/epochs/{epoch_id}")
+def receipts_epoch(epoch_id: int):
+    epoch = EPOCH_ANCHORER.epoch(epoch_id)
+    if not epoch:
+        raise HTTPException(404, "epoch not found")
+    return epoch
+
+
+@app.get("/receipts/epochs/{epoch_id}/proof/{leaf_index}")
+def receipts_epoch_proof(epoch_id: int, leaf_index: int):
+    proof = EPOCH_ANCHORER.proof(epoch_id, leaf_index)
+    if not proof:
+        epoch = EPOCH_ANCHORER.epoch(epoch_id)
+        if epoch and not epoch["sealed"]:
+            raise HTTPException(409, "epoch not sealed yet")
+        raise HTTPException(404, "receipt not anchored in this epoch")
+    return proof
+
+
+@app.get("/receipts/{user_id}")
+def api_get_receipts(user_id: str, after_id: int = None, limit: int = None, format: str = "json"):
+    # after_id is an action id; receipts are listed in action order
+    return paged("receipts", lambda n: RECEIPTS.iter_user(user_id, after_id, n), "action_id", limit, format)
+
+
+# ------------------ LEDGER ARCHIVE ------------------
+@app.post("/ledger/compact")
+def ledger_compact(retention_days: int = 90):
+    if retention_days < 0:
+        raise HTTPException(400, "retention_days must be >= 0")
+    # rows still queued in the write-behind logger are not compacted this round
+    return LEDGER_ARCHIVE.compact(retention_days)
+
+
+@app.get("/ledger/archive")
+def ledger_archive():
+    return LEDGER_ARCHIVE.stats()
 
-    leaves = [r[0].encode() for r in rows]
-    return {"merkle_root": merkle_root(leaves)}
+
+# ------------------ LEDGER PROOFS ------------------
+@app.get("/ledger/proof/inclusion")
+def ledger_inclusion_proof(action_id: int, tree_size: int = None):
+    leaf_index = MERKLE_LOG.leaf_index(action_id)
+    if leaf_index is None:
+        raise HTTPException(404, "action not in the log")
+    tree_size = MERKLE_LOG.size() if tree_size is None else tree_size
+    try:
+        path = MERKLE_LOG.inclusion_proof(leaf_index, tree_size)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    return {
+        "action_id": action_id,
+        "leaf": get_action_hash(action_id),
+        "leaf_index": leaf_index,
+        "tree_size": tree_size,
+        "root": MERKLE_LOG.root(tree_size).hex(),
+        "audit_path": [h.hex() for h in path]
+    }
+
+
+@app.get("/ledger/proof/consistency")
+def ledger_consistency_proof(first: int, second: int = None):
+    second = MERKLE_LOG.size() if second is None else second
+    try:
+        proof = MERKLE_LOG.consistency_proof(first, second)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    first_root, second_root = MERKLE_LOG.root(first), MERKLE_LOG.root(second)
+    return {
+        "first": first,
+        "second": second,
+        "first_root": first_root.hex(),
+        "second_root": second_root.hex(),
+        "proof": [h.hex() for h in proof],
+        "verified": verify_consistency(first, second, first_root, second_root, proof)
+    }
+
+
+@app.post("/receipts/verify-batch")
+def receipts_verify_batch(req: ReceiptBatchVerify):
+    tree_size = MERKLE_LOG.size() if req.tree_size is None else req.tree_size
+    try:
+        root = bytes.fromhex(req.root) if req.root else MERKLE_LOG.root(tree_size)
+        ok = verify_action_log_anchors(req.receipts, tree_size, root)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {
+        "tree_size": tree_size,
+        "root": root.hex(),
+        "verified": sum(ok),
+        "failed": [r.get("receipt_id") for r, good in zip(req.receipts, ok) if not good],
+        "results": ok
+    }
 
 
 # ------------------ AI TWIN ------------------
+def if_match_version(if_match: str | None):
+    # If-Match: "<version>" (as sent back in ETag); absent means unconditional
+    if if_match is None:
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(400, "If-Match must be a twin version, as returned in ETag")
+
+
 @app.get("/twin/{user_id}")
-def get_user_twin_route(user_id: str):
-    return get_twin(user_id)
+def get_user_twin_route(user_id: str, response: Response):
+    version, twin = get_twin_versioned(user_id)
+    response.headers["ETag"] = f'"{version}"'
+    return twin
 
 
 @app.post("/twin/{user_id}")
-def update_user_twin_route(user_id: str, body: dict):
-    save_twin(user_id, body)
-    return {"status": "ok", "updated": body}
+def update_user_twin_route(user_id: str, body: dict, response: Response, if_match: str = Header(None)):
+    try:
+        version = save_twin(user_id, body, if_match_version(if_match))
+    except VersionConflict as e:
+        raise HTTPException(412, str(e))
+    response.headers["ETag"] = f'"{version}"'
+    return {"status": "ok", "updated": body, "version": version}
+
+
+@app.patch("/twin/{user_id}")
+def patch_user_twin_route(user_id: str, response: Response, patch: dict | list = Body(...),
+                          if_match: str = Header(None)):
+    # a list is a JSON Patch (RFC 6902), an object a merge patch (RFC 7386)
+    try:
+        version, twin = patch_twin(user_id, patch, if_match_version(if_match), merge=isinstance(patch, dict))
+    except VersionConflict as e:
+        raise HTTPException(412, str(e))
+    except PatchError as e:
+        raise HTTPException(422, str(e))
+    response.headers["ETag"] = f'"{version}"'
+    return {"version": version, "twin": twin}
+
+
+@app.post("/twin/{user_id}/annotations")
+def add_twin_annotation_route(user_id: str, body: dict):
+    return add_annotation(user_id, body)
+
+
+@app.get("/twin/{user_id}/annotations")
+def get_twin_annotations_route(user_id: str, after_id: int = None, limit: int = None, format: str = "json"):
+    return paged("annotations", lambda n: iter_annotations(user_id, after_id, n), "id", limit, format)
 
 
 # ------------------ APPEALS ------------------
@@ -373,8 +760,8 @@ def appeal_api(user_id: str, req: Appeal):
 
 
 @app.get("/appeal/{user_id}")
-def get_appeals_api(user_id: str):
-    return {"appeals": list_appeals(user_id)}
+def get_appeals_api(user_id: str, after_id: int = None, limit: int = None, format: str = "json"):
+    return paged("appeals", lambda n: iter_appeals(user_id, after_id, n), 0, limit, format)
 
 
 # ------------------ ZK PROOF ------------------
@@ -387,10 +774,10 @@ def zk_prove(body: dict):
 @app.get("/governance/overview")
 def gov_overview():
     return {
-        "models": ["demo-v1"],
-        "incidents_count": len(get_receipts_for_user("*")),
+        "models": MODELS.versions(),
+        "incidents_count": len(RECEIPTS.for_user("*")),
         "pending_appeals": len(list_appeals("*")),
-        "latest_receipts": len(get_receipts_for_user("*"))
+        "latest_receipts": len(RECEIPTS.for_user("*"))
     }
 
 
@@ -400,13 +787,20 @@ def mock_bank_balance(user_id: str):
     return {"balance": 42000, "currency": "INR"}
 
 
+# ------------------ LIFECYCLE ------------------
+@app.on_event("shutdown")
+def shutdown():
+    ACTION_LOGGER.close()
+    EPOCH_ANCHORER.close()
+    SCHEDULER.shutdown()
+    close_all()
+
+
 # ------------------ DEBUG ------------------
 @app.get("/debug/actions")
-def debug_actions():
-    conn = sqlite3.connect(DB_ACTIONS)
-    rows = conn.execute("SELECT id, user_id, created_at FROM action_logs").fetchall()
-    conn.close()
-    return {"actions": rows}
+def debug_actions(after_id: int = None, limit: int = None, format: str = "json"):
+    return paged("actions", lambda n: iter_rows(DB_ACTIONS, "SELECT id, user_id, created_at FROM action_logs",
+                                                "id", after_id=after_id, limit=n), 0, limit, format)
 
 # --- ZK Verification endpoint (paste into main.py) ---
 from fastapi import Body
@@ -453,7 +847,14 @@ def zk_verify(payload: dict = Body(...)):
 
     # If receipt contained an audit_anchor, check merkle root matches recomputed root
     audit_anchor = receipt.get("audit_anchor")
-    if audit_anchor and audit_anchor.get("merkle_root"):
+    if audit_anchor and audit_anchor.get("epoch_id") is not None:
+        # batch anchor: the leaf must be in the sealed epoch root
+        ok = EPOCH_ANCHORER.verify(audit_anchor["epoch_id"], audit_anchor.get("leaf_index", -1), leaf_hash)
+        epoch = EPOCH_ANCHORER.epoch(audit_anchor["epoch_id"]) or {}
+        verification["merkle_root"] = epoch.get("root")
+        verification["merkle_root_ok"] = bool(ok)
+        verification["details"]["epoch_sealed"] = epoch.get("sealed", False)
+    elif audit_anchor and audit_anchor.get("merkle_root"):
         # For demo we assume the merkle root was produced over [leaf] (single-leaf batch)
         recomputed_root = merkle_root([leaf_hash.encode()])
         verification["merkle_root"] = audit_anchor.get("merkle_root")
@@ -463,6 +864,18 @@ def zk_verify(payload: dict = Body(...)):
         verification["merkle_root"] = None
         verification["recomputed_root"] = merkle_root([leaf_hash.encode()])  # value for debugging
 
+    # the decision behind the receipt, against the action log root it was anchored to
+    action_log = (audit_anchor or {}).get("action_log")
+    if action_log:
+        try:
+            anchored_root = bytes.fromhex(action_log.get("root", ""))
+            verification["action_log_ok"] = (
+                anchored_root == MERKLE_LOG.root(action_log["tree_size"])
+                and verify_action_log_anchors([receipt], action_log["tree_size"], anchored_root)[0]
+            )
+        except (KeyError, ValueError):
+            verification["action_log_ok"] = False
+
     verification["leaf_ok"] = True  # leaf is always derivable
     verification["details"]["receipt_id"] = receipt.get("receipt_id")
     verification["details"]["timestamp"] = receipt.get("timestamp")
@@ -470,12 +883,20 @@ def zk_verify(payload: dict = Body(...)):
     # Final verdict: require proof_ok AND merkle_root_ok (if anchor present). If anchor absent, rely on proof_ok.
     if audit_anchor:
         verified = verification["proof_ok"] and verification["merkle_root_ok"]
+        if action_log:
+            verified = verified and verification["action_log_ok"]
     else:
         verified = verification["proof_ok"]
 
     return {"verified": bool(verified), "verification": verification}
 from auditor_engine.scheduler import start_scheduler
-start_scheduler()
+# one leader per host runs the audit jobs; every worker can report on them
+SCHEDULER = start_scheduler()
+
+
+@app.get("/scheduler/stats")
+def scheduler_stats():
+    return SCHEDULER.stats()
 
 
 
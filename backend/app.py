@@ -113,11 +113,15 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.security import APIKeyHeader
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 import os
-import sqlite3
 import json
 from datetime import datetime
+from storage.pagination import DEFAULT_LIMIT, MAX_LIMIT, iter_rows, ndjson, next_cursor
+from storage.migrations import migrate
+from storage.writebehind import WriteBehindLogger
+from storage.archive import LedgerArchive
 
 # ===== ENV SETUP =====
 load_dotenv()
@@ -137,39 +141,28 @@ def verify_api_key(key: str = Depends(api_key_header)):
 DB_PATH = "action_logs.db"
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS action_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            endpoint TEXT,
-            user_id TEXT,
-            payload TEXT,
-            result TEXT,
-            timestamp TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    migrate(DB_PATH, "app_actions")
 
 # Create table at startup
 init_db()
 
-def save_action(endpoint: str, user_id: str, payload: dict, result: dict):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO action_logs (endpoint, user_id, payload, result, timestamp)
-        VALUES (?, ?, ?, ?, ?)
-    """, (
+# logs past the retention window are moved to date-partitioned columnar files
+LOG_ARCHIVE = LedgerArchive(DB_PATH, "archive", time_column="timestamp")
+
+# actions are group-committed by a background writer
+ACTION_LOGGER = WriteBehindLogger(DB_PATH, """
+    INSERT INTO action_logs (endpoint, user_id, payload, result, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+""")
+
+def save_action(endpoint: str, user_id: str, payload: dict, result: dict, wait: bool = False):
+    return ACTION_LOGGER.submit((
         endpoint,
         user_id,
         json.dumps(payload),
         json.dumps(result),
         datetime.utcnow().isoformat()
-    ))
-    conn.commit()
-    conn.close()
+    ), wait=wait)
 
 # ===== FASTAPI APP =====
 app = FastAPI()
@@ -181,6 +174,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("shutdown")
+def shutdown():
+    ACTION_LOGGER.close()
+
 @app.get("/")
 def root():
     return {"message": "Fusion backend running"}
@@ -264,27 +261,38 @@ def zk_verify(payload: dict):
 
 # ===== LOG VIEWER =====
 @app.get("/logs")
-def get_logs():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT id, endpoint, user_id, payload, result, timestamp
-        FROM action_logs ORDER BY id DESC
-    """)
-    rows = cur.fetchall()
-    conn.close()
-
-    logs = []
-    for row in rows:
-        logs.append({
-            "id": row[0],
-            "endpoint": row[1],
-            "user_id": row[2],
-            "payload": json.loads(row[3]) if row[3] else {},
-            "result": json.loads(row[4]) if row[4] else {},
-            "timestamp": row[5]
-        })
-
-    return {"logs": logs}
+def get_logs(after_id: int = None, limit: int = None, format: str = "json"):
+    # newest first; after_id continues towards older entries
+    if format not in ("json", "ndjson"):
+        raise HTTPException(400, "format must be 'json' or 'ndjson'")
+    if limit is not None and not 1 <= limit <= MAX_LIMIT:
+        raise HTTPException(400, f"limit must be between 1 and {MAX_LIMIT}")
+    if format == "json":
+        limit = limit or DEFAULT_LIMIT
+
+    rows = iter_rows(DB_PATH, "SELECT id, endpoint, user_id, payload, result, timestamp FROM action_logs",
+                     "id", after_id=after_id, limit=limit, desc=True)
+    logs = ({
+        "id": row[0],
+        "endpoint": row[1],
+        "user_id": row[2],
+        "payload": json.loads(row[3]) if row[3] else {},
+        "result": json.loads(row[4]) if row[4] else {},
+        "timestamp": row[5]
+    } for row in rows)
+
+    if format == "ndjson":
+        return StreamingResponse(ndjson(logs), media_type="application/x-ndjson")
+    logs = list(logs)
+    return {"logs": logs, "next_after_id": next_cursor(logs, limit, "id")}
+
+@app.post("/logs/compact")
+def compact_logs(retention_days: int = 30):
+    if retention_days < 0:
+        raise HTTPException(400, "retention_days must be >= 0")
+    return LOG_ARCHIVE.compact(retention_days)
+
+@app.get("/logs/archive")
+def logs_archive():
+    return LOG_ARCHIVE.stats()
 
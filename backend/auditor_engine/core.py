@@ -1,57 +1,53 @@
 import pandas as pd
-import sqlite3
 import os
 import uuid
 from datetime import datetime
-from auditor_engine.fairness.parity import statistical_parity
+from auditor_engine.fairness.engine import fairness_report
 from auditor_engine.drift.monitor import detect_drift
+from storage.sqlite import execute
+from storage.migrations import migrate
 
 DB = os.path.join(os.path.dirname(__file__), "incidents.db")
 
 def init_db():
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS incidents (
-      id TEXT PRIMARY KEY,
-      test TEXT,
-      value REAL,
-      severity TEXT,
-      created_at TEXT
-    )
-    """)
-    conn.commit()
-    conn.close()
+    migrate(DB, "auditor_incidents")
 
 init_db()
 
 def log_incident(test, value, severity="MEDIUM"):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
     iid = str(uuid.uuid4())
-    c.execute("INSERT INTO incidents (id,test,value,severity,created_at) VALUES (?,?,?,?,?)",
-              (iid, test, float(value), severity, datetime.utcnow().isoformat()))
-    conn.commit()
-    conn.close()
+    execute(DB, "INSERT INTO incidents (id,test,value,severity,created_at) VALUES (?,?,?,?,?)",
+            (iid, test, float(value), severity, datetime.utcnow().isoformat()))
     return iid
 
 class EthicalAIAuditor:
-    def __init__(self, fairness_threshold=0.1, drift_threshold=0.5):
+    def __init__(self, fairness_threshold=0.1, drift_threshold=0.5, min_group=1, n_boot=200):
         self.fairness_threshold = fairness_threshold
         self.drift_threshold = drift_threshold
+        self.min_group = min_group
+        self.n_boot = n_boot
 
-    def run_audit(self, df: pd.DataFrame, sensitive_col=None, label_col="decision"):
+    def run_audit(self, df: pd.DataFrame, sensitive_col=None, label_col="decision", truth_col=None,
+                  reference_df: pd.DataFrame = None):
         results = {"incidents": []}
         if sensitive_col is None:
-            # try to pick a plausible sensitive column
-            candidates = [c for c in df.columns if c.lower() in ("region","gender","race")]
-            sensitive_col = candidates[0] if candidates else None
-        if sensitive_col and sensitive_col in df.columns:
-            sp = statistical_parity(df, sensitive_col, label_col)
-            if pd.notnull(sp) and abs(sp) > self.fairness_threshold:
-                iid = log_incident("statistical_parity", sp, "HIGH")
-                results["incidents"].append({"id": iid, "test": "statistical_parity", "value": sp})
-        drift_score = detect_drift(df)
+            # every plausible sensitive column, and their intersections
+            sensitive = [c for c in df.columns if c.lower() in ("region","gender","race")]
+        else:
+            sensitive = [sensitive_col] if isinstance(sensitive_col, str) else list(sensitive_col)
+        if sensitive:
+            report = fairness_report(df, sensitive, label_col, truth=truth_col,
+                                     min_group=self.min_group, n_boot=self.n_boot)
+            results["fairness"] = report
+            for attr, entry in report["attributes"].items():
+                for test, metric in (("statistical_parity", "parity_gap"),
+                                     ("equal_opportunity", "equal_opportunity_gap")):
+                    gap = entry.get(metric, {}).get("value")
+                    if gap is not None and gap > self.fairness_threshold:
+                        iid = log_incident(test, gap, "HIGH")
+                        results["incidents"].append({"id": iid, "test": test, "value": gap,
+                                                     "sensitive_col": attr})
+        drift_score = detect_drift(df, reference_df)
         if drift_score > self.drift_threshold:
             iid = log_incident("drift", drift_score, "MEDIUM")
             results["incidents"].append({"id": iid, "test": "drift", "value": drift_score})
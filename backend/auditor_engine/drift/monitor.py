@@ -5,7 +5,16 @@ def kl_divergence(p, q):
     q = q + 1e-9
     return (p * np.log(p / q)).sum()
 
-def detect_drift(df):
+def detect_drift(df, reference=None):
+    """Mean PSI of the FEATURE_BINS features against a reference frame.
+
+    Without a reference the old score is kept: KL of a 5-bin histogram of
+    each numeric column against a uniform one.
+    """
+    if reference is not None:
+        scores = [histogram_psi(bin_counts(df[f].dropna().values, e), bin_counts(reference[f].dropna().values, e))
+                  for f, e in FEATURE_BINS.items() if f in df.columns and f in reference.columns]
+        return float(sum(scores) / max(1, len(scores)))
     numeric_cols = df.select_dtypes(include=['int','float']).columns
     if len(numeric_cols) == 0:
         return 0.0
@@ -18,3 +27,48 @@ def detect_drift(df):
         uniform = np.ones_like(hist) / len(hist)
         scores.append(kl_divergence(hist, uniform))
     return float(sum(scores) / max(1, len(scores)))
+
+# fixed bin edges used by the streaming (incremental) audit; values outside
+# the range land in the first/last bin
+FEATURE_BINS = {
+    "income": np.linspace(0, 300000, 31),
+    "age": np.linspace(18, 90, 19),
+    "credit_score": np.linspace(300, 900, 31),
+    "spending_ratio": np.linspace(0, 1, 21),
+}
+
+def bin_counts(values, edges):
+    """Counts of values per fixed bin (len(edges) - 1 bins, open-ended at both sides)."""
+    idx = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 2)
+    return np.bincount(idx, minlength=len(edges) - 1)
+
+def histogram_kl(p_counts, q_counts):
+    """KL(p || q) between two count histograms over the same bins."""
+    p = np.asarray(p_counts, dtype=float)
+    q = np.asarray(q_counts, dtype=float)
+    if p.sum() == 0 or q.sum() == 0:
+        return 0.0
+    return float(kl_divergence(p / p.sum(), q / q.sum()))
+
+def _distributions(p_counts, q_counts, eps=1e-4):
+    # normalized histograms; empty bins get eps so log ratios stay finite
+    p = np.asarray(p_counts, dtype=float)
+    q = np.asarray(q_counts, dtype=float)
+    p = np.maximum(p / p.sum(), eps)
+    q = np.maximum(q / q.sum(), eps)
+    return p / p.sum(), q / q.sum()
+
+def histogram_psi(p_counts, q_counts):
+    """Population stability index of p (current) against q (reference)."""
+    if np.sum(p_counts) == 0 or np.sum(q_counts) == 0:
+        return 0.0
+    p, q = _distributions(p_counts, q_counts)
+    return float(((p - q) * np.log(p / q)).sum())
+
+def histogram_ks(p_counts, q_counts):
+    """Kolmogorov-Smirnov distance between two histograms, at the bin edges."""
+    p = np.asarray(p_counts, dtype=float)
+    q = np.asarray(q_counts, dtype=float)
+    if p.sum() == 0 or q.sum() == 0:
+        return 0.0
+    return float(np.abs(np.cumsum(p) / p.sum() - np.cumsum(q) / q.sum()).max())
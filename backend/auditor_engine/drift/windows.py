@@ -0,0 +1,226 @@
+# auditor_engine/drift/windows.py
+# Drift against a real baseline. New decisions are folded, as they are
+# logged, into fixed-bin histograms per feature and per time bucket
+# (drift_buckets); a reference window is stored as the sum of its buckets
+# (drift_reference). Any window is then a sum of bucket histograms, and PSI,
+# KL and KS are computed from counts - O(buckets x bins), never O(rows).
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from auditor_engine.core import DB as INCIDENT_DB, log_incident
+from auditor_engine.drift.monitor import FEATURE_BINS, histogram_kl, histogram_ks, histogram_psi
+from storage.columnar import FEATURE_COLUMNS
+from storage.sqlite import query, query_one, transaction
+
+
+def _epoch(value) -> int:
+    if value is None:
+        return int(time.time())
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def _iso(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+class DriftMonitor:
+    """Per-feature, per-bucket histograms of logged decisions and drift reports over them.
+
+    bucket_seconds fixes the time resolution of what is stored; report()
+    windows are any whole number of buckets. update() only reads the rows
+    logged since the previous call.
+    """
+
+    def __init__(self, action_db: str, name: str = "drift", bucket_seconds: int = 3600, archive=None,
+                 psi_threshold: float = 0.2, chunk_size: int = 50000):
+        self.action_db = action_db
+        self.name = name
+        self.bucket_seconds = bucket_seconds
+        self.archive = archive
+        self.psi_threshold = psi_threshold
+        self.chunk_size = chunk_size
+        self.bins = FEATURE_BINS
+        self._lock = threading.Lock()
+
+    # ---------------- ingest ----------------
+    def _last_rowid(self, conn=None):
+        sql, args = "SELECT last_rowid FROM audit_state WHERE name=?", (self.name,)
+        row = conn.execute(sql, args).fetchone() if conn else query_one(INCIDENT_DB, sql, args)
+        return row[0] if row else 0
+
+    def _chunks(self, after_id):
+        cols = ("id", "created_at") + FEATURE_COLUMNS
+        if self.archive is not None:
+            yield from self.archive.scan(cols, after_id)
+        while True:
+            rows = query(self.action_db,
+                         f"SELECT {', '.join(cols)} FROM action_logs WHERE id > ? ORDER BY id LIMIT ?",
+                         (after_id, self.chunk_size))
+            if not rows:
+                return
+            yield {c: np.array(v, dtype=object if c == "created_at" else np.float64)
+                   for c, v in zip(cols, zip(*rows))}
+            after_id = rows[-1][0]
+
+    def _fold(self, cols, acc):
+        # acc: (feature, bucket) -> bin counts
+        ts = pd.to_datetime(pd.Series(cols["created_at"]), format="ISO8601", errors="coerce")
+        ok = ts.notna().to_numpy()
+        buckets = ts[ok].to_numpy().astype("datetime64[s]").astype(np.int64) // self.bucket_seconds
+        if not len(buckets):
+            return
+        present, inverse = np.unique(buckets, return_inverse=True)
+        for feature, edges in self.bins.items():
+            values = np.asarray(cols[feature], dtype=np.float64)[ok]
+            keep = ~np.isnan(values)
+            nb = len(edges) - 1
+            idx = np.clip(np.searchsorted(edges, values[keep], side="right") - 1, 0, nb - 1)
+            counts = np.bincount(inverse[keep] * nb + idx, minlength=len(present) * nb).reshape(len(present), nb)
+            for b, row in zip(present.tolist(), counts):
+                if row.any():
+                    key = (feature, b)
+                    acc[key] = acc[key] + row if key in acc else row
+
+    def update(self):
+        """Fold decisions logged since the last update into the bucket histograms; returns rows read."""
+        with self._lock:
+            start = last = self._last_rowid()
+            acc, rows = {}, 0
+            for cols in self._chunks(start):
+                if not len(cols["id"]):
+                    continue
+                self._fold(cols, acc)
+                rows += len(cols["id"])
+                last = max(last, int(np.max(cols["id"])))
+            if last == start:
+                return 0
+
+            with transaction(INCIDENT_DB, immediate=True) as conn:
+                if self._last_rowid(conn) != start:
+                    return 0        # another monitor got there first; its counts include these rows
+                for (feature, bucket), counts in acc.items():
+                    row = conn.execute("SELECT counts FROM drift_buckets WHERE name=? AND feature=? AND bucket=?",
+                                       (self.name, feature, bucket)).fetchone()
+                    if row:
+                        counts = counts + np.array(json.loads(row[0]))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO drift_buckets(name, feature, bucket, n, counts) VALUES (?,?,?,?,?)",
+                        (self.name, feature, bucket, int(counts.sum()), json.dumps(counts.tolist())))
+                conn.execute(
+                    "INSERT OR REPLACE INTO audit_state(name, last_rowid, state_json, updated_at) VALUES (?,?,?,?)",
+                    (self.name, last, json.dumps({"bucket_seconds": self.bucket_seconds}),
+                     datetime.utcnow().isoformat()))
+            return rows
+
+    # ---------------- windows ----------------
+    def _bucket(self, epoch: int) -> int:
+        return epoch // self.bucket_seconds
+
+    def histograms(self, start=None, end=None, per_bucket: bool = False):
+        """{feature: counts} summed over buckets in [start, end); with per_bucket, {feature: {bucket: counts}}."""
+        sql = "SELECT feature, bucket, counts FROM drift_buckets WHERE name=?"
+        args = [self.name]
+        if start is not None:
+            sql += " AND bucket >= ?"
+            args.append(self._bucket(_epoch(start)))
+        if end is not None:
+            sql += " AND bucket < ?"
+            args.append(-(-_epoch(end) // self.bucket_seconds))
+        out = {f: {} if per_bucket else np.zeros(len(e) - 1, dtype=np.int64) for f, e in self.bins.items()}
+        for feature, bucket, counts in query(INCIDENT_DB, sql + " ORDER BY bucket", args):
+            if feature not in out:
+                continue
+            if per_bucket:
+                out[feature][bucket] = np.array(json.loads(counts))
+            else:
+                out[feature] += np.array(json.loads(counts))
+        return out
+
+    def set_reference(self, start, end, reference: str = "baseline"):
+        """Store the histograms of [start, end) as a named reference window."""
+        hist = self.histograms(start, end)
+        with transaction(INCIDENT_DB) as conn:
+            for feature, counts in hist.items():
+                conn.execute("""
+                    INSERT OR REPLACE INTO drift_reference(name, reference, feature, window_start, window_end,
+                                                           n, counts, created_at)
+                    VALUES (?,?,?,?,?,?,?,?)
+                """, (self.name, reference, feature, _iso(_epoch(start)), _iso(_epoch(end)),
+                      int(counts.sum()), json.dumps(counts.tolist()), datetime.utcnow().isoformat()))
+        return {"reference": reference, "start": _iso(_epoch(start)), "end": _iso(_epoch(end)),
+                "rows": {f: int(c.sum()) for f, c in hist.items()}}
+
+    def reference(self, reference: str = "baseline"):
+        rows = query(INCIDENT_DB, "SELECT feature, window_start, window_end, counts FROM drift_reference "
+                                  "WHERE name=? AND reference=?", (self.name, reference))
+        if not rows:
+            return None
+        return {
+            "start": rows[0][1],
+            "end": rows[0][2],
+            "histograms": {r[0]: np.array(json.loads(r[3])) for r in rows}
+        }
+
+    @staticmethod
+    def _scores(current, ref):
+        return {
+            "n": int(np.sum(current)),
+            "psi": histogram_psi(current, ref),
+            "kl": histogram_kl(current, ref),
+            "ks": histogram_ks(current, ref)
+        }
+
+    def report(self, window_seconds: int = 86400, end=None, reference: str = "baseline", series: bool = False):
+        """Drift of the window ending at `end` (default: now) against a stored reference.
+
+        Without a stored reference the baseline is every bucket before the
+        window. With series=True each bucket of the window is scored too.
+        """
+        self.update()
+        end = _epoch(end)
+        start = end - window_seconds
+        stored = self.reference(reference)
+        if stored:
+            ref, ref_window = stored["histograms"], {"name": reference, "start": stored["start"], "end": stored["end"]}
+        else:
+            ref, ref_window = self.histograms(None, start), {"name": None, "start": None, "end": _iso(start)}
+
+        buckets = self.histograms(start, end, per_bucket=True)
+        features = {}
+        for feature, edges in self.bins.items():
+            current = sum(buckets[feature].values(), np.zeros(len(edges) - 1, dtype=np.int64))
+            scores = self._scores(current, ref.get(feature, np.zeros(len(edges) - 1)))
+            scores["drifted"] = scores["n"] > 0 and scores["psi"] > self.psi_threshold
+            if series:
+                scores["series"] = [{"bucket_start": _iso(b * self.bucket_seconds),
+                                     **self._scores(c, ref.get(feature, np.zeros(len(c))))}
+                                    for b, c in buckets[feature].items()]
+            features[feature] = scores
+        return {
+            "window": {"start": _iso(start), "end": _iso(end), "bucket_seconds": self.bucket_seconds},
+            "reference": ref_window,
+            "psi_threshold": self.psi_threshold,
+            "features": features
+        }
+
+    def check(self, window_seconds: int = 86400, reference: str = "baseline"):
+        """report() plus a drift incident for every feature over the PSI threshold."""
+        report = self.report(window_seconds, reference=reference)
+        report["incidents"] = []
+        for feature, scores in report["features"].items():
+            if scores["drifted"]:
+                iid = log_incident("drift_psi", scores["psi"], "MEDIUM")
+                report["incidents"].append({"id": iid, "test": "drift_psi", "feature": feature,
+                                            "value": scores["psi"]})
+        return report
@@ -0,0 +1,155 @@
+# auditor_engine/fairness/engine.py
+# Group fairness over a whole decision table in a few vectorized passes.
+# Labels are binarized once (factorize, then map the few distinct values),
+# every sensitive column is factorized once, and each attribute or
+# intersection of attributes becomes one integer code per row, so per-group
+# counts are a single np.bincount. Confidence intervals come from a
+# stratified bootstrap: with group sizes held fixed, resampling a group's rows
+# only changes its approval count, which is Binomial(n_g, p_g) - so B
+# replicates are one (B, groups) draw instead of B passes over the rows.
+import itertools
+
+import numpy as np
+import pandas as pd
+
+APPROVED_LABELS = ("1", "1.0", "true", "approved", "yes")
+
+
+def binarize(values) -> np.ndarray:
+    """Boolean approval flags for a label column (numbers: non-zero; text: APPROVED_LABELS)."""
+    values = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+        return values.fillna(0).to_numpy() != 0
+    codes, uniques = pd.factorize(values)
+    approved = np.array([str(u).lower() in APPROVED_LABELS for u in uniques] + [False])
+    return approved[codes]          # code -1 (missing) picks the trailing False
+
+
+def _factorize(column: pd.Series):
+    codes, uniques = pd.factorize(column, sort=True)
+    return codes, [str(u) for u in uniques]
+
+
+def _combine(coded):
+    # mixed-radix code per row over several factorized columns; -1 if any is missing
+    codes = np.zeros(len(coded[0][0]), dtype=np.int64)
+    missing = np.zeros(len(codes), dtype=bool)
+    for c, uniques in coded:
+        codes = codes * len(uniques) + np.maximum(c, 0)
+        missing |= c < 0
+    # renumber to the combinations that occur: a lookup table when the code
+    # space is small (one O(n) pass), a sort otherwise
+    space = int(np.prod([len(u) for _, u in coded], dtype=np.float64))
+    if space <= 1 << 24:
+        present = np.flatnonzero(np.bincount(codes[~missing], minlength=space))
+        remap = np.full(space + 1, -1, dtype=np.int64)
+        remap[present] = np.arange(len(present))
+        codes[missing] = space
+        out = remap[codes]
+    else:
+        present, inverse = np.unique(codes[~missing], return_inverse=True)
+        out = np.full(len(codes), -1, dtype=np.int64)
+        out[~missing] = inverse
+    labels = []
+    for code in present.tolist():
+        parts = []
+        for _, uniques in reversed(coded):
+            code, i = divmod(code, len(uniques))
+            parts.append(uniques[i])
+        labels.append("|".join(reversed(parts)))
+    return out, labels
+
+
+def _gaps(rates):
+    # rates: (..., groups) with NaN for groups left out; max-min gap and min/max ratio
+    hi = np.nanmax(rates, axis=-1)
+    lo = np.nanmin(rates, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(hi > 0, lo / hi, np.nan)
+    return hi - lo, ratio
+
+
+def _interval(samples, alpha):
+    lo, hi = np.nanpercentile(samples, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return [float(lo), float(hi)]
+
+
+def _metric(value, samples, alpha):
+    out = {"value": None if np.isnan(value) else float(value)}
+    if samples is not None and not np.isnan(value):
+        out["ci"] = _interval(samples, alpha)
+    return out
+
+
+def _rates(n, k, keep, rng, n_boot):
+    # point rates and (n_boot, groups) bootstrap rates for the kept groups
+    rates = np.where(keep, k / np.maximum(n, 1), np.nan)
+    if not n_boot:
+        return rates, None
+    draws = rng.binomial(np.where(keep, n, 0)[None, :], np.nan_to_num(rates)[None, :], size=(n_boot, len(n)))
+    boot = draws / np.maximum(n, 1)
+    boot[:, ~keep] = np.nan
+    return rates, boot
+
+
+def fairness_report(df: pd.DataFrame, sensitive, label: str = "decision", truth: str = None,
+                    max_order: int = None, min_group: int = 30, n_boot: int = 200,
+                    alpha: float = 0.05, seed: int = 0):
+    """Parity, disparate impact and (with `truth`) equal opportunity per attribute.
+
+    sensitive: column names; every single column and every intersection of up
+    to max_order of them (default: all) is reported. Groups with fewer than
+    min_group rows are listed but left out of the gaps. truth is the
+    ground-truth outcome column; the equal-opportunity gap is the spread of
+    approval rates among truly positive rows. n_boot=0 skips the intervals.
+    """
+    sensitive = [c for c in ([sensitive] if isinstance(sensitive, str) else sensitive) if c in df.columns]
+    if label not in df.columns or not sensitive:
+        return {"rows": len(df), "attributes": {}}
+
+    y = binarize(df[label]).astype(np.float64)
+    positive = binarize(df[truth]) if truth and truth in df.columns else None
+    coded = {c: _factorize(df[c]) for c in sensitive}
+    rng = np.random.default_rng(seed)
+
+    max_order = len(sensitive) if max_order is None else max_order
+    attributes = {}
+    for order in range(1, max_order + 1):
+        for combo in itertools.combinations(sensitive, order):
+            codes, labels = coded[combo[0]] if order == 1 else _combine([coded[c] for c in combo])
+            present = codes >= 0
+            g = len(labels)
+            c, w = (codes, y) if present.all() else (codes[present], y[present])
+            n = np.bincount(c, minlength=g)
+            k = np.bincount(c, weights=w, minlength=g)
+            keep = n >= min_group
+            rates, boot = _rates(n, k, keep, rng, n_boot)
+
+            entry = {"groups": {lab: {"n": int(n[i]), "approval_rate": float(k[i] / n[i]) if n[i] else None}
+                                for i, lab in enumerate(labels)}}
+            if keep.sum() >= 2:
+                gap, ratio = _gaps(rates)
+                boot_gap, boot_ratio = _gaps(boot) if boot is not None else (None, None)
+                entry["parity_gap"] = _metric(gap, boot_gap, alpha)
+                entry["disparate_impact"] = _metric(ratio, boot_ratio, alpha)
+            else:
+                entry["parity_gap"] = entry["disparate_impact"] = {"value": None}
+
+            if positive is not None:
+                sel = present & positive
+                n_pos = np.bincount(codes[sel], minlength=g)
+                tp = np.bincount(codes[sel], weights=y[sel], minlength=g)
+                keep_pos = n_pos >= min_group
+                tpr, boot_tpr = _rates(n_pos, tp, keep_pos, rng, n_boot)
+                for i, lab in enumerate(labels):
+                    entry["groups"][lab]["true_positive_rate"] = float(tp[i] / n_pos[i]) if n_pos[i] else None
+                if keep_pos.sum() >= 2:
+                    gap = _gaps(tpr)[0]
+                    entry["equal_opportunity_gap"] = _metric(gap, _gaps(boot_tpr)[0] if boot_tpr is not None
+                                                             else None, alpha)
+                else:
+                    entry["equal_opportunity_gap"] = {"value": None}
+
+            attributes["+".join(combo)] = entry
+    return {"rows": len(df), "label": label, "min_group": min_group,
+            "confidence": 1 - alpha if n_boot else None, "attributes": attributes}
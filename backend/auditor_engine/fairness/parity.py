@@ -1,15 +1,17 @@
+import numpy as np
 import pandas as pd
 
+from auditor_engine.fairness.engine import binarize
+
 def statistical_parity(df, sensitive, label="decision"):
+    """Largest approval-rate gap between any two groups of `sensitive` (NaN with fewer than two)."""
     if sensitive not in df.columns or label not in df.columns:
         return float('nan')
-    col = df[label].apply(lambda x: 1 if str(x).lower() in ("1","true","approved","yes") else 0)
-    groups = df[sensitive].unique()
-    if len(groups) < 2:
-        return float('nan')
-    g0 = df[df[sensitive] == groups[0]]
-    g1 = df[df[sensitive] == groups[1]]
-    if len(g0) == 0 or len(g1) == 0:
+    codes, _ = pd.factorize(df[sensitive])
+    present = codes >= 0
+    n = np.bincount(codes[present])
+    if (n > 0).sum() < 2:
         return float('nan')
-    return float(g0[label].apply(lambda x: 1 if str(x).lower() in ("1","true","approved","yes") else 0).mean()
-                 - g1[label].apply(lambda x: 1 if str(x).lower() in ("1","true","approved","yes") else 0).mean())
+    rates = np.bincount(codes[present], weights=binarize(df[label])[present]) / np.maximum(n, 1)
+    rates = rates[n > 0]
+    return float(rates.max() - rates.min())
@@ -1,178 +1,265 @@
-# receipts_module.py
-# Place this file in your project, e.g. auditor_engine/receipts.py
-# This module implements AI Receipt creation and retrieval.
-
-import os
-import sqlite3
+# auditor_engine/receipts.py
+# AI receipts: exactly one per logged decision. A receipt is built from its
+# action row, anchored once (receipt epoch + action-log leaf) and stored with
+# the anchor, so asking again returns the same receipt instead of a new row.
+# receipt_id is derived from the action id ("rc_<id>"), which is what makes
+# generation idempotent across calls, workers and restarts. The "rc_" prefix
+# keeps canonical ids apart from every "r_..." id handed out before.
+import contextlib
 import json
-import uuid
+import re
+import threading
 from datetime import datetime
-from typing import Dict, Any, List, Optional
 
-# path to the action logs DB (same as your main.py uses)
-DB_ACTIONS = os.path.join(os.path.dirname(__file__), "..", "action_logs.db")
+from explain_service.cache import ResultCache
+from storage.pagination import iter_rows
+from storage.sqlite import query, query_one, transaction
+from verifiable.merkle import sha256
+
+ALTERNATIVES = [
+    "Increase credit score to 650",
+    "Reduce spending ratio below 40%",
+    "Increase income by ₹10,000"
+]
+
+
+# "r_<action id>_<unix time>", as the old /receipts/generate handed them out
+LEGACY_RECEIPT_ID = re.compile(r"r_(\d+)_(\d+)$")
+
+
+def receipt_id_for(action_rowid: int) -> str:
+    return f"rc_{action_rowid}"
+
+
+def receipt_leaf(receipt: dict) -> str:
+    """Canonical receipt without its anchor, as /zk/verify recomputes it."""
+    body = {k: v for k, v in receipt.items() if k != "audit_anchor"}
+    return sha256(json.dumps(body, sort_keys=True).encode())
+
+
+def _in_chunks(ids, chunk):
+    for i in range(0, len(ids), chunk):
+        part = ids[i:i + chunk]
+        yield part, ",".join("?" * len(part))
+
+
+class ReceiptService:
+    """Idempotent receipt generation and lookup with a read-through cache.
+
+    action_db holds action_logs (plus the optional archive and Merkle log);
+    receipts_db holds the receipts table and the anchor epochs.
+    """
+
+    def __init__(self, action_db: str, receipts_db: str, archive=None, anchorer=None,
+                 merkle_log=None, cache_size: int = 8192, chunk: int = 500):
+        self.action_db = action_db
+        self.receipts_db = receipts_db
+        self.archive = archive
+        self.anchorer = anchorer
+        self.merkle_log = merkle_log
+        self.chunk = chunk
+        # stored receipts never change, so the ttl only bounds staleness after a restore
+        self.cache = ResultCache(maxsize=cache_size, ttl=3600)
+        self._lock = threading.Lock()
+
+    # ---------------- reading ----------------
+    def get(self, receipt_id: str):
+        """The stored receipt, or None if it was never generated.
 
-# Initialize receipts table inside the same DB used for action logs
-def init_receipts_table():
-    conn = sqlite3.connect(DB_ACTIONS)
-    c = conn.cursor()
-    c.execute(
+        Ids issued before receipts were canonical ("r_<row id>" and
+        "r_<action id>_<time>") resolve to the legacy receipt as it was
+        issued; they never name a canonical receipt.
         """
-        CREATE TABLE IF NOT EXISTS receipts (
-            id TEXT PRIMARY KEY,
-            action_row_id INTEGER,
-            user_id TEXT,
-            receipt_json TEXT,
-            created_at TEXT
-        )
+        key = ("receipt", receipt_id)
+        found, receipt = self.cache.get(key)
+        if found:
+            return receipt
+        row = query_one(self.receipts_db, "SELECT receipt_json, id FROM receipts WHERE receipt_id=?", (receipt_id,))
+        if row and row[0]:
+            receipt = json.loads(row[0])
+        else:
+            # a canonical row not completed yet is still its legacy receipt
+            receipt = self._legacy(receipt_id, row[1] if row else None)
+            if receipt is None:
+                return None
+        self.cache.put(key, receipt)
+        return receipt
+
+    def _legacy(self, receipt_id: str, row_id: int = None):
+        cols = ("action_rowid, user_id, summary, reasons, used_data, alternatives, audit_anchor, timestamp "
+                "FROM receipts_legacy")
+        m = LEGACY_RECEIPT_ID.match(receipt_id)
+        if row_id is not None:
+            row = query_one(self.receipts_db, f"SELECT {cols} WHERE row_id=?", (row_id,))
+        elif m:
+            # the issue time is not stored; an action's receipts share every other field
+            row = query_one(self.receipts_db, f"SELECT {cols} WHERE action_rowid=? ORDER BY row_id LIMIT 1",
+                            (int(m.group(1)),))
+        else:
+            row = query_one(self.receipts_db, f"SELECT {cols} WHERE legacy_id=?", (receipt_id,))
+        if not row:
+            return None
+        return {
+            "receipt_id": receipt_id,
+            "action_id": row[0],
+            "user_id": row[1],
+            "summary": row[2],
+            "reasons": json.loads(row[3]) if row[3] else [],
+            "used_data": json.loads(row[4]) if row[4] else {},
+            "alternatives": json.loads(row[5]) if row[5] else [],
+            "audit_anchor": json.loads(row[6]) if row[6] else None,
+            "timestamp": row[7],
+            "legacy": True,
+            "canonical_receipt_id": receipt_id_for(row[0])
+        }
+
+    def iter_user(self, user_id: str, after_id: int = None, limit: int = None):
+        """A user's receipts in action order, past action id after_id, read page by page."""
+        rows = iter_rows(self.receipts_db, "SELECT action_rowid, receipt_id, summary, timestamp FROM receipts",
+                         "action_rowid", "user_id=?", (user_id,), after_id, limit)
+        for r in rows:
+            yield {"receipt_id": r[1], "action_id": r[0], "summary": r[2], "timestamp": r[3]}
+
+    def for_user(self, user_id: str, after_id: int = None, limit: int = None):
+        return list(self.iter_user(user_id, after_id, limit))
+
+    def _stored(self, action_ids):
+        # {action_id: receipt} for receipts already issued; one indexed read
+        out = {}
+        for part, marks in _in_chunks(action_ids, self.chunk):
+            rows = query(self.receipts_db,
+                         f"SELECT action_rowid, receipt_json FROM receipts "
+                         f"WHERE action_rowid IN ({marks}) AND receipt_json IS NOT NULL", part)
+            out.update((r[0], json.loads(r[1])) for r in rows)
+        return out
+
+    def _actions(self, action_ids):
+        # {action_id: row} from the hot table, falling back to the archive
+        cols = ("user_id", "inputs", "output", "explanation", "created_at", "hash")
+        out = {}
+        for part, marks in _in_chunks(action_ids, self.chunk):
+            rows = query(self.action_db,
+                         f"SELECT id, {', '.join(cols)} FROM action_logs WHERE id IN ({marks})", part)
+            out.update((r[0], dict(zip(cols, r[1:]))) for r in rows)
+        if self.archive:
+            for action_id in action_ids:
+                if action_id not in out:
+                    archived = self.archive.lookup(action_id)
+                    if archived:
+                        out[action_id] = {c: archived[c] for c in cols}
+        return out
+
+    # ---------------- writing ----------------
+    @staticmethod
+    def build(action_id: int, action: dict) -> dict:
+        explanation = action["explanation"] or ""
+        output = json.loads(action["output"])
+        return {
+            "receipt_id": receipt_id_for(action_id),
+            "action_id": action_id,
+            "user_id": action["user_id"],
+            "summary": f"Loan decision: {output['decision']}",
+            "reasons": [s.strip() for s in explanation.split(".") if s.strip()],
+            "used_data": json.loads(action["inputs"]),
+            "alternatives": ALTERNATIVES,
+            "audit_anchor": None,
+            "timestamp": action["created_at"]
+        }
+
+    def generate(self, action_id: int):
+        """The receipt for one action, created on first request; None if the action is unknown."""
+        return self.generate_many([action_id]).get(action_id)
+
+    def generate_many(self, action_ids):
+        """{action_id: receipt} for every known action in action_ids.
+
+        Cached and stored receipts are returned as they are. The rest are read
+        with one pass over action_logs, then anchored and inserted in a single
+        receipts.db transaction.
         """
-    )
-    conn.commit()
-    conn.close()
-
-
-init_receipts_table()
-
-
-# Helper: read action log by row id
-def get_action_by_rowid(rowid: int) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_ACTIONS)
-    c = conn.cursor()
-    r = c.execute("SELECT id, user_id, inputs, output, explanation, model_version, created_at, hash FROM action_logs WHERE id = ?", (rowid,)).fetchone()
-    conn.close()
-    if not r:
-        return None
-    # map columns
-    return {
-        "rowid": r[0],
-        "user_id": r[1],
-        "inputs": json.loads(r[2]) if r[2] else {},
-        "output": json.loads(r[3]) if r[3] else {},
-        "explanation": r[4],
-        "model_version": r[5],
-        "created_at": r[6],
-        "hash": r[7]
-    }
-
-
-# Create a receipt dict from an action log row
-def build_receipt_from_action(action: Dict[str, Any]) -> Dict[str, Any]:
-    receipt_id = str(uuid.uuid4())
-    action_id = f"a_{action['rowid']}"
-
-    # Simple reasons extraction: use explanation text or top attribution keys
-    reasons = []
-    if action.get("explanation"):
-        # keep the explanation short as the major reason(s)
-        reasons.append(action["explanation"].split('\n')[0])
-    else:
-        reasons.append("Model decision summary not available")
-
-    # used_data: infer from inputs keys
-    used_data = list(action.get("inputs", {}).keys())
-
-    # simple alternatives: try to produce user-friendly hints (demo)
-    alternatives = []
-    out = action.get("output", {})
-    if out.get("decision") == "denied":
-        alternatives = ["Add a co-signer", "Increase downpayment", "Correct income estimate in AI Twin"]
-    else:
-        alternatives = ["No action needed"]
-
-    receipt = {
-        "receipt_id": receipt_id,
-        "action_id": action_id,
-        "summary": f"Decision: {out.get('decision', 'unknown')}",
-        "reasons": reasons,
-        "used_data": used_data,
-        "alternatives": alternatives,
-        # audit anchor placeholder (fill with real merkle anchor later)
-        "audit_anchor": None,
-        "zk_proof_meta": None,
-        "created_at": datetime.utcnow().isoformat()
-    }
-
-    return receipt
-
-
-# Persist receipt into receipts table
-def save_receipt(rowid: int, receipt: Dict[str, Any]):
-    conn = sqlite3.connect(DB_ACTIONS)
-    c = conn.cursor()
-    c.execute("INSERT OR REPLACE INTO receipts (id, action_row_id, user_id, receipt_json, created_at) VALUES (?,?,?,?,?)",
-              (receipt["receipt_id"], rowid, receipt.get("user_id", ""), json.dumps(receipt), receipt.get("created_at")))
-    conn.commit()
-    conn.close()
-
-
-# Public: generate receipt for a given action row id (if not exists)
-def generate_receipt_for_action(rowid: int) -> Dict[str, Any]:
-    action = get_action_by_rowid(rowid)
-    if not action:
-        raise ValueError("action not found")
-
-    # check if receipt already exists
-    conn = sqlite3.connect(DB_ACTIONS)
-    c = conn.cursor()
-    existing = c.execute("SELECT receipt_json FROM receipts WHERE action_row_id = ?", (rowid,)).fetchone()
-    conn.close()
-
-    if existing:
-        return json.loads(existing[0])
-
-    receipt = build_receipt_from_action(action)
-    # attach metadata
-    receipt["user_id"] = action.get("user_id")
-
-    # Save
-    save_receipt(rowid, receipt)
-    return receipt
-
-
-# Public: fetch receipts for a user
-def get_receipts_for_user(user_id: str) -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_ACTIONS)
-    c = conn.cursor()
-    rows = c.execute("SELECT receipt_json FROM receipts WHERE user_id = ? ORDER BY created_at DESC", (user_id,)).fetchall()
-    conn.close()
-    out = []
-    for r in rows:
+        action_ids = list(dict.fromkeys(int(a) for a in action_ids))
+        out = {}
+        for action_id in action_ids:
+            found, receipt = self.cache.get(("receipt", receipt_id_for(action_id)))
+            if found:
+                out[action_id] = receipt
+        todo = [a for a in action_ids if a not in out]
+        if todo:
+            out.update(self._stored(todo))
+            todo = [a for a in todo if a not in out]
+        if todo:
+            actions = self._actions(todo)
+            built = [self.build(a, actions[a]) for a in todo if a in actions]
+            if built:
+                with self._lock:
+                    out.update(self._issue(built, {a: actions[a]["hash"] for a in actions}))
+
+        for receipt in out.values():
+            self.cache.put(("receipt", receipt["receipt_id"]), receipt)
+        return out
+
+    def _issue(self, built, action_hashes):
+        log_leaves = self.merkle_log.leaf_indices([r["action_id"] for r in built]) if self.merkle_log else {}
+        log_size, log_root = self.merkle_log.head() if self.merkle_log else (0, b"")
+        # the anchorer's lock before the write lock, the order its tick thread uses too
+        anchor_lock = self.anchorer.lock if self.anchorer else contextlib.nullcontext()
         try:
-            out.append(json.loads(r[0]))
-        except Exception:
-            continue
-    return out
-
-
-# Small helper: attach a merkle anchor using verifiable.merkle if available
-try:
-    from verifiable.merkle import merkle_root
-    def attach_anchor_to_receipt(receipt: Dict[str, Any]):
-        # collect last 32 hashes from action_logs and compute root
-        conn = sqlite3.connect(DB_ACTIONS)
-        rows = conn.execute("SELECT hash FROM action_logs ORDER BY created_at DESC LIMIT 32").fetchall()
-        conn.close()
-        leaves = [bytes(r[0], "utf-8") for r in rows]
-        root = merkle_root(leaves) if leaves else None
-        receipt["audit_anchor"] = {"merkle_root": root}
-        return receipt
-except Exception:
-    def attach_anchor_to_receipt(receipt: Dict[str, Any]):
-        # noop
-        receipt["audit_anchor"] = None
-        return receipt
+            with anchor_lock, transaction(self.receipts_db, immediate=True) as conn:
+                # another worker may have issued some of them while we were reading
+                ids = [r["action_id"] for r in built]
+                issued = {}
+                for part, marks in _in_chunks(ids, self.chunk):
+                    rows = conn.execute(f"SELECT action_rowid, receipt_json FROM receipts "
+                                        f"WHERE action_rowid IN ({marks}) AND receipt_json IS NOT NULL",
+                                        part).fetchall()
+                    issued.update((r[0], json.loads(r[1])) for r in rows)
+                fresh = [r for r in built if r["action_id"] not in issued]
 
+                leaves = [receipt_leaf(r) for r in fresh]
+                anchors = (self.anchorer.add_many(leaves, [r["receipt_id"] for r in fresh])
+                           if self.anchorer else [(None, None)] * len(fresh))
+                batch_ts = datetime.utcnow().isoformat()
+                for receipt, leaf, (epoch_id, leaf_index) in zip(fresh, leaves, anchors):
+                    # the epoch root is published when the epoch seals; see /receipts/epochs/{epoch_id}
+                    receipt["audit_anchor"] = {
+                        "epoch_id": epoch_id,
+                        "leaf_index": leaf_index,
+                        "leaf_hash": leaf,
+                        "batch_timestamp": batch_ts
+                    }
+                    # where the decision itself sits in the append-only action log
+                    log_index = log_leaves.get(receipt["action_id"])
+                    if log_index is not None:
+                        receipt["audit_anchor"]["action_log"] = {
+                            "leaf": action_hashes.get(receipt["action_id"]),
+                            "leaf_index": log_index,
+                            "tree_size": log_size,
+                            "root": log_root.hex()
+                        }
 
-# Example: endpoint snippets (to add to your FastAPI app)
-#
-# from auditor_engine.receipts import generate_receipt_for_action, get_receipts_for_user, attach_anchor_to_receipt
-#
-# @app.post("/receipts/generate/{action_rowid}")
-# def api_generate_receipt(action_rowid: int):
-#     r = generate_receipt_for_action(action_rowid)
-#     r = attach_anchor_to_receipt(r)
-#     return r
-#
-# @app.get("/receipts/{user_id}")
-# def api_get_receipts(user_id: str):
-#     return {"receipts": get_receipts_for_user(user_id)}
+                # rows from before receipt_json existed are completed in place; their
+                # original audit_anchor column is left as it was issued
+                conn.executemany("""
+                    INSERT INTO receipts(receipt_id, action_rowid, user_id, summary, reasons, used_data,
+                                         alternatives, audit_anchor, receipt_json, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(action_rowid) DO UPDATE SET
+                        receipt_id=excluded.receipt_id, receipt_json=excluded.receipt_json
+                """, [(
+                    r["receipt_id"],
+                    r["action_id"],
+                    r["user_id"],
+                    r["summary"],
+                    json.dumps(r["reasons"]),
+                    json.dumps(r["used_data"]),
+                    json.dumps(r["alternatives"]),
+                    json.dumps(r["audit_anchor"]),
+                    json.dumps(r),
+                    r["timestamp"]
+                ) for r in fresh])
+        except BaseException:
+            # the leaves handed to the anchorer were rolled back with us
+            if self.anchorer:
+                self.anchorer.reload()
+            raise
+        return {**{r["action_id"]: r for r in fresh}, **issued}
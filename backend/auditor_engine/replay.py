@@ -0,0 +1,199 @@
+# auditor_engine/replay.py
+# Shadow replay: score the historical decision ledger with a candidate model
+# and compare with what was logged, before the candidate serves any traffic.
+# The id range is cut into slices; a worker process reads its slice (archive
+# parts, then the hot table) in chunks of typed columns, scores each chunk
+# with one vectorized predict and reduces it to counts and sums. Only those
+# small aggregates cross process boundaries, and merging them is addition.
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from storage.archive import LedgerArchive
+from storage.columnar import DECISION_COLUMNS, FEATURE_COLUMNS, iter_decision_chunks
+from storage.sqlite import query, query_one
+
+SENSITIVE_CANDIDATES = ("region", "gender", "race")
+
+# groups derived from the features themselves: name -> (feature, band edges, labels)
+FEATURE_BANDS = {
+    "age_band": ("age", [31, 51], ["18-30", "31-50", "51+"]),
+    "income_band": ("income", [30000, 60000, 100000], ["<30k", "30-60k", "60-100k", "100k+"]),
+}
+
+
+def _empty(n_features):
+    return {
+        "rows": 0,
+        "skipped": 0,
+        "logged_approved": 0,
+        "candidate_approved": 0,
+        "denied_to_approved": 0,
+        "approved_to_denied": 0,
+        # attribute -> group -> [rows, logged approvals, candidate approvals]
+        "groups": {},
+        # sums over rows of the per-feature attributions (and their absolute values)
+        "attribution": {k: np.zeros(n_features) for k in ("logged", "candidate", "logged_abs", "candidate_abs")},
+    }
+
+
+def _merge(total, part):
+    for k in ("rows", "skipped", "logged_approved", "candidate_approved", "denied_to_approved",
+              "approved_to_denied"):
+        total[k] += part[k]
+    for attr, groups in part["groups"].items():
+        dest = total["groups"].setdefault(attr, {})
+        for g, counts in groups.items():
+            dest[g] = [a + b for a, b in zip(dest.get(g, [0, 0, 0]), counts)]
+    for k, v in part["attribution"].items():
+        total["attribution"][k] += v
+    return total
+
+
+def _add_groups(agg, attr, values, logged, candidate):
+    groups, inverse = np.unique(values, return_inverse=True)
+    n = np.bincount(inverse, minlength=len(groups))
+    lo = np.bincount(inverse, weights=logged, minlength=len(groups))
+    ca = np.bincount(inverse, weights=candidate, minlength=len(groups))
+    dest = agg["groups"].setdefault(attr, {})
+    for g, counts in zip(groups.tolist(), zip(n.tolist(), lo.tolist(), ca.tolist())):
+        dest[g] = [a + int(b) for a, b in zip(dest.get(g, [0, 0, 0]), counts)]
+
+
+def _score_chunk(agg, cols, candidate, production, sensitive):
+    X = np.column_stack([cols[f] for f in FEATURE_COLUMNS])
+    logged = cols["decision"]
+    ok = ~(np.isnan(X).any(axis=1) | np.isnan(logged))
+    agg["skipped"] += int((~ok).sum())
+    if not ok.all():
+        X, logged = X[ok], logged[ok]
+    if not len(X):
+        return
+    logged = logged == 1
+    approved = candidate.predict_codes(X).astype(bool)
+
+    agg["rows"] += len(X)
+    agg["logged_approved"] += int(logged.sum())
+    agg["candidate_approved"] += int(approved.sum())
+    agg["denied_to_approved"] += int((approved & ~logged).sum())
+    agg["approved_to_denied"] += int((logged & ~approved).sum())
+
+    for attr, (feature, edges, labels) in FEATURE_BANDS.items():
+        band = np.searchsorted(edges, X[:, FEATURE_COLUMNS.index(feature)], side="right")
+        _add_groups(agg, attr, np.asarray(labels, dtype=object)[band], logged, approved)
+    for attr, values in sensitive.items():
+        values = np.asarray(values, dtype=object)[ok]
+        present = (values != None) & (values != "")  # noqa: E711
+        if present.any():
+            _add_groups(agg, attr, values[present].astype(str), logged[present], approved[present])
+
+    # logged attributions were not stored; recompute them with the production model
+    for name, model in (("logged", production), ("candidate", candidate)):
+        shap, _ = model.shap_values(X)
+        agg["attribution"][name] += shap.sum(axis=0)
+        agg["attribution"][name + "_abs"] += np.abs(shap).sum(axis=0)
+
+
+def _sensitive_columns(action_db):
+    cols = {r[1] for r in query(action_db, "PRAGMA table_info(action_logs)")}
+    return [c for c in SENSITIVE_CANDIDATES if c in cols]
+
+
+def replay_slice(action_db, archive_dir, after_id, upto_id, candidate, production, chunk_size=100000):
+    """Aggregates for rows after_id < id <= upto_id. Runs in a pool worker."""
+    sensitive = _sensitive_columns(action_db)
+    agg = _empty(len(FEATURE_COLUMNS))
+    chunks = iter_decision_chunks(action_db, after_id, chunk_size, upto_id)
+    if archive_dir:
+        archive = LedgerArchive(action_db, archive_dir)
+        chunks = itertools.chain(archive.scan(DECISION_COLUMNS + tuple(sensitive), after_id, upto_id), chunks)
+    for cols in chunks:
+        values = {}
+        for col in sensitive:
+            values[col] = cols.get(col)
+            if values[col] is None:
+                rows = query(action_db, f"SELECT {col} FROM action_logs WHERE id BETWEEN ? AND ? ORDER BY id",
+                             (int(cols["id"][0]), int(cols["id"][-1])))
+                values[col] = [r[0] for r in rows]
+        _score_chunk(agg, cols, candidate, production, values)
+    return agg
+
+
+def _id_range(action_db, archive, after_id, upto_id):
+    hi = query_one(action_db, "SELECT MAX(id) FROM action_logs")[0] or 0
+    if archive is not None:
+        hi = max([hi] + [p["last_id"] for p in archive.parts(after_id)])
+    return after_id, hi if upto_id is None else min(hi, upto_id)
+
+
+def _rate(k, n):
+    return k / n if n else None
+
+
+def _report(agg, candidate, production, id_range, seconds):
+    n = agg["rows"]
+    flips = agg["denied_to_approved"] + agg["approved_to_denied"]
+    groups = {}
+    for attr, counts in agg["groups"].items():
+        groups[attr] = {}
+        for g, (gn, lo, ca) in sorted(counts.items()):
+            groups[attr][g] = {"n": gn, "logged_rate": _rate(lo, gn), "candidate_rate": _rate(ca, gn),
+                               "delta": _rate(ca - lo, gn)}
+    attribution = {}
+    a = agg["attribution"]
+    for i, feature in enumerate(candidate.feature_names):
+        attribution[feature] = {
+            "logged_mean": _rate(float(a["logged"][i]), n),
+            "candidate_mean": _rate(float(a["candidate"][i]), n),
+            "logged_mean_abs": _rate(float(a["logged_abs"][i]), n),
+            "candidate_mean_abs": _rate(float(a["candidate_abs"][i]), n),
+            "shift": _rate(float(a["candidate_abs"][i] - a["logged_abs"][i]), n),
+        }
+    return {
+        "candidate_version": candidate.version,
+        "baseline_version": production.version,
+        "id_range": {"after_id": id_range[0], "upto_id": id_range[1]},
+        "rows": n,
+        "skipped_rows": agg["skipped"],
+        "flip_rate": _rate(flips, n),
+        "flips": {"denied_to_approved": agg["denied_to_approved"], "approved_to_denied": agg["approved_to_denied"]},
+        "approval_rate": {"logged": _rate(agg["logged_approved"], n),
+                          "candidate": _rate(agg["candidate_approved"], n),
+                          "delta": _rate(agg["candidate_approved"] - agg["logged_approved"], n)},
+        "groups": groups,
+        "attribution_shift": attribution,
+        "seconds": round(seconds, 3),
+        "rows_per_minute": int(n / seconds * 60) if seconds > 0 else None,
+    }
+
+
+def shadow_replay(candidate, action_db, production, archive=None, after_id: int = 0, upto_id: int = None,
+                  workers: int = None, chunk_size: int = 100000):
+    """Replay logged decisions in (after_id, upto_id] through `candidate`.
+
+    production is the model that made the logged decisions; its attributions
+    are the reference for the attribution shift. With workers > 1 the id
+    range is split into slices scored by a pool of spawned processes (at
+    most one per CPU); the models must be picklable.
+    """
+    t0 = time.perf_counter()
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, cpus))
+    lo, hi = _id_range(action_db, archive, after_id, upto_id)
+    archive_dir = archive.archive_dir if archive is not None else None
+    agg = _empty(len(FEATURE_COLUMNS))
+    if workers <= 1 or hi - lo < chunk_size:
+        agg = replay_slice(action_db, archive_dir, lo, hi, candidate, production, chunk_size)
+    else:
+        # a few slices per worker so an uneven slice does not leave the others idle
+        cuts = np.unique(np.linspace(lo, hi, workers * 4 + 1).astype(np.int64)).tolist()
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(replay_slice, action_db, archive_dir, a, b, candidate, production, chunk_size)
+                       for a, b in zip(cuts, cuts[1:])]
+            for f in futures:
+                _merge(agg, f.result())
+    return _report(agg, candidate, production, (lo, hi), time.perf_counter() - t0)
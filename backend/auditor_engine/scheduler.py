@@ -1,61 +1,261 @@
-import sqlite3, json, pandas as pd
+# auditor_engine/scheduler.py
+# Background audit jobs. Every API worker imports this module, but only the
+# process holding an exclusive lock on LOCK_PATH (one per host) runs the
+# schedule; the others keep retrying the lock, so a new leader takes over
+# when the old one exits. Jobs run in a spawned worker process, so a full
+# audit never holds the GIL of a request-serving process. Every run - and
+# every run skipped because the previous one was still going - is recorded
+# in scheduler_runs, so any worker can report job metrics.
+import atexit
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+
 from apscheduler.schedulers.background import BackgroundScheduler
-from auditor_engine.core import EthicalAIAuditor
-import os
+from auditor_engine.incremental import IncrementalAuditor
+from auditor_engine.drift.windows import DriftMonitor
+from storage.archive import LedgerArchive
+from storage.sqlite import execute, query
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+log = logging.getLogger(__name__)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ACTION_DB = os.path.join(BASE_DIR, "..", "api", "action_logs.db")
 INCIDENT_DB = os.path.join(BASE_DIR, "incidents.db")
+ARCHIVE_DIR = os.path.join(BASE_DIR, "..", "api", "archive")
+LOCK_PATH = os.path.join(BASE_DIR, "scheduler.lock")
+RETENTION_DAYS = 90
 
-auditor = EthicalAIAuditor()
+archive = LedgerArchive(ACTION_DB, ARCHIVE_DIR)
+auditor = IncrementalAuditor(ACTION_DB, archive=archive)
+drift = DriftMonitor(ACTION_DB, archive=archive)
 
 def run_fairness_audit():
-    conn = sqlite3.connect(ACTION_DB)
-    rows = conn.execute("SELECT inputs, output FROM action_logs").fetchall()
-    conn.close()
-
-    if not rows:
-        return
-
-    # Prepare DF
-    data = []
-    for i, (inp, out) in enumerate(rows):
-        inp_json = json.loads(inp)
-        out_json = json.loads(out)
-        inp_json["decision"] = out_json["decision"]
-        data.append(inp_json)
-
-    df = pd.DataFrame(data)
-
-    result = auditor.run_audit(df, sensitive_col=None)
-
-    # Save incidents
-    conn = sqlite3.connect(INCIDENT_DB)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS incidents (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            test TEXT,
-            value REAL,
-            severity TEXT,
-            created_at TEXT
-        )
-    """)
+    # only decisions logged since the previous run are read
+    return auditor.run(mode="incremental")
+
+
+def run_drift_check():
+    # last 24 h against the stored baseline (or everything before it)
+    return drift.check(window_seconds=86400)
+
+
+def compact_action_logs():
+    # keep the hot SQLite file small; older decisions move to the archive
+    return archive.compact(RETENTION_DAYS)
+
+
+# name -> (module-level function, interval trigger arguments)
+JOBS = {
+    "fairness_audit": (run_fairness_audit, {"minutes": 30}),
+    "drift_check": (run_drift_check, {"minutes": 30}),
+    "compact_action_logs": (compact_action_logs, {"hours": 24}),
+}
+
+
+def _timed(fn):
+    # runs in the pool process; only the runtime travels back
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+class LeaderLock:
+    """Non-blocking exclusive lock on a file, released by the OS when the holder exits."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = None
+
+    @property
+    def held(self) -> bool:
+        return self._fh is not None
 
-    for r in result.get("incidents", []):
-        c.execute("""
-            INSERT INTO incidents(test, value, severity, created_at)
-            VALUES (?, ?, ?, ?)
-        """, (
-            r["test"], r["value"], r["severity"], datetime.utcnow().isoformat()
-        ))
+    def acquire(self) -> bool:
+        if self._fh is not None:
+            return True
+        fh = open(self.path, "a+")
+        try:
+            if fcntl:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            fh.close()
+            return False
+        fh.seek(0)
+        fh.truncate()
+        fh.write(f"{socket.gethostname()} {os.getpid()}\n")
+        fh.flush()
+        self._fh = fh
+        return True
 
-    conn.commit()
-    conn.close()
+    def release(self):
+        if self._fh is None:
+            return
+        if fcntl:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        else:
+            self._fh.seek(0)
+            msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+        self._fh.close()
+        self._fh = None
+
+    def holder(self):
+        """'host pid' of the current leader, as written into the lock file."""
+        try:
+            with open(self.path) as fh:
+                return fh.read().strip() or None
+        except OSError:
+            return None
+
+
+class AuditScheduler:
+    """APScheduler front-end that runs JOBS only while holding the leader lock.
+
+    Followers poll the lock every retry_seconds. The leader dispatches each
+    job to a process pool of `workers` spawned processes; a job still running
+    when its next run is due is skipped and recorded as such.
+    """
+
+    def __init__(self, jobs=None, lock_path: str = LOCK_PATH, retry_seconds: int = 30, workers: int = 1):
+        self.jobs = JOBS if jobs is None else jobs
+        self.lock = LeaderLock(lock_path)
+        self.retry_seconds = retry_seconds
+        self.workers = workers
+        self._scheduler = None
+        self._pool = None
+        self._running = {}          # job -> dispatch time
+        self._lock = threading.Lock()
+
+    @property
+    def leader(self) -> bool:
+        return self.lock.held
+
+    def start(self):
+        self._scheduler = BackgroundScheduler()
+        if not self._try_lead():
+            self._scheduler.add_job(self._try_lead, "interval", seconds=self.retry_seconds, id="leader_election")
+        self._scheduler.start()
+        atexit.register(self.shutdown)
+        return self
+
+    def shutdown(self):
+        if self._scheduler is not None and self._scheduler.running:
+            self._scheduler.shutdown(wait=False)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        self.lock.release()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _try_lead(self):
+        if self.leader or not self.lock.acquire():
+            return self.leader
+        log.info("audit scheduler: leader is pid %s", os.getpid())
+        self._pool = self._new_pool()
+        for name, (_, trigger) in self.jobs.items():
+            self._scheduler.add_job(self.dispatch, "interval", args=(name,), id=name, **trigger)
+        if self._scheduler.get_job("leader_election"):
+            self._scheduler.remove_job("leader_election")
+        return True
+
+    def dispatch(self, name: str):
+        """Submit one run of `name` to the pool; returns the Future, or None if skipped."""
+        with self._lock:
+            if name in self._running:
+                _record(name, "skipped", time.time(), None, None)
+                return None
+            self._running[name] = started = time.time()
+        try:
+            future = self._pool.submit(_timed, self.jobs[name][0])
+        except BrokenProcessPool:
+            self._pool = self._new_pool()
+            future = self._pool.submit(_timed, self.jobs[name][0])
+        future.add_done_callback(lambda f: self._finished(name, started, f))
+        return future
+
+    def _finished(self, name, started, future):
+        with self._lock:
+            self._running.pop(name, None)
+        elapsed = time.time() - started
+        error = None if future.cancelled() else future.exception()
+        if future.cancelled():
+            _record(name, "cancelled", started, None, elapsed)
+        elif error is not None:
+            log.error("audit job %s failed: %r", name, error)
+            _record(name, "failed", started, elapsed, 0.0, repr(error))
+        else:
+            runtime = future.result()
+            _record(name, "ok", started, runtime, elapsed - runtime)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            running = {name: round(now - t, 3) for name, t in self._running.items()}
+        return {
+            "leader": self.leader,
+            "pid": os.getpid(),
+            "leader_holder": self.lock.holder(),
+            "running": running,
+            "jobs": job_stats()
+        }
+
+
+def _record(job, status, started, runtime, queued, error=None):
+    execute(INCIDENT_DB, """
+        INSERT INTO scheduler_runs(job, status, host, pid, started_at, runtime, queued, error)
+        VALUES (?,?,?,?,?,?,?,?)
+    """, (job, status, socket.gethostname(), os.getpid(), datetime.utcfromtimestamp(started).isoformat(),
+          runtime, queued, error))
+
+
+def job_stats():
+    """Per-job run counts and runtimes from scheduler_runs (readable from any worker)."""
+    rows = query(INCIDENT_DB, """
+        SELECT job,
+               SUM(status = 'ok'), SUM(status = 'failed'), SUM(status = 'skipped'),
+               AVG(CASE WHEN status = 'ok' THEN runtime END),
+               MAX(CASE WHEN status = 'ok' THEN runtime END),
+               AVG(CASE WHEN status = 'ok' THEN queued END),
+               MAX(started_at)
+        FROM scheduler_runs GROUP BY job
+    """)
+    last = {r[0]: r[1:] for r in query(INCIDENT_DB, """
+        SELECT job, status, runtime, error FROM scheduler_runs
+        WHERE id IN (SELECT MAX(id) FROM scheduler_runs GROUP BY job)
+    """)}
+    return {
+        job: {
+            "runs": ok or 0,
+            "failures": failed or 0,
+            "overlaps_skipped": skipped or 0,
+            "avg_runtime": avg_rt,
+            "max_runtime": max_rt,
+            "avg_queued": avg_q,
+            "last_started_at": last_at,
+            "last_status": last[job][0],
+            "last_runtime": last[job][1],
+            "last_error": last[job][2],
+        }
+        for job, ok, failed, skipped, avg_rt, max_rt, avg_q, last_at in rows
+    }
 
 
 def start_scheduler():
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(run_fairness_audit, "interval", minutes=30)
-    scheduler.start()
+    return AuditScheduler().start()
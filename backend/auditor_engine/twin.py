@@ -1,40 +1,208 @@
 # auditor_engine/twin.py
-import sqlite3, os, json
+# AI Twin store. Each twin is one JSON document with a version that every
+# write bumps; writers may pass the version they read and get a
+# VersionConflict instead of silently overwriting someone else's update.
+# Partial updates take a JSON Patch (RFC 6902) or a merge patch (RFC 7386).
+# Parsed twins are kept in an LRU, written through on every local update.
+# Annotations are rows in twin_annotations, so adding one never rewrites
+# the document.
+import os, json, copy
 from datetime import datetime
+from explain_service.cache import ResultCache
+from storage.sqlite import execute, query_one, transaction
+from storage.pagination import iter_rows
+from storage.migrations import migrate
 
 BASE = os.path.dirname(os.path.dirname(__file__))
 DB = os.path.join(BASE, "twin.db")
 
 def init_db():
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS twin (
-            user_id TEXT PRIMARY KEY,
-            twin_json TEXT,
-            updated_at TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    migrate(DB, "twin")
 
 init_db()
 
-def save_twin(user_id: str, twin: dict):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("""
-        INSERT OR REPLACE INTO twin(user_id, twin_json, updated_at)
-        VALUES (?, ?, ?)
-    """, (user_id, json.dumps(twin), datetime.utcnow().isoformat()))
-    conn.commit()
-    conn.close()
+# (version, parsed twin) per user; the ttl bounds staleness from other processes
+CACHE = ResultCache(maxsize=4096, ttl=30)
 
-def get_twin(user_id: str):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    row = c.execute("SELECT twin_json FROM twin WHERE user_id=?", (user_id,)).fetchone()
-    conn.close()
+
+class VersionConflict(Exception):
+    def __init__(self, expected, current):
+        super().__init__(f"twin is at version {current}, not {expected}")
+        self.expected = expected
+        self.current = current
+
+
+class PatchError(ValueError):
+    pass
+
+
+def _empty(user_id):
+    return {"user_id": user_id, "twin": {}}
+
+# ---------------- patches ----------------
+def _pointer(path):
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise PatchError(f"invalid JSON pointer: {path!r}")
+    return [p.replace("~1", "/").replace("~0", "~") for p in path[1:].split("/")]
+
+def _index(container, token, allow_end=False):
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token[0] == "0"):
+        raise PatchError(f"invalid array index: {token!r}")
+    i = int(token)
+    if i > len(container) or (i == len(container) and not allow_end):
+        raise PatchError(f"array index out of range: {i}")
+    return i
+
+def _parent(doc, tokens):
+    # the container holding the last token
+    node = doc
+    for t in tokens[:-1]:
+        try:
+            node = node[_index(node, t)] if isinstance(node, list) else node[t]
+        except (KeyError, TypeError):
+            raise PatchError(f"path not found: /{'/'.join(tokens)}")
+    if not isinstance(node, (dict, list)):
+        raise PatchError(f"path not found: /{'/'.join(tokens)}")
+    return node
+
+def _get(doc, tokens):
+    if not tokens:
+        return doc
+    node = _parent(doc, tokens)
+    if isinstance(node, list):
+        return node[_index(node, tokens[-1])]
+    if tokens[-1] not in node:
+        raise PatchError(f"path not found: /{'/'.join(tokens)}")
+    return node[tokens[-1]]
+
+def _add(doc, tokens, value):
+    if not tokens:
+        return value
+    node = _parent(doc, tokens)
+    if isinstance(node, list):
+        node.insert(_index(node, tokens[-1], allow_end=True), value)
+    else:
+        node[tokens[-1]] = value
+    return doc
+
+def _remove(doc, tokens):
+    if not tokens:
+        raise PatchError("cannot remove the whole document")
+    node = _parent(doc, tokens)
+    _get(doc, tokens)
+    if isinstance(node, list):
+        del node[_index(node, tokens[-1])]
+    else:
+        del node[tokens[-1]]
+    return doc
+
+def apply_json_patch(doc, ops):
+    """RFC 6902: apply a list of operations to a copy of doc; all or nothing."""
+    if not isinstance(ops, list):
+        raise PatchError("a JSON Patch is a list of operations")
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        if not isinstance(op, dict) or "path" not in op:
+            raise PatchError(f"invalid operation: {op!r}")
+        name, path = op.get("op"), _pointer(op["path"])
+        if name in ("add", "replace", "test") and "value" not in op:
+            raise PatchError(f"{name} needs a value")
+        if name == "add":
+            doc = _add(doc, path, copy.deepcopy(op["value"]))
+        elif name == "remove":
+            doc = _remove(doc, path)
+        elif name == "replace":
+            _get(doc, path)
+            doc = _add(_remove(doc, path), path, copy.deepcopy(op["value"])) if path else copy.deepcopy(op["value"])
+        elif name in ("move", "copy"):
+            src = _pointer(op.get("from", ""))
+            if name == "move" and path[:len(src)] == src and path != src:
+                raise PatchError("cannot move a value into itself")
+            value = copy.deepcopy(_get(doc, src))
+            if name == "move":
+                doc = _remove(doc, src)
+            doc = _add(doc, path, value)
+        elif name == "test":
+            if _get(doc, path) != op["value"]:
+                raise PatchError(f"test failed at {op['path']}")
+        else:
+            raise PatchError(f"unknown op: {name!r}")
+    return doc
+
+def apply_merge_patch(doc, patch):
+    """RFC 7386: objects merge recursively, null deletes, anything else replaces."""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    out = dict(doc) if isinstance(doc, dict) else {}
+    for k, v in patch.items():
+        if v is None:
+            out.pop(k, None)
+        else:
+            out[k] = apply_merge_patch(out.get(k), v)
+    return out
+
+# ---------------- documents ----------------
+def _load(conn, user_id):
+    # (version, twin), reusing the cached parse when it is still current
+    row = conn.execute("SELECT version FROM twin WHERE user_id=?", (user_id,)).fetchone()
     if not row:
-        return {"user_id": user_id, "twin": {}}
-    return json.loads(row[0])
+        return 0, _empty(user_id)
+    found, entry = CACHE.get(("twin", user_id))
+    if found and entry[0] == row[0]:
+        return entry
+    blob = conn.execute("SELECT twin_json FROM twin WHERE user_id=?", (user_id,)).fetchone()[0]
+    return row[0], json.loads(blob)
+
+def _store(user_id, update, expected_version=None):
+    with transaction(DB, immediate=True) as conn:
+        version, doc = _load(conn, user_id)
+        if expected_version is not None and expected_version != version:
+            raise VersionConflict(expected_version, version)
+        doc = update(doc)
+        conn.execute("""
+            INSERT INTO twin(user_id, twin_json, updated_at, version) VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                twin_json=excluded.twin_json, updated_at=excluded.updated_at, version=excluded.version
+        """, (user_id, json.dumps(doc), datetime.utcnow().isoformat(), version + 1))
+    # write-through: the next read is served from memory
+    CACHE.put(("twin", user_id), (version + 1, doc))
+    return version + 1, doc
+
+def save_twin(user_id: str, twin: dict, expected_version: int = None):
+    """Replace the whole twin; returns the new version."""
+    return _store(user_id, lambda _: twin, expected_version)[0]
+
+def patch_twin(user_id: str, patch, expected_version: int = None, merge: bool = False):
+    """Apply a JSON Patch (list) or, with merge=True, a merge patch; returns (version, twin)."""
+    return _store(user_id, lambda doc: apply_merge_patch(doc, patch) if merge else apply_json_patch(doc, patch),
+                  expected_version)
+
+def get_twin_versioned(user_id: str):
+    """(version, twin); version 0 means no twin has been stored. Do not mutate the twin."""
+    found, entry = CACHE.get(("twin", user_id))
+    if found:
+        return entry
+    row = query_one(DB, "SELECT version, twin_json FROM twin WHERE user_id=?", (user_id,))
+    entry = (row[0], json.loads(row[1])) if row else (0, _empty(user_id))
+    CACHE.put(("twin", user_id), entry)
+    return entry
+
+def get_twin(user_id: str):
+    return get_twin_versioned(user_id)[1]
+
+# ---------------- annotations ----------------
+def add_annotation(user_id: str, annotation: dict):
+    created_at = datetime.utcnow().isoformat()
+    cur = execute(DB, "INSERT INTO twin_annotations(user_id, annotation_json, created_at) VALUES (?, ?, ?)",
+                  (user_id, json.dumps(annotation), created_at))
+    return {"id": cur.lastrowid, "created_at": created_at}
+
+def iter_annotations(user_id: str, after_id: int = None, limit: int = None):
+    rows = iter_rows(DB, "SELECT id, annotation_json, created_at FROM twin_annotations", "id",
+                     "user_id=?", (user_id,), after_id, limit)
+    for r in rows:
+        yield {"id": r[0], "annotation": json.loads(r[1]), "created_at": r[2]}
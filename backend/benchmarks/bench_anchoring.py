@@ -0,0 +1,53 @@
+"""Per-receipt anchoring cost: last-32-hashes scan of action_logs vs. epoch batching.
+
+Run from backend/:  python -m benchmarks.bench_anchoring [action rows] [receipts]
+(default 1M rows, 2000 receipts)
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+from storage import sqlite as storage
+from storage.migrations import migrate
+from verifiable.epochs import EpochAnchorer
+from verifiable.merkle import merkle_root
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    receipts = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "action_logs.db")
+        migrate(path, "actions")
+        migrate(path, "ledger_receipts")
+        with storage.transaction(path) as conn:
+            conn.executemany("INSERT INTO action_logs(created_at, hash) VALUES (?,?)",
+                             ((f"2025-01-01T00:00:{i:09d}", hashlib.sha256(b"%d" % i).hexdigest())
+                              for i in range(rows)))
+        leaves = [hashlib.sha256(b"r%d" % i).hexdigest() for i in range(receipts)]
+
+        # auditor_engine/receipts.py before: a sort of action_logs per receipt
+        n_old = min(receipts, 50)
+        t0 = time.perf_counter()
+        for _ in range(n_old):
+            hashes = storage.query(path, "SELECT hash FROM action_logs ORDER BY created_at DESC LIMIT 32")
+            merkle_root([h[0].encode() for h in hashes])
+        old = (time.perf_counter() - t0) / n_old
+
+        anchorer = EpochAnchorer(path, max_receipts=1000, max_seconds=3600)
+        t0 = time.perf_counter()
+        for i, leaf in enumerate(leaves):
+            anchorer.add(leaf, f"r{i}")
+        anchorer.close()
+        new = (time.perf_counter() - t0) / receipts
+
+        print(f"{rows:,} logged actions, {receipts:,} receipts (epochs of 1000)")
+        print(f"  scan + root per receipt : {old * 1e3:8.3f} ms")
+        print(f"  epoch anchoring         : {new * 1e3:8.3f} ms  ({old / new:.0f}x)")
+        storage.close_all()
+
+
+if __name__ == "__main__":
+    main()
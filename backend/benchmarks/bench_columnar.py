@@ -0,0 +1,65 @@
+"""Load time of N logged decisions: JSON blobs + json.loads vs. typed columns.
+
+Run from backend/:  python -m benchmarks.bench_columnar [rows]   (default 5M)
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from storage import sqlite as storage
+from storage.columnar import load_decisions
+from storage.migrations import migrate
+
+
+def load_json(path):
+    # what /audit/run and the scheduler did before the typed columns
+    rows = storage.query(path, "SELECT inputs, output FROM action_logs")
+    data = []
+    for inputs_json, output_json in rows:
+        inp = json.loads(inputs_json)
+        inp["decision"] = json.loads(output_json)["decision"]
+        data.append(inp)
+    return {k: np.array([d[k] for d in data]) for k in ("income", "age", "credit_score", "spending_ratio", "decision")}
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "action_logs.db")
+        migrate(path, "actions")
+        income = rng.uniform(0, 200000, n)
+        age = rng.integers(18, 80, n)
+        score = rng.uniform(300, 900, n)
+        ratio = rng.uniform(0, 1, n)
+        rows = (
+            ("u", json.dumps({"income": float(income[i]), "age": int(age[i]),
+                              "credit_score": float(score[i]), "spending_ratio": float(ratio[i])}),
+             json.dumps({"decision": "approved" if i % 3 else "denied"}), "", "demo-v1", "", "",
+             float(income[i]), int(age[i]), float(score[i]), float(ratio[i]), 1 if i % 3 else 0)
+            for i in range(n)
+        )
+        storage.executemany(path, """
+            INSERT INTO action_logs(user_id, inputs, output, explanation, model_version, created_at, hash,
+                                    income, age, credit_score, spending_ratio, decision)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+
+        t0 = time.perf_counter()
+        load_json(path)
+        t_json = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        cols = load_decisions(path)
+        t_col = time.perf_counter() - t0
+        assert len(cols["id"]) == n
+        print(f"{n:,} decisions")
+        print(f"  JSON blobs + json.loads : {t_json:8.2f} s")
+        print(f"  typed columns -> NumPy  : {t_col:8.2f} s  ({t_json / t_col:.1f}x)")
+        storage.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Decision-time consent check: history scan vs. consent_current vs. ConsentCache.
+
+Run from backend/:  python -m benchmarks.bench_consent [history rows]   (default 2M)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from consent.policy import ConsentCache
+from storage import sqlite as storage
+from storage.migrations import migrate
+
+FEATURES = ("income", "age", "credit_score", "spending_ratio")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    users = max(rows // 20, 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "consent.db")
+        migrate(path, "consent")
+        with storage.transaction(path) as conn:
+            conn.executemany(
+                "INSERT INTO consents(user_id, feature, allowed, expiry, signature, updated_at) VALUES (?,?,?,?,?,?)",
+                ((f"u{i % users}", FEATURES[i // users % 4], i % 3 > 0, "2030-01-01" if i % 2 else "", "",
+                  f"2025-01-01T00:00:{i:09d}") for i in range(rows)))
+            # what update_consent() maintains on every write
+            conn.execute("""
+                INSERT OR REPLACE INTO consent_current (user_id, feature, allowed, expiry, updated_at, consent_id)
+                SELECT user_id, feature, allowed, expiry, updated_at, id FROM consents
+                WHERE id IN (SELECT MAX(id) FROM consents GROUP BY user_id, feature)
+            """)
+        rng = random.Random(0)
+        checks = [f"u{rng.randrange(users)}" for _ in range(20000)]
+
+        # before: replay the user's history, newest first, to find each feature's latest row
+        t0 = time.perf_counter()
+        for user_id in checks[:2000]:
+            latest = {}
+            for feature, allowed, expiry in storage.query(
+                    path, "SELECT feature, allowed, expiry FROM consents WHERE user_id=? ORDER BY updated_at DESC",
+                    (user_id,)):
+                latest.setdefault(feature, (allowed, expiry))
+        scan = (time.perf_counter() - t0) / 2000
+
+        t0 = time.perf_counter()
+        for user_id in checks:
+            storage.query(path, "SELECT feature, allowed, expiry FROM consent_current WHERE user_id=?", (user_id,))
+        table = (time.perf_counter() - t0) / len(checks)
+
+        cache = ConsentCache(path, ttl=3600)
+        for user_id in checks:
+            cache.denied(user_id, FEATURES)
+        t0 = time.perf_counter()
+        for user_id in checks:
+            cache.denied(user_id, FEATURES)
+        cached = (time.perf_counter() - t0) / len(checks)
+
+        print(f"{rows:,} history rows, {users:,} users; one check = all {len(FEATURES)} model features")
+        print(f"  history scan        : {scan * 1e6:9.1f} us")
+        print(f"  consent_current     : {table * 1e6:9.1f} us")
+        print(f"  ConsentCache (warm) : {cached * 1e6:9.1f} us")
+        storage.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Hot lookup latency before/after the index migrations.
+
+Run from backend/:  python -m benchmarks.bench_indexes [rows]   (default 10M)
+"""
+import os
+import sys
+import tempfile
+import time
+
+from storage import sqlite as storage
+from storage.migrations import MIGRATIONS, migrate
+
+LOOKUPS = {
+    "receipts": ("SELECT id, action_rowid, summary, timestamp FROM receipts WHERE user_id=?",),
+    "consent": ("SELECT feature,allowed,expiry,updated_at FROM consents WHERE user_id=? ORDER BY updated_at DESC",),
+    "appeals": ("SELECT * FROM appeals WHERE user_id=?",),
+    "ledger_receipts": ("SELECT receipt_json FROM receipts WHERE action_row_id = ?",),
+}
+
+FILL = {
+    "receipts": ("INSERT INTO receipts(action_rowid, user_id, summary, timestamp) VALUES (?,?,?,?)",
+                 lambda i: (i, f"u{i % 100000}", "Loan decision: denied", "2025-01-01")),
+    "consent": ("INSERT INTO consents(user_id, feature, allowed, expiry, signature, updated_at) VALUES (?,?,?,?,?,?)",
+                lambda i: (f"u{i % 100000}", f"f{i % 7}", i % 2, "", "", f"2025-01-{i % 28 + 1:02d}")),
+    "appeals": ("INSERT INTO appeals(user_id, action_id, message, status, created_at) VALUES (?,?,?,?,?)",
+                lambda i: (f"u{i % 100000}", i, "msg", "pending", "2025-01-01")),
+    "ledger_receipts": ("INSERT INTO receipts(id, action_row_id, user_id, receipt_json, created_at) VALUES (?,?,?,?,?)",
+                        lambda i: (f"r{i}", i, f"u{i % 100000}", "{}", "2025-01-01")),
+}
+
+
+def timed_lookups(path, sql, keys):
+    t0 = time.perf_counter()
+    for k in keys:
+        storage.query(path, sql, (k,))
+    return (time.perf_counter() - t0) / len(keys) * 1e3
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{rows:,} rows per table, mean lookup latency in ms")
+        print(f"{'store':>16} {'before':>10} {'after':>10}")
+        for name, (sql,) in LOOKUPS.items():
+            path = os.path.join(tmp, f"{name}.db")
+            # schema only (version 1), no indexes yet
+            with storage.transaction(path) as conn:
+                for step in MIGRATIONS[name][0][2]:
+                    conn.execute(step)
+            insert, make = FILL[name]
+            with storage.transaction(path) as conn:
+                conn.executemany(insert, (make(i) for i in range(rows)))
+            keys = [f"u{i}" for i in range(0, 100000, 9973)] if name != "ledger_receipts" \
+                else list(range(1, rows, max(1, rows // 10)))
+            before = timed_lookups(path, sql, keys[:3])
+            migrate(path, name)
+            after = timed_lookups(path, sql, keys)
+            print(f"{name:>16} {before:>10.3f} {after:>10.3f}")
+        storage.close_all()
+
+
+if __name__ == "__main__":
+    main()
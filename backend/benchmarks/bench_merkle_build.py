@@ -0,0 +1,66 @@
+"""Merkle root over N leaves: the original string-based merkle_root vs. the buffer builder.
+
+Run from backend/:  python -m benchmarks.bench_merkle_build [leaves] [workers]
+(default 10M leaves, workers = CPU count)
+"""
+import hashlib
+import os
+import sys
+import time
+import tracemalloc
+
+from verifiable.builder import merkle_root_fast
+from verifiable.merkle import sha256
+
+
+def reference_root(leaves):
+    # verifiable.merkle.merkle_root before it delegated to the builder
+    level = [sha256(l) for l in leaves]
+    while len(level) > 1:
+        if len(level) % 2 == 1:
+            level.append(level[-1])
+        level = [sha256((level[i] + level[i + 1]).encode("utf-8")) for i in range(0, len(level), 2)]
+    return level[0]
+
+
+def timed(fn, *args, **kw):
+    t0 = time.perf_counter()
+    out = fn(*args, **kw)
+    return out, time.perf_counter() - t0
+
+
+def peak_mb(fn, *args, **kw):
+    tracemalloc.start()
+    fn(*args, **kw)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    leaves = [hashlib.sha256(b"%d" % i).hexdigest() for i in range(n)]
+
+    ref, t_ref = timed(reference_root, leaves)
+    legacy, t_legacy = timed(merkle_root_fast, leaves, scheme="legacy")
+    assert legacy == ref
+    _, t_rfc = timed(merkle_root_fast, leaves)
+
+    print(f"{n:,} leaves, {workers} worker(s)")
+    print(f"  original merkle_root (hex strings) : {t_ref:7.2f} s")
+    print(f"  builder, legacy scheme (same root) : {t_legacy:7.2f} s  ({t_ref / t_legacy:.2f}x)")
+    print(f"  builder, rfc6962 (32-byte digests) : {t_rfc:7.2f} s  ({t_ref / t_rfc:.2f}x)")
+
+    # allocation peak beyond the leaves themselves, on a 1M-leaf slice
+    sample = leaves[:1_000_000]
+    print(f"  peak extra memory, {len(sample):,} leaves: original {peak_mb(reference_root, sample):.0f} MB, "
+          f"legacy {peak_mb(merkle_root_fast, sample, scheme='legacy'):.0f} MB, "
+          f"rfc6962 {peak_mb(merkle_root_fast, sample):.0f} MB")
+    if workers > 1:
+        _, t_par = timed(merkle_root_fast, leaves, workers=workers)
+        print(f"  builder, rfc6962, {workers} processes      : {t_par:7.2f} s  ({t_ref / t_par:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Action-log root: full rebuild per request vs. the append-only MerkleLog.
+
+Run from backend/:  python -m benchmarks.bench_merkle_log [rows]   (default 1M)
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+from storage import sqlite as storage
+from storage.migrations import migrate
+from verifiable.accumulator import MerkleLog
+from verifiable.merkle import merkle_root
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "action_logs.db")
+        migrate(path, "actions")
+        hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(rows)]
+        with storage.transaction(path) as conn:
+            conn.executemany("INSERT INTO action_logs(id, hash) VALUES (?,?)", enumerate(hashes, 1))
+
+        log = MerkleLog(path)
+        t0 = time.perf_counter()
+        log.sync(chunk=100000)
+        seed = time.perf_counter() - t0
+
+        # what /receipts/merkle did on every request
+        t0 = time.perf_counter()
+        merkle_root([r[0].encode() for r in storage.query(path, "SELECT hash FROM action_logs")])
+        rebuild = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for _ in range(1000):
+            log.head()
+        head = (time.perf_counter() - t0) / 1000
+
+        t0 = time.perf_counter()
+        for n in range(rows - 1000, rows):
+            log.root(n)
+        historical = (time.perf_counter() - t0) / 1000
+
+        # one write-behind batch of 500 decisions
+        batch = [hashlib.sha256(b"x%d" % i).hexdigest() for i in range(500)]
+        t0 = time.perf_counter()
+        for start in range(0, 20 * 500, 500):
+            with storage.transaction(path) as conn:
+                log.append(conn, batch, range(rows + start + 1, rows + start + 501))
+        append = (time.perf_counter() - t0) / (20 * 500)
+
+        print(f"{rows:,} leaves")
+        print(f"  seed from existing table    : {seed:8.2f} s")
+        print(f"  full rebuild per request    : {rebuild * 1e3:8.1f} ms")
+        print(f"  current root (head)         : {head * 1e3:8.3f} ms")
+        print(f"  historical root             : {historical * 1e3:8.3f} ms")
+        print(f"  append, per decision        : {append * 1e6:8.1f} us")
+        storage.close_all()
+
+
+if __name__ == "__main__":
+    main()
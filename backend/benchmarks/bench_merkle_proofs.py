@@ -0,0 +1,61 @@
+"""Inclusion proofs from stored nodes, and one-by-one vs. bulk receipt verification.
+
+Run from backend/:  python -m benchmarks.bench_merkle_proofs [leaves] [receipts]
+(default 1M leaves, 10k receipts)
+"""
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+from storage import sqlite as storage
+from storage.migrations import migrate
+from verifiable.accumulator import MerkleLog
+from verifiable.merkle import verify_inclusion, verify_inclusions
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "action_logs.db")
+        migrate(path, "actions")
+        hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(rows)]
+        with storage.transaction(path) as conn:
+            conn.executemany("INSERT INTO action_logs(id, hash) VALUES (?,?)", enumerate(hashes, 1))
+        log = MerkleLog(path)
+        log.sync(chunk=100000)
+        root = log.root()
+
+        sample = sorted(random.Random(0).sample(range(rows), k))
+
+        t0 = time.perf_counter()
+        for i in sample[:1000]:
+            log.inclusion_proof(i)
+        single = (time.perf_counter() - t0) / 1000
+
+        t0 = time.perf_counter()
+        paths = log.inclusion_proofs(sample)
+        batch = time.perf_counter() - t0
+
+        items = [(i, hashes[i], paths[i]) for i in sample]
+        t0 = time.perf_counter()
+        assert all(verify_inclusion(i, rows, leaf, p, root) for i, leaf, p in items)
+        one_by_one = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        assert all(verify_inclusions(root, rows, items))
+        bulk = time.perf_counter() - t0
+
+        print(f"{rows:,} leaves, {k:,} receipts")
+        print(f"  inclusion proof, single       : {single * 1e3:8.3f} ms")
+        print(f"  inclusion proofs, batched     : {batch:8.3f} s")
+        print(f"  verify one by one             : {one_by_one:8.3f} s")
+        print(f"  verify in bulk (shared nodes) : {bulk:8.3f} s")
+        storage.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""List endpoints: fetchall + one JSON document vs. keyset pages and NDJSON streaming.
+
+Run from backend/:  python -m benchmarks.bench_pagination [rows]   (default 1M)
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from storage import sqlite as storage
+from storage.migrations import migrate
+from storage.pagination import iter_rows, ndjson, page
+
+SELECT = "SELECT id, user_id, created_at FROM action_logs"
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    first = fn()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first, elapsed, peak
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "action_logs.db")
+        migrate(path, "actions")
+        with storage.transaction(path) as conn:
+            conn.executemany("INSERT INTO action_logs(user_id, created_at) VALUES (?,?)",
+                             ((f"u{i % 1000}", "2025-01-01T00:00:00") for i in range(rows)))
+
+        def old_first_byte():
+            # what /debug/actions did: every row, then one document
+            return json.dumps({"actions": storage.query(path, SELECT)})[:1]
+
+        def deep_page():
+            return page(path, SELECT, "id", after_id=rows - 1000, limit=100)
+
+        def stream_first_line():
+            return next(ndjson(iter_rows(path, SELECT, "id")))
+
+        def stream_all():
+            return sum(len(line) for line in ndjson(iter_rows(path, SELECT, "id")))
+
+        print(f"{rows:,} rows")
+        for label, fn in (("fetchall + json.dumps", old_first_byte),
+                          ("keyset page near the end", deep_page),
+                          ("ndjson, first line", stream_first_line),
+                          ("ndjson, whole table", stream_all)):
+            _, elapsed, peak = measure(fn)
+            print(f"  {label:26}: {elapsed * 1e3:9.1f} ms  peak {peak / 2**20:7.1f} MB")
+        storage.close_all()
+
+
+if __name__ == "__main__":
+    main()
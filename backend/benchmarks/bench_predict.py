@@ -0,0 +1,58 @@
+"""Rows/sec of the vectorized scoring path vs. the old iterrows() loop.
+
+Run from backend/:  python -m benchmarks.bench_predict
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from explain_service.model import DummyCreditModel
+
+
+def make_frame(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "income": rng.uniform(0, 200000, n),
+        "age": rng.integers(18, 80, n),
+        "credit_score": rng.uniform(300, 900, n),
+        "spending_ratio": rng.uniform(0, 1, n),
+    })
+
+
+def predict_loop(X: pd.DataFrame):
+    # the pre-vectorization implementation, kept here as the baseline
+    decisions = []
+    for _, row in X.iterrows():
+        score = (
+            0.4 * (row["income"] / 100000) +
+            0.3 * (row["credit_score"] / 900) -
+            0.3 * row["spending_ratio"]
+        )
+        decisions.append("approved" if score > 0.5 else "denied")
+    return decisions
+
+
+def rows_per_sec(fn, X, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - t0)
+    return len(X) / best
+
+
+def main():
+    model = DummyCreditModel()
+    print(f"{'rows':>9} {'loop rows/s':>14} {'vector rows/s':>14} {'speedup':>9}")
+    for n in (1, 1_000, 1_000_000):
+        X = make_frame(n)
+        # the loop takes minutes at 1M rows; measure it on a 10k sample instead
+        loop = rows_per_sec(predict_loop, X if n <= 10_000 else X.iloc[:10_000], repeat=1)
+        vec = rows_per_sec(model.predict_codes, X)
+        assert model.predict(X.iloc[:1000]) == predict_loop(X.iloc[:1000])
+        print(f"{n:>9} {loop:>14,.0f} {vec:>14,.0f} {vec / loop:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Receipt generation: per-call (old endpoint) vs. ReceiptService, single and batch.
+
+Run from backend/:  python -m benchmarks.bench_receipts [actions]   (default 5000)
+"""
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+from auditor_engine.receipts import ReceiptService
+from storage import sqlite as storage
+from storage.migrations import migrate
+from verifiable.accumulator import MerkleLog
+from verifiable.epochs import EpochAnchorer
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        actions = os.path.join(tmp, "action_logs.db")
+        receipts = os.path.join(tmp, "receipts.db")
+        migrate(actions, "actions")
+        migrate(receipts, "receipts")
+        inputs = json.dumps({"income": 50000, "age": 30, "credit_score": 650, "spending_ratio": 0.3})
+        with storage.transaction(actions) as conn:
+            conn.executemany(
+                "INSERT INTO action_logs(id, user_id, inputs, output, explanation, created_at, hash) "
+                "VALUES (?,?,?,?,?,?,?)",
+                ((i, f"u{i % 100}", inputs, json.dumps({"decision": "approved"}),
+                  "Income is high. Spending is low.", "2025-01-01T00:00:00",
+                  hashlib.sha256(b"%d" % i).hexdigest()) for i in range(1, 2 * n + 1)))
+        log = MerkleLog(actions)
+        log.sync()
+
+        anchorer = EpochAnchorer(receipts, max_receipts=1000, max_seconds=3600)
+
+        # the old endpoint: read, autocommitted INSERT (a new row every time), then
+        # anchor the receipt and look up its action-log leaf separately
+        t0 = time.perf_counter()
+        for i in range(1, n + 1):
+            storage.query_one(actions, "SELECT user_id, inputs, output, explanation, created_at "
+                                       "FROM action_logs WHERE id=?", (i,))
+            storage.execute(receipts, "INSERT INTO receipts(receipt_id, action_rowid, user_id) VALUES (?,?,?)",
+                            (f"old_{i}", -i, "u"))
+            anchorer.add(hashlib.sha256(b"old%d" % i).hexdigest(), f"old_{i}")
+            log.leaf_index(i)
+            log.head()
+            storage.query_one(actions, "SELECT hash FROM action_logs WHERE id=?", (i,))
+        old = (time.perf_counter() - t0) / n
+
+        service = ReceiptService(actions, receipts, anchorer=anchorer, merkle_log=log)
+        t0 = time.perf_counter()
+        for i in range(1, n + 1):
+            service.generate(i)
+        single = (time.perf_counter() - t0) / n
+
+        t0 = time.perf_counter()
+        service.generate_many(range(n + 1, 2 * n + 1))
+        batch = (time.perf_counter() - t0) / n
+
+        service.cache.clear()
+        t0 = time.perf_counter()
+        service.generate_many(range(1, 2 * n + 1))
+        stored = (time.perf_counter() - t0) / (2 * n)
+
+        t0 = time.perf_counter()
+        for i in range(1, n + 1):
+            service.generate(i)
+        cached = (time.perf_counter() - t0) / n
+        anchorer.close()
+
+        rows = storage.query_one(receipts, "SELECT COUNT(*) FROM receipts WHERE action_rowid > 0")[0]
+        print(f"{n:,} actions per run, {rows:,} receipt rows for {2 * n:,} actions")
+        print(f"  old endpoint, per call      : {old * 1e3:8.3f} ms")
+        print(f"  service, one call per action: {single * 1e3:8.3f} ms")
+        print(f"  service, one batch          : {batch * 1e3:8.3f} ms")
+        print(f"  repeat, read from table     : {stored * 1e3:8.3f} ms")
+        print(f"  repeat, cache hit           : {cached * 1e3:8.3f} ms")
+        storage.close_all()
+
+
+if __name__ == "__main__":
+    main()
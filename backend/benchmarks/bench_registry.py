@@ -0,0 +1,59 @@
+"""Model hot-swap: first requests to a new version with cold caches vs. after warm-up.
+
+Run from backend/:  python -m benchmarks.bench_registry [hot keys]   (default 256)
+"""
+import sys
+import time
+
+import numpy as np
+
+from explain_service.cache import ResultCache
+from explain_service.explain import get_model
+from explain_service.registry import ModelRegistry
+
+
+def main():
+    keys = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    rng = np.random.default_rng(0)
+    inputs = [{"income": float(rng.integers(20, 120) * 1000), "age": int(rng.integers(20, 70)),
+               "credit_score": float(rng.integers(500, 800)), "spending_ratio": round(float(rng.random()), 2)}
+              for _ in range(keys)]
+    cache = ResultCache(maxsize=4 * keys, ttl=600, multi_version=True)
+
+    def serve(entry, features):
+        return cache.get_or_compute(entry.version, features,
+                                    lambda: entry.whatif.search_joint_counterfactuals(features, k=3),
+                                    extra=("joint", 3, 3))
+
+    def warm(entry):
+        for features, extra in cache.recent(registry.default.version, keys):
+            serve(entry, features)
+
+    registry = ModelRegistry(caches=(cache,))
+    base = registry.register(get_model())
+    for features in inputs:
+        serve(base, features)
+
+    results = {}
+    for label, version, warmers in (("cold swap", "cold", []), ("warmed swap", "warm", [warm])):
+        registry.warmers = warmers
+        t0 = time.perf_counter()
+        entry = registry.register(get_model().with_params(version, threshold=0.45))
+        registering = time.perf_counter() - t0
+        registry.set_default(version)
+        latencies = []
+        for features in inputs:
+            t0 = time.perf_counter()
+            serve(registry.route(), features)
+            latencies.append(time.perf_counter() - t0)
+        results[label] = (registering, np.percentile(latencies, 50), np.percentile(latencies, 99))
+        registry.set_default(base.version)
+
+    print(f"{keys} hot inputs, joint what-if")
+    for label, (registering, p50, p99) in results.items():
+        print(f"  {label:12}: register {registering * 1e3:8.1f} ms, first-pass p50 {p50 * 1e3:7.3f} ms, "
+              f"p99 {p99 * 1e3:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
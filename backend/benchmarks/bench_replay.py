@@ -0,0 +1,61 @@
+"""Shadow replay: per-row scoring of the ledger vs. chunked, vectorized, process-pool replay.
+
+Run from backend/:  python -m benchmarks.bench_replay [rows] [workers]   (default 2M, all CPUs)
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from auditor_engine.replay import shadow_replay
+from explain_service.explain import get_model
+from storage import sqlite as storage
+from storage.migrations import migrate
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "action_logs.db")
+        migrate(path, "actions")
+        run(path, rows, workers)
+        storage.close_all()
+
+
+def run(path, rows, workers):
+    model = get_model()
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.normal(60000, 20000, rows), rng.integers(18, 80, rows).astype(float),
+                         rng.normal(650, 80, rows), rng.random(rows)])
+    decision = model.predict_codes(X).tolist()
+    with storage.transaction(path) as conn:
+        conn.executemany("INSERT INTO action_logs(user_id, income, age, credit_score, spending_ratio, decision) "
+                         "VALUES ('bench', ?, ?, ?, ?, ?)", zip(*X.T.tolist(), decision))
+    candidate = model.with_params("candidate", threshold=0.45)
+
+    # before: one dict per logged row through predict(), as the decision path scores it
+    sample = 20000
+    t0 = time.perf_counter()
+    for (inputs,) in storage.query(path, "SELECT json_object('income', income, 'age', age, 'credit_score', "
+                                         "credit_score, 'spending_ratio', spending_ratio) FROM action_logs "
+                                         "LIMIT ?", (sample,)):
+        candidate.predict(json.loads(inputs))
+    per_row = (time.perf_counter() - t0) / sample
+
+    inline = shadow_replay(candidate, path, model, workers=1)
+    pooled = shadow_replay(candidate, path, model, workers=workers)
+
+    print(f"{rows:,} logged decisions")
+    for label, rate in (("per-row predict (extrapolated)", 60 / per_row),
+                        ("replay, in process", inline["rows_per_minute"]),
+                        (f"replay, {workers} worker process(es)", pooled["rows_per_minute"])):
+        print(f"  {label:32}: {rate:14,.0f} rows/min")
+    print(f"  flip rate {pooled['flip_rate']:.4f}, approval delta {pooled['approval_rate']['delta']:+.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Insert/read throughput: connect-per-call vs. the pooled WAL storage layer.
+
+Run from backend/:  python -m benchmarks.bench_storage [clients] [ops_per_client]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from storage import sqlite as storage
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS t (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, payload TEXT)"
+INSERT = "INSERT INTO t(user_id, payload) VALUES (?, ?)"
+SELECT = "SELECT id, payload FROM t WHERE id=?"
+
+
+def per_call_insert(path, i):
+    # the pattern used across the code base before the storage module
+    for _ in range(20):
+        try:
+            conn = sqlite3.connect(path)
+            conn.execute(INSERT, (f"u{i}", "{}"))
+            conn.commit()
+            conn.close()
+            return
+        except sqlite3.OperationalError:
+            time.sleep(0.005)   # database is locked
+    raise RuntimeError("insert kept failing")
+
+
+def per_call_read(path, i):
+    conn = sqlite3.connect(path)
+    conn.execute(SELECT, (i,)).fetchone()
+    conn.close()
+
+
+def pooled_insert(path, i):
+    storage.execute(path, INSERT, (f"u{i}", "{}"))
+
+
+def pooled_read(path, i):
+    storage.query_one(path, SELECT, (i,))
+
+
+def run(fn, path, clients, ops):
+    def worker(c):
+        for k in range(ops):
+            fn(path, c * ops + k + 1)
+
+    threads = [threading.Thread(target=worker, args=(c,)) for c in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return clients * ops / (time.perf_counter() - t0)
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    ops = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        old = os.path.join(tmp, "per_call.db")
+        new = os.path.join(tmp, "pooled.db")
+        sqlite3.connect(old).execute(SCHEMA).connection.commit()
+        storage.execute(new, SCHEMA)
+
+        print(f"{clients} clients x {ops} ops")
+        print(f"{'':>12} {'insert ops/s':>14} {'read ops/s':>14}")
+        print(f"{'per-call':>12} {run(per_call_insert, old, clients, ops):>14,.0f}"
+              f" {run(per_call_read, old, clients, ops):>14,.0f}")
+        print(f"{'pooled WAL':>12} {run(pooled_insert, new, clients, ops):>14,.0f}"
+              f" {run(pooled_read, new, clients, ops):>14,.0f}")
+        storage.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""AI Twin store: whole-blob rewrites vs. patches, cached reads and annotation rows.
+
+Run from backend/:  python -m benchmarks.bench_twin [annotations]   (default 5000)
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+from auditor_engine import twin
+from storage import sqlite as storage
+from storage.migrations import migrate
+
+
+def per_call(fn, n):
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - t0) / n * 1e3
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        twin.DB = os.path.join(tmp, "twin.db")
+        migrate(twin.DB, "twin")
+        run(size)
+        storage.close_all()
+
+
+def run(size):
+    doc = {"user_id": "bench", "twin": {"income_est": 65000, "risk_score": 0.41},
+           "annotations": [{"note": f"annotation {i}", "by": "analyst"} for i in range(size)]}
+    old_user, new_user = "bench-twin-old", "bench-twin-new"
+    twin.save_twin(old_user, doc)
+    twin.save_twin(new_user, {k: v for k, v in doc.items() if k != "annotations"})
+
+    def old_read(_):
+        row = storage.query_one(twin.DB, "SELECT twin_json FROM twin WHERE user_id=?", (old_user,))
+        return json.loads(row[0])
+
+    def old_annotate(i):
+        # what POST /twin/{user_id} forced: read, append, rewrite the blob
+        current = old_read(i)
+        current["annotations"].append({"note": f"new {i}"})
+        storage.execute(twin.DB, "INSERT OR REPLACE INTO twin(user_id, twin_json, updated_at) VALUES (?,?,?)",
+                        (old_user, json.dumps(current), "2025-01-01"))
+
+    results = {
+        "read, parse blob": per_call(old_read, 200),
+        "read, cached": per_call(lambda _: twin.get_twin(old_user), 20000),
+        "annotate, rewrite blob": per_call(old_annotate, 200),
+        "annotate, append row": per_call(lambda i: twin.add_annotation(new_user, {"note": f"new {i}"}), 2000),
+        "merge patch one field": per_call(
+            lambda i: twin.patch_twin(new_user, {"twin": {"risk_score": i / 1000}}, merge=True), 2000),
+    }
+    print(f"twin with {size:,} annotations")
+    for label, ms in results.items():
+        print(f"  {label:24}: {ms:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""/decision logging latency under a burst: synchronous commit vs. write-behind.
+
+Run from backend/:  python -m benchmarks.bench_writebehind [clients] [requests_per_client]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from storage import sqlite as storage
+from storage.writebehind import WriteBehindLogger
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS action_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, inputs TEXT, output TEXT,
+    explanation TEXT, model_version TEXT, created_at TEXT, hash TEXT)"""
+INSERT = """INSERT INTO action_logs(user_id, inputs, output, explanation, model_version, created_at, hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?)"""
+ROW = ("u", '{"income": 1}', '{"decision": "denied"}', "text", "demo-v1", "2025-01-01", "ab" * 32)
+
+
+def burst(log_one, clients, per_client):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for _ in range(per_client):
+            t0 = time.perf_counter()
+            log_one()
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return np.percentile(np.array(latencies) * 1e3, [50, 99])
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_db = os.path.join(tmp, "sync.db")
+        wb_db = os.path.join(tmp, "wb.db")
+        storage.execute(sync_db, SCHEMA)
+        storage.execute(wb_db, SCHEMA)
+        logger = WriteBehindLogger(wb_db, INSERT)
+
+        print(f"{clients} clients x {per_client} requests, latency in ms")
+        print(f"{'':>22} {'p50':>8} {'p99':>8}")
+        p50, p99 = burst(lambda: storage.execute(sync_db, INSERT, ROW), clients, per_client)
+        print(f"{'synchronous commit':>22} {p50:>8.3f} {p99:>8.3f}")
+        p50, p99 = burst(lambda: logger.submit(ROW), clients, per_client)
+        print(f"{'write-behind':>22} {p50:>8.3f} {p99:>8.3f}")
+        p50, p99 = burst(lambda: logger.submit(ROW, wait=True), clients, per_client)
+        print(f"{'write-behind, durable':>22} {p50:>8.3f} {p99:>8.3f}")
+        logger.close()
+        print(logger.stats())
+        storage.close_all()
+
+
+if __name__ == "__main__":
+    main()
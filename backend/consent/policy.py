@@ -1,40 +1,157 @@
-import sqlite3
+import logging
 import os
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from storage.sqlite import query, transaction
+from storage.pagination import iter_rows
+from storage.migrations import migrate
+
+log = logging.getLogger(__name__)
 
 DB = os.path.join(os.path.dirname(__file__), "consent.db")
 def init_db():
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS consents (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      user_id TEXT,
-      feature TEXT,
-      allowed INTEGER,
-      expiry TEXT,
-      signature TEXT,
-      updated_at TEXT
-    );
-    """)
-    conn.commit()
-    conn.close()
+    migrate(DB, "consent")
 
 init_db()
 
+# a feature nobody has recorded a consent for is usable by default
+DEFAULT_ALLOWED = True
+
+def _timestamp(value):
+    # ISO date or datetime (naive = UTC) -> epoch seconds; "" / None -> no expiry
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def _stored_expiry(value, user_id, feature):
+    # rows written before update_consent() validated expiries may hold free text;
+    # a date that cannot be read is treated as already past, i.e. consent withdrawn
+    try:
+        return _timestamp(value)
+    except (TypeError, ValueError):
+        log.warning("unparseable consent expiry %r for user %s feature %s; treating it as expired",
+                    value, user_id, feature)
+        return 0.0
+
 def update_consent(user_id, feature, allowed=True, expiry=None, signature=None):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("INSERT INTO consents (user_id,feature,allowed,expiry,signature,updated_at) VALUES (?,?,?,?,?,?)",
-              (user_id, feature, 1 if allowed else 0, expiry or "", signature or "", datetime.utcnow().isoformat()))
-    conn.commit()
-    conn.close()
+    _timestamp(expiry)  # ValueError for an unparseable expiry, before anything is written
+    updated_at = datetime.utcnow().isoformat()
+    with transaction(DB) as conn:
+        consent_id = conn.execute(
+            "INSERT INTO consents (user_id,feature,allowed,expiry,signature,updated_at) VALUES (?,?,?,?,?,?)",
+            (user_id, feature, 1 if allowed else 0, expiry or "", signature or "", updated_at)).lastrowid
+        # history stays append-only; consent_current keeps the latest row per feature
+        conn.execute("""
+            INSERT INTO consent_current (user_id,feature,allowed,expiry,updated_at,consent_id) VALUES (?,?,?,?,?,?)
+            ON CONFLICT(user_id, feature) DO UPDATE SET
+                allowed=excluded.allowed, expiry=excluded.expiry,
+                updated_at=excluded.updated_at, consent_id=excluded.consent_id
+        """, (user_id, feature, 1 if allowed else 0, expiry or "", updated_at, consent_id))
+    CURRENT.invalidate(user_id)
     return True
 
-def get_user_consents(user_id):
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute("SELECT feature,allowed,expiry,updated_at FROM consents WHERE user_id=? ORDER BY updated_at DESC", (user_id,))
-    rows = c.fetchall()
-    conn.close()
-    return [{"feature":r[0],"allowed":bool(r[1]),"expiry":r[2],"updated_at":r[3]} for r in rows]
+def iter_user_consents(user_id, after_id=None, limit=None):
+    # newest first; ids follow updated_at since rows are only ever appended
+    rows = iter_rows(DB, "SELECT id,feature,allowed,expiry,updated_at FROM consents", "id",
+                     "user_id=?", (user_id,), after_id, limit, desc=True)
+    for r in rows:
+        yield {"id":r[0],"feature":r[1],"allowed":bool(r[2]),"expiry":r[3],"updated_at":r[4]}
+
+def get_user_consents(user_id, after_id=None, limit=None):
+    return list(iter_user_consents(user_id, after_id, limit))
+
+def current_consents(user_id):
+    """The effective record per feature, from the materialized table."""
+    rows = query(DB, "SELECT feature,allowed,expiry,updated_at FROM consent_current WHERE user_id=?", (user_id,))
+    return {r[0]: {"allowed":bool(r[1]),"expiry":r[2],"updated_at":r[3]} for r in rows}
+
+
+class ConsentCache:
+    """Per-user current consent for decision-time checks.
+
+    A user's entry holds the answer for every recorded feature as of load
+    time and is reloaded at the earlier of `ttl` (writes from other
+    processes) and the next expiry among its records, so a lookup never
+    has to look at dates. Writes through update_consent() invalidate at once.
+    A consent whose expiry has passed counts as withdrawn.
+    """
+
+    def __init__(self, path, maxsize=100000, ttl=5.0, default=DEFAULT_ALLOWED):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.default = default
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0    # bumped by invalidate(); a load that raced one is not kept
+        self.hits = self.misses = 0
+
+    def _load(self, user_id, now):
+        rows = query(self.path, "SELECT feature,allowed,expiry FROM consent_current WHERE user_id=?", (user_id,))
+        records = {r[0]: (bool(r[1]), _stored_expiry(r[2], user_id, r[0])) for r in rows}
+        state = {f: allowed and (exp is None or now < exp) for f, (allowed, exp) in records.items()}
+        refresh_at = min([now + self.ttl] + [exp for _, exp in records.values() if exp is not None and exp > now])
+        return refresh_at, records, state
+
+    def _entry(self, user_id, now):
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is not None and now < entry[0]:
+                self._data.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            generation = self._generation
+        entry = self._load(user_id, now)
+        with self._lock:
+            if generation != self._generation:
+                return entry
+            self._data[user_id] = entry
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return entry
+
+    def is_allowed(self, user_id, feature, at=None):
+        """May `feature` of `user_id` be used now (or at `at`, a datetime or ISO string)?"""
+        if at is None:
+            return self._entry(user_id, time.time())[2].get(feature, self.default)
+        records = self._entry(user_id, time.time())[1]
+        if feature not in records:
+            return self.default
+        allowed, exp = records[feature]
+        return allowed and (exp is None or _timestamp(at) < exp)
+
+    def denied(self, user_id, features, at=None):
+        """The subset of `features` that may not be used."""
+        if at is None:
+            state = self._entry(user_id, time.time())[2]
+            return [f for f in features if not state.get(f, self.default)]
+        return [f for f in features if not self.is_allowed(user_id, f, at)]
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._data.clear()
+            else:
+                self._data.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+CURRENT = ConsentCache(DB)
+
+def is_allowed(user_id, feature, at=None):
+    return CURRENT.is_allowed(user_id, feature, at)
+
+def denied_features(user_id, features, at=None):
+    return CURRENT.denied(user_id, features, at)
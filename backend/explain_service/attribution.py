@@ -0,0 +1,103 @@
+# explain_service/attribution.py
+import itertools
+from math import comb
+
+import numpy as np
+
+
+class LinearAttributor:
+    """Exact SHAP values for a linear score: coef * (x - baseline).
+
+    Works on a whole (n, d) batch as one NumPy operation. The baseline is the
+    reference applicant the attributions are measured against (e.g. the
+    population mean); attributions of a row sum to score(x) - score(baseline).
+    """
+
+    def __init__(self, coef, baseline=None):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.baseline = (np.zeros_like(self.coef) if baseline is None
+                         else np.asarray(baseline, dtype=np.float64))
+
+    def fit_baseline(self, X):
+        self.baseline = np.asarray(X, dtype=np.float64).mean(axis=0)
+        return self
+
+    def attributions(self, X) -> np.ndarray:
+        return (np.asarray(X, dtype=np.float64) - self.baseline) * self.coef
+
+
+class KernelShapAttributor:
+    """Sampling-based KernelSHAP for models without a closed form.
+
+    score_fn maps an (m, d) matrix to m scores. Coalitions are enumerated
+    exactly when 2^d - 2 <= n_samples, otherwise n_samples are drawn from the
+    Shapley kernel with a fixed seed so results are deterministic. All masked
+    inputs of a chunk are scored in one score_fn call.
+    """
+
+    def __init__(self, score_fn, background, n_samples=256, seed=0, chunk_rows=64):
+        self.score_fn = score_fn
+        self.background = np.atleast_2d(np.asarray(background, dtype=np.float64))
+        self.n_samples = n_samples
+        self.seed = seed
+        self.chunk_rows = chunk_rows
+        self.base_value = float(np.mean(score_fn(self.background)))
+        d = self.background.shape[1]
+        exact = 2 ** d - 2 <= n_samples
+        self._coalitions = self._sample_coalitions(d, exact)
+        # sampled coalitions are already drawn in proportion to the kernel, so they weigh the same
+        self._projection = self._solve_matrix(self._coalitions, kernel_weights=exact)
+
+    def _sample_coalitions(self, d, exact):
+        if exact:
+            return np.array([z for z in itertools.product((0, 1), repeat=d)
+                             if 0 < sum(z) < d], dtype=np.float64)
+        rng = np.random.default_rng(self.seed)
+        sizes = np.arange(1, d)
+        size_w = (d - 1) / (sizes * (d - sizes))
+        picked = rng.choice(sizes, size=self.n_samples, p=size_w / size_w.sum())
+        Z = np.zeros((self.n_samples, d))
+        for i, k in enumerate(picked):
+            Z[i, rng.choice(d, size=k, replace=False)] = 1.0
+        return Z
+
+    @staticmethod
+    def _solve_matrix(Z, kernel_weights=True):
+        # weighted least squares with sum(phi) == f(x) - base eliminated via the last feature
+        M, d = Z.shape
+        if kernel_weights:
+            k = Z.sum(axis=1).astype(int)
+            w = (d - 1) / (np.array([comb(d, int(s)) for s in k]) * k * (d - k))
+        else:
+            w = np.ones(M)
+        A = Z[:, :-1] - Z[:, -1:]
+        AtW = A.T * w
+        return np.linalg.solve(AtW @ A, AtW)          # (d-1, M)
+
+    def attributions(self, X) -> np.ndarray:
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        Z = self._coalitions
+        out = np.empty_like(X)
+        for start in range(0, len(X), self.chunk_rows):
+            x = X[start:start + self.chunk_rows]
+            # (rows, coalitions, background, d) masked inputs, scored in one call
+            masked = (Z[None, :, None, :] * x[:, None, None, :]
+                      + (1.0 - Z)[None, :, None, :] * self.background[None, None, :, :])
+            y = self.score_fn(masked.reshape(-1, X.shape[1]))
+            y = np.asarray(y, dtype=np.float64).reshape(len(x), len(Z), -1).mean(axis=2)
+            total = np.asarray(self.score_fn(x), dtype=np.float64) - self.base_value
+            target = (y - self.base_value) - Z[None, :, -1] * total[:, None]
+            rest = target @ self._projection.T
+            out[start:start + len(x), :-1] = rest
+            out[start:start + len(x), -1] = total - rest.sum(axis=1)
+        return out
+
+
+def make_attributor(model, baseline=None, **kernel_kwargs):
+    """Closed form when the model exposes linear coefficients, KernelSHAP otherwise."""
+    if baseline is None:
+        baseline = getattr(model, "baseline", None)
+    if getattr(model, "coef", None) is not None:
+        return LinearAttributor(model.coef, baseline)
+    background = baseline if baseline is not None else np.zeros(len(model.feature_names))
+    return KernelShapAttributor(model.score, background, **kernel_kwargs)
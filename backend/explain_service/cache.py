@@ -0,0 +1,116 @@
+# explain_service/cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Bounded LRU + TTL memo for model-derived results.
+
+    Keys are (model_version, canonical features, extra). Features are
+    sorted by name and numeric values are quantized (per-feature quantum,
+    default 1e-6), so equivalent requests share an entry. Entries from an
+    older model version are dropped as soon as a newer version is seen -
+    unless multi_version is set, for caches shared by several live model
+    versions; those drop a version's entries only on invalidate_version().
+    """
+
+    def __init__(self, maxsize=4096, ttl=300.0, quantum=None, default_quantum=1e-6, multi_version=False):
+        self.maxsize = maxsize
+        self.multi_version = multi_version
+        self.ttl = ttl
+        self.quantum = quantum or {}
+        self.default_quantum = default_quantum
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def _quantize(self, name, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return value
+        q = self.quantum.get(name, self.default_quantum)
+        return round(round(value / q) * q, 12)
+
+    def key(self, model_version, features: dict, extra=()):
+        canon = tuple((k, self._quantize(k, features[k])) for k in sorted(features))
+        return (model_version, canon, tuple(extra))
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires, value = item
+                if expires >= time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, model_version, features: dict, compute, extra=()):
+        if not self.multi_version:
+            self.sync_version(model_version)
+        key = self.key(model_version, features, extra)
+        found, value = self.get(key)
+        if not found:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def sync_version(self, model_version):
+        """Drop every entry that belongs to another model version once the version changes."""
+        if model_version == self._version:
+            return
+        with self._lock:
+            stale = [k for k in self._data if k[0] != model_version]
+            for k in stale:
+                del self._data[k]
+            self.invalidations += len(stale)
+            self._version = model_version
+
+    def invalidate_version(self, model_version):
+        with self._lock:
+            stale = [k for k in self._data if k[0] == model_version]
+            for k in stale:
+                del self._data[k]
+            self.invalidations += len(stale)
+
+    def recent(self, model_version, n: int):
+        """(features, extra) of the n most recently used live entries of a version, newest first."""
+        now = time.monotonic()
+        with self._lock:
+            out = []
+            for key, (expires, _) in reversed(self._data.items()):
+                if key[0] == model_version and expires >= now:
+                    out.append((dict(key[1]), key[2]))
+                    if len(out) == n:
+                        break
+            return out
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
@@ -1,10 +1,13 @@
+import numpy as np
 import pandas as pd
 from typing import Dict, List, Tuple
 from .model import DummyCreditModel
 from .llm_client import LLMClient
+from .attribution import make_attributor
 
 _model = None
 _llm = None
+_attributor = None
 
 def get_model():
     global _model
@@ -12,14 +15,39 @@ def get_model():
         _model = DummyCreditModel()
     return _model
 
-def compute_shap_attributions(input_row: Dict) -> List[Tuple[str, float]]:
-    model = get_model()
-    df = pd.DataFrame([input_row])
-    vals, features = model.shap_values(df)
-    row = vals[0]
-    pairs = list(zip(features, [float(v) for v in row]))
-    pairs_sorted = sorted(pairs, key=lambda x: abs(x[1]), reverse=True)
-    return pairs_sorted
+def get_attributor():
+    global _attributor
+    if _attributor is None:
+        _attributor = make_attributor(get_model())
+    return _attributor
+
+def set_attribution_baseline(baseline=None, population=None):
+    """Point attributions at an explicit baseline row or the mean of a population matrix."""
+    attributor = get_attributor()
+    if population is not None:
+        attributor.fit_baseline(population)
+    elif baseline is not None:
+        attributor.baseline = np.asarray(baseline, dtype=np.float64)
+    return attributor.baseline
+
+def _sorted_pairs(features, row):
+    return sorted(zip(features, row.tolist()), key=lambda x: abs(x[1]), reverse=True)
+
+def compute_shap_attributions(input_row: Dict, model=None, attributor=None) -> List[Tuple[str, float]]:
+    # model/attributor default to the process-wide ones; the registry passes a version's own
+    model = model or get_model()
+    vals = (attributor or get_attributor()).attributions(model.to_matrix(input_row))
+    return _sorted_pairs(model.feature_names, vals[0])
+
+def compute_shap_attributions_batch(input_rows: List[Dict], model=None,
+                                    attributor=None) -> List[List[Tuple[str, float]]]:
+    """Attributions for many rows in one vectorized call."""
+    if not input_rows:
+        return []
+    model = model or get_model()
+    vals = (attributor or get_attributor()).attributions(
+        model.to_matrix(pd.DataFrame(input_rows, columns=model.feature_names)))
+    return [_sorted_pairs(model.feature_names, row) for row in vals]
 
 def build_template(attributions, top_k=3):
     lines = []
@@ -43,3 +71,7 @@ Attribution bullets:
 {template}
 """
     return _llm.generate(prompt)
+
+def nl_explanations(attributions_list, contexts=None):
+    contexts = contexts or [None] * len(attributions_list)
+    return [nl_explanation(atts, context=ctx) for atts, ctx in zip(attributions_list, contexts)]
@@ -1,22 +1,71 @@
 # explain_service/model.py
+import copy
+
 import numpy as np
 import pandas as pd
 
+from .attribution import LinearAttributor
+
+# decision codes used by the batch scoring path (index == code)
+DECISION_LABELS = np.array(["denied", "approved"], dtype=object)
+
+
 class DummyCreditModel:
     def __init__(self):
+        self.version = "demo-v1"
         self.feature_names = ["income", "age", "credit_score", "spending_ratio"]
+        # linear score = X @ coef; approved when score > threshold
+        self.coef = np.array([0.4 / 100000, 0.0, 0.3 / 900, -0.3])
+        self.threshold = 0.5
+        # reference applicant that attributions are measured against (demo population mean)
+        self.baseline = np.array([60000.0, 35.0, 650.0, 0.4])
+        # +1: score rises with the feature, -1: falls, 0: no effect
+        self.monotone_directions = dict(zip(self.feature_names, np.sign(self.coef).astype(int).tolist()))
+
+    def with_params(self, version: str, coef=None, threshold: float = None, baseline=None):
+        """A copy of this model under a new version, with any of its parameters replaced."""
+        model = copy.deepcopy(self)
+        model.version = version
+        if coef is not None:
+            coef = np.asarray(coef, dtype=np.float64)
+            if coef.shape != self.coef.shape:
+                raise ValueError(f"coef needs {len(self.coef)} values, one per feature")
+            model.coef = coef
+            model.monotone_directions = dict(zip(self.feature_names, np.sign(coef).astype(int).tolist()))
+        if threshold is not None:
+            model.threshold = float(threshold)
+        if baseline is not None:
+            baseline = np.asarray(baseline, dtype=np.float64)
+            if baseline.shape != self.baseline.shape:
+                raise ValueError(f"baseline needs {len(self.baseline)} values, one per feature")
+            model.baseline = baseline
+        return model
+
+    def params(self) -> dict:
+        """with_params() arguments that rebuild this model from the base one."""
+        return {"coef": self.coef.tolist(), "threshold": self.threshold, "baseline": self.baseline.tolist()}
+
+    def to_matrix(self, X) -> np.ndarray:
+        """Return features as a float64 (n, n_features) matrix in feature_names order."""
+        if isinstance(X, pd.DataFrame):
+            return X[self.feature_names].to_numpy(dtype=np.float64)
+        if isinstance(X, dict):
+            return np.array([[X[f] for f in self.feature_names]], dtype=np.float64)
+        arr = np.asarray(X, dtype=np.float64)
+        return arr.reshape(1, -1) if arr.ndim == 1 else arr
+
+    def score(self, X) -> np.ndarray:
+        """Raw linear score for every row, computed on whole columns at once."""
+        return self.to_matrix(X) @ self.coef
+
+    def predict_codes(self, X) -> np.ndarray:
+        """Compact decision array: 1 = approved, 0 = denied (uint8)."""
+        return (self.score(X) > self.threshold).astype(np.uint8)
 
-    def predict(self, X: pd.DataFrame):
-        decisions = []
-        for _, row in X.iterrows():
-            score = (
-                0.4 * (row["income"] / 100000) +
-                0.3 * (row["credit_score"] / 900) -
-                0.3 * row["spending_ratio"]
-            )
-            decisions.append("approved" if score > 0.5 else "denied")
-        return decisions
+    def predict(self, X):
+        return DECISION_LABELS[self.predict_codes(X)].tolist()
 
     def shap_values(self, X: pd.DataFrame):
-        shap = np.random.uniform(-1, 1, (len(X), len(self.feature_names)))
+        # exact for a linear score: coef * (x - baseline)
+        shap = LinearAttributor(self.coef, self.baseline).attributions(self.to_matrix(X))
         return shap, self.feature_names
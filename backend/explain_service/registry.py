@@ -0,0 +1,350 @@
+# explain_service/registry.py
+# Several model versions live side by side. Each request is routed once -
+# to a pinned version, to the canary for a stable share of users, or to the
+# default - and uses that version's model, attributor and what-if engine for
+# its whole lifetime. Routing state is one immutable snapshot replaced under
+# a lock, so promoting, canarying or retiring a version is atomic for
+# readers and needs no restart. A version is warmed (and may pre-fill the
+# caches from the traffic the default is serving) before it is routable;
+# retiring one drops only that version's cache entries.
+#
+# The routing itself (registered versions with their parameters, default,
+# canary) lives in a RoutingStore shared by every API worker. A change made
+# through one worker bumps the store's generation; the others notice within
+# sync_seconds, build and warm any version they have not loaded, and swap in
+# the same routing.
+import atexit
+import copy
+import json
+import logging
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from explain_service.attribution import make_attributor
+from explain_service.explain import compute_shap_attributions
+from storage.migrations import migrate
+from storage.sqlite import query_one, transaction
+from what_if_engine.engine import WhatIfEngine
+
+log = logging.getLogger(__name__)
+
+
+class VersionExists(Exception):
+    def __init__(self, version):
+        super().__init__(f"model version {version} is already registered")
+        self.version = version
+
+
+class ModelEntry:
+    """One loaded model version with the services bound to it."""
+
+    def __init__(self, model, attributor=None):
+        self.model = model
+        self.attributor = attributor or make_attributor(model)
+        self.whatif = WhatIfEngine(model)
+        self.loaded_at = time.time()
+        self.warmup_seconds = None
+
+    @property
+    def version(self) -> str:
+        return self.model.version
+
+    @property
+    def feature_names(self):
+        return self.model.feature_names
+
+    def attributions(self, features: dict):
+        return compute_shap_attributions(features, self.model, self.attributor)
+
+
+class _Routing:
+    # never mutated: every change builds a new one
+    def __init__(self, entries: dict, default: str, canary: str = None, canary_percent: float = 0.0):
+        self.entries = entries
+        self.default = default
+        self.canary = canary
+        self.canary_percent = canary_percent
+
+
+def _empty_state():
+    return {
+        # version -> with_params() arguments, for versions registered at run time
+        "versions": {},
+        # built-in versions (registered by every process at startup) taken out of routing
+        "retired": [],
+        "default": None,
+        "canary": None,
+        "canary_percent": 0.0,
+    }
+
+
+class RoutingStore:
+    """The routing state shared by every process that opens `path`.
+
+    One row holds the state as JSON with a generation that every change
+    bumps, so a reader can tell with one indexed read whether to reload.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        migrate(path, "models")
+
+    def generation(self) -> int:
+        row = query_one(self.path, "SELECT generation FROM model_routing WHERE id=1")
+        return row[0] if row else 0
+
+    def load(self):
+        row = query_one(self.path, "SELECT generation, state_json FROM model_routing WHERE id=1")
+        return (row[0], json.loads(row[1])) if row else (0, _empty_state())
+
+    def update(self, change):
+        """Apply change(state) in one IMMEDIATE transaction; returns (generation, state)."""
+        with transaction(self.path, immediate=True) as conn:
+            row = conn.execute("SELECT generation, state_json FROM model_routing WHERE id=1").fetchone()
+            generation, state = (row[0], json.loads(row[1])) if row else (0, _empty_state())
+            change(state)
+            generation += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO model_routing(id, generation, state_json, updated_at) VALUES (1,?,?,?)",
+                (generation, json.dumps(state), datetime.utcnow().isoformat()))
+        return generation, state
+
+
+class _LocalStore:
+    # RoutingStore's interface for a registry that is not shared with other processes
+    def __init__(self):
+        self._generation, self._state = 0, _empty_state()
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        return self._generation
+
+    def load(self):
+        with self._lock:
+            return self._generation, copy.deepcopy(self._state)
+
+    def update(self, change):
+        with self._lock:
+            state = copy.deepcopy(self._state)
+            change(state)
+            self._generation, self._state = self._generation + 1, state
+            return self._generation, copy.deepcopy(state)
+
+
+class ModelRegistry:
+    """Live model versions and the routing between them.
+
+    caches: ResultCaches keyed by model version (multi_version=True); a
+    retired version's entries are invalidated in each. warmers are called
+    with a new ModelEntry before it becomes routable - e.g. to pre-compute
+    the hot keys of the current default for it.
+
+    store: a RoutingStore to share routing with other processes (None keeps
+    it in this process); build(version, params) recreates a version another
+    process registered. Versions registered without params are built in:
+    every process registers them itself at startup and they are not stored.
+    """
+
+    def __init__(self, caches=(), warmers=(), store=None, build=None, sync_seconds: float = 1.0):
+        self.caches = list(caches)
+        self.warmers = list(warmers)
+        self.store = store if store is not None else _LocalStore()
+        self.build = build
+        self.sync_seconds = sync_seconds
+        self._builtin = {}          # version -> ModelEntry
+        self._builtin_default = None
+        self._pending = {}          # warmed here, not yet in the applied routing
+        self._routing = None
+        self._generation = -1
+        self._lock = threading.Lock()
+        self.routed = {}
+        self._stop = threading.Event()
+        self._thread = None
+        if store is not None:
+            self._thread = threading.Thread(target=self._run, name="model-routing-sync", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    # ---------------- lifecycle ----------------
+    def _warm(self, model, attributor=None):
+        t0 = time.perf_counter()
+        entry = ModelEntry(model, attributor)
+        # one pass through every code path a request uses, so a broken model never takes traffic
+        x = np.atleast_2d(getattr(model, "baseline", np.zeros(len(model.feature_names))))
+        model.predict_codes(x)
+        entry.attributor.attributions(x)
+        entry.whatif.search_counterfactuals(dict(zip(model.feature_names, x[0].tolist())))
+        for warm in self.warmers:
+            warm(entry)
+        entry.warmup_seconds = round(time.perf_counter() - t0, 4)
+        return entry
+
+    def register(self, model, default: bool = False, attributor=None, params: dict = None) -> ModelEntry:
+        """Warm `model` and make it routable (by pin; as default if asked or if it is the first).
+
+        params: what `build` needs to recreate the model in another process;
+        without them the version is built in. VersionExists if the version is
+        already registered; whatever warming raises (a model that cannot
+        score) propagates unchanged.
+        """
+        version = model.version
+        if version in self._known(self.store.load()[1]):
+            raise VersionExists(version)
+        entry = self._warm(model, attributor)       # outside the lock: traffic keeps flowing
+        if params is None:
+            with self._lock:
+                if version in self._builtin:
+                    raise VersionExists(version)
+                self._builtin[version] = entry
+                if default or self._builtin_default is None:
+                    self._builtin_default = version
+            self._apply(*self.store.load())
+            return entry
+
+        def add(state):
+            if version in self._known(state):
+                raise VersionExists(version)
+            state["versions"][version] = params
+            if default or self._default_of(state) is None:
+                state["default"] = version
+
+        self._pending[version] = entry
+        try:
+            self._apply(*self.store.update(add))
+        finally:
+            self._pending.pop(version, None)
+        return entry
+
+    def set_default(self, version: str):
+        def change(state):
+            self._check_known(state, version)
+            state["default"] = version
+            if state["canary"] == version:
+                state["canary"], state["canary_percent"] = None, 0.0
+
+        self._apply(*self.store.update(change))
+
+    def set_canary(self, version: str = None, percent: float = 0.0):
+        """Send `percent` of users (stable per routing key) to `version`; version=None stops the canary."""
+        if not 0 <= percent <= 100:
+            raise ValueError("percent must be between 0 and 100")
+
+        def change(state):
+            canary, share = version, float(percent)
+            if canary is not None:
+                self._check_known(state, canary)
+            if canary is None or canary == self._default_of(state):
+                canary, share = None, 0.0
+            state["canary"], state["canary_percent"] = canary, share
+
+        self._apply(*self.store.update(change))
+
+    def retire(self, version: str):
+        """Stop routing to `version` and drop its cache entries (not the default or the canary)."""
+        def change(state):
+            self._check_known(state, version)
+            if version in (self._default_of(state), state["canary"]):
+                raise ValueError(f"model version {version} is serving traffic; move it off first")
+            if state["versions"].pop(version, None) is None:
+                state["retired"].append(version)
+
+        self._apply(*self.store.update(change))
+
+    def sync(self) -> bool:
+        """Pick up routing changes made by other processes; True if there were any."""
+        if self._routing is None or self.store.generation() == self._generation:
+            return False
+        self._apply(*self.store.load())
+        return True
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.sync_seconds * 2)
+
+    def _run(self):
+        while not self._stop.wait(self.sync_seconds):
+            try:
+                self.sync()
+            except Exception:
+                log.exception("reloading model routing failed")
+
+    def _apply(self, generation, state):
+        # the routing for one stored state; versions loaded nowhere in this process are built and warmed
+        current = self._routing.entries if self._routing else {}
+        entries = {v: e for v, e in self._builtin.items() if v not in state["retired"]}
+        for version, params in state["versions"].items():
+            entry = self._pending.get(version) or current.get(version)
+            if entry is None:
+                entry = self._warm(self.build(version, params))
+            entries[version] = entry
+        default = self._default_of(state)
+        if default is None:
+            return
+        with self._lock:
+            if generation < self._generation:
+                return              # a newer state was applied while this one was warming
+            retired = set(self._routing.entries if self._routing else ()) - set(entries)
+            self._routing = _Routing(entries, default, state["canary"], state["canary_percent"])
+            self._generation = generation
+        for version in retired:
+            for cache in self.caches:
+                cache.invalidate_version(version)
+
+    def _default_of(self, state):
+        return state["default"] or self._builtin_default
+
+    def _known(self, state):
+        return {v for v in self._builtin if v not in state["retired"]} | set(state["versions"])
+
+    def _check_known(self, state, version):
+        if version not in self._known(state):
+            raise KeyError(version)
+
+    @staticmethod
+    def _check(routing, version):
+        if version not in routing.entries:
+            raise KeyError(version)
+
+    # ---------------- routing ----------------
+    def get(self, version: str = None) -> ModelEntry:
+        r = self._routing
+        if version is None:
+            return r.entries[r.default]
+        self._check(r, version)
+        return r.entries[version]
+
+    @property
+    def default(self) -> ModelEntry:
+        return self.get()
+
+    def route(self, pinned: str = None, key: str = None) -> ModelEntry:
+        """The version for one request: pinned if given, else canary or default by routing key."""
+        r = self._routing
+        if pinned is not None:
+            self._check(r, pinned)
+            version = pinned
+        elif r.canary and key is not None and zlib.crc32(key.encode()) % 10000 < r.canary_percent * 100:
+            version = r.canary
+        else:
+            version = r.default
+        self.routed[version] = self.routed.get(version, 0) + 1
+        return r.entries[version]
+
+    def versions(self):
+        return list(self._routing.entries) if self._routing else []
+
+    def stats(self):
+        # request counts are this process's; the routing is the shared one
+        r = self._routing
+        return {
+            "default": r.default,
+            "canary": {"version": r.canary, "percent": r.canary_percent} if r.canary else None,
+            "versions": {v: {"loaded_at": e.loaded_at, "warmup_seconds": e.warmup_seconds,
+                             "requests": self.routed.get(v, 0)}
+                         for v, e in r.entries.items()}
+        }
@@ -0,0 +1,209 @@
+# storage/archive.py
+# Cold tier for append-only log tables. compact() moves rows older than a
+# retention window out of SQLite into date-partitioned columnar files
+#
+#     <archive_dir>/date=YYYY-MM-DD/part-<first id>-<last id>.parquet
+#
+# and records each part in the archive_manifest table of the same database,
+# so readers know which id ranges live where. Parquet (zstd) is used when
+# pyarrow is installed; otherwise each part is a directory of uncompressed
+# .npy files, one per column, which can be memory-mapped without pyarrow.
+import heapq
+import os
+import shutil
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from storage.sqlite import get_connection, query, query_one, transaction
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - exercised only without pyarrow
+    pa = pq = None
+
+DEFAULT_FORMAT = "parquet" if pq is not None else "npy"
+
+
+class LedgerArchive:
+    """Archive of one table (`id INTEGER PRIMARY KEY` + a sortable ISO time column)."""
+
+    def __init__(self, db_path: str, archive_dir: str, table: str = "action_logs",
+                 time_column: str = "created_at", fmt: str = None, chunk_rows: int = 100000):
+        self.db_path = db_path
+        self.archive_dir = archive_dir
+        self.table = table
+        self.time_column = time_column
+        self.fmt = fmt or DEFAULT_FORMAT
+        if self.fmt == "parquet" and pq is None:
+            raise RuntimeError("parquet archives need pyarrow")
+        self.chunk_rows = chunk_rows
+
+    # ---------------- writing ----------------
+    def _columns(self):
+        return [(r[1], (r[2] or "").upper()) for r in query(self.db_path, f"PRAGMA table_info({self.table})")]
+
+    def compact(self, retention_days: int = 90, now: datetime = None):
+        """Move rows whose time column is older than retention_days into the archive.
+
+        Each part file is written (and renamed into place) before the rows
+        are deleted, and the manifest insert + delete share one transaction,
+        so a crash at any point leaves every row either in SQLite or in a
+        manifest-listed part - at worst an orphan file that the next run
+        overwrites.
+        """
+        cutoff = ((now or datetime.utcnow()) - timedelta(days=retention_days)).isoformat()
+        columns = self._columns()
+        names = [c for c, _ in columns]
+        t = names.index(self.time_column)
+        sql = (f"SELECT {', '.join(names)} FROM {self.table} "
+               f"WHERE {self.time_column} < ? AND id > ? ORDER BY id LIMIT ?")
+
+        moved, parts, after_id = 0, [], 0
+        while True:
+            rows = get_connection(self.db_path).execute(sql, (cutoff, after_id, self.chunk_rows)).fetchall()
+            if not rows:
+                break
+            after_id = rows[-1][0]
+
+            by_date = {}
+            for r in rows:
+                by_date.setdefault((r[t] or "")[:10] or "unknown", []).append(r)
+
+            for date, date_rows in sorted(by_date.items()):
+                first_id, last_id = date_rows[0][0], date_rows[-1][0]
+                path = self._write_part(date, first_id, last_id, columns, date_rows)
+                ids = [(r[0],) for r in date_rows]
+                with transaction(self.db_path, immediate=True) as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO archive_manifest(table_name, part_date, first_id, last_id, "
+                        "row_count, format, path, created_at) VALUES (?,?,?,?,?,?,?,?)",
+                        (self.table, date, first_id, last_id, len(date_rows), self.fmt,
+                         os.path.relpath(path, self.archive_dir), datetime.utcnow().isoformat()))
+                    conn.executemany(f"DELETE FROM {self.table} WHERE id=?", ids)
+                moved += len(date_rows)
+                parts.append({"date": date, "first_id": first_id, "last_id": last_id, "rows": len(date_rows)})
+
+        return {"cutoff": cutoff, "moved_rows": moved, "parts": parts}
+
+    def _write_part(self, date, first_id, last_id, columns, rows):
+        part_dir = os.path.join(self.archive_dir, f"date={date}")
+        os.makedirs(part_dir, exist_ok=True)
+        name = f"part-{first_id:012d}-{last_id:012d}"
+        values = list(zip(*rows))
+
+        if self.fmt == "parquet":
+            path = os.path.join(part_dir, name + ".parquet")
+            table = pa.table({c: list(v) for (c, _), v in zip(columns, values)})
+            pq.write_table(table, path + ".tmp", compression="zstd")
+            os.replace(path + ".tmp", path)
+            return path
+
+        path = os.path.join(part_dir, name)
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for (col, sql_type), v in zip(columns, values):
+            np.save(os.path.join(tmp, col + ".npy"), _to_array(v, sql_type))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+        return path
+
+    # ---------------- reading ----------------
+    def parts(self, after_id: int = 0, upto_id: int = None):
+        sql = ("SELECT first_id, last_id, row_count, format, path, part_date FROM archive_manifest "
+               "WHERE table_name=? AND last_id > ?")
+        params = [self.table, after_id]
+        if upto_id is not None:
+            sql += " AND first_id <= ?"
+            params.append(upto_id)
+        rows = query(self.db_path, sql + " ORDER BY first_id", params)
+        return [{"first_id": r[0], "last_id": r[1], "rows": r[2], "format": r[3],
+                 "path": os.path.join(self.archive_dir, r[4]), "date": r[5]} for r in rows]
+
+    def scan(self, columns=None, after_id: int = 0, upto_id: int = None):
+        """Yield {column: ndarray} per archived part, in id order, memory-mapped where possible.
+
+        Only rows with after_id < id (<= upto_id) are returned. Columns a
+        part does not have are skipped.
+        """
+        for part in self.parts(after_id, upto_id):
+            cols = _read_part(part, columns)
+            ids = cols["id"]
+            keep = ids > after_id
+            if upto_id is not None:
+                keep &= ids <= upto_id
+            if not keep.all():
+                cols = {c: v[keep] for c, v in cols.items()}
+            if len(cols["id"]):
+                yield cols
+
+    def iter_hashes(self, after_id: int = 0):
+        """(id, hash) of every archived row, in id order."""
+        parts = (zip(c["id"].tolist(), c["hash"].tolist()) for c in self.scan(["id", "hash"], after_id))
+        # parts of different dates cut from one chunk can interleave ids
+        return heapq.merge(*parts)
+
+    def lookup(self, row_id: int):
+        """One archived row as a dict, or None."""
+        for cols in self.scan(None, row_id - 1, row_id):
+            return {c: _scalar(v[0]) for c, v in cols.items()}
+        return None
+
+    def stats(self):
+        row = query_one(self.db_path,
+                        "SELECT COUNT(*), SUM(row_count), MIN(first_id), MAX(last_id), MIN(part_date), "
+                        "MAX(part_date) FROM archive_manifest WHERE table_name=?", (self.table,))
+        size = 0
+        for part in self.parts():
+            if os.path.isdir(part["path"]):
+                size += sum(os.path.getsize(os.path.join(part["path"], f)) for f in os.listdir(part["path"]))
+            elif os.path.exists(part["path"]):
+                size += os.path.getsize(part["path"])
+        return {
+            "format": self.fmt,
+            "parts": row[0],
+            "rows": row[1] or 0,
+            "first_id": row[2],
+            "last_id": row[3],
+            "first_date": row[4],
+            "last_date": row[5],
+            "bytes": size
+        }
+
+
+def _to_array(values, sql_type):
+    if "INT" in sql_type and None not in values:
+        return np.array(values, dtype=np.int64)
+    if any(t in sql_type for t in ("INT", "REAL", "FLOA", "DOUB")):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    # fixed-width unicode so the column stays memory-mappable; NULL becomes ""
+    return np.array(["" if v is None else str(v) for v in values])
+
+
+def _read_part(part, columns):
+    if part["format"] == "parquet":
+        if pq is None:
+            raise RuntimeError(f"{part['path']} is parquet but pyarrow is not installed")
+        available = pq.read_schema(part["path"]).names
+        wanted = [c for c in (columns or available) if c in available]
+        table = pq.read_table(part["path"], columns=wanted, memory_map=True)
+        out = {}
+        for c in wanted:
+            col = table.column(c)
+            if pa.types.is_integer(col.type) and col.null_count == 0:
+                out[c] = col.to_numpy()
+            elif pa.types.is_integer(col.type) or pa.types.is_floating(col.type):
+                out[c] = col.to_numpy(zero_copy_only=False).astype(np.float64)
+            else:
+                out[c] = np.array(col.to_pylist(), dtype=object)
+        return out
+
+    available = [f[:-4] for f in os.listdir(part["path"]) if f.endswith(".npy")]
+    wanted = [c for c in (columns or available) if c in available]
+    return {c: np.load(os.path.join(part["path"], c + ".npy"), mmap_mode="r") for c in wanted}
+
+
+def _scalar(v):
+    return v.item() if isinstance(v, np.generic) else v
@@ -0,0 +1,51 @@
+# storage/columnar.py
+# Bulk loads of the typed decision columns of action_logs straight into
+# NumPy arrays (no json.loads per row).
+import itertools
+
+import numpy as np
+
+from storage.sqlite import get_connection
+
+FEATURE_COLUMNS = ("income", "age", "credit_score", "spending_ratio")
+DECISION_COLUMNS = ("id",) + FEATURE_COLUMNS + ("decision",)
+
+
+def load_decisions(path: str, after_id: int = 0, limit: int = None, upto_id: int = None):
+    """Columns of action_logs rows with after_id < id (<= upto_id), ordered by id.
+
+    Returns {"id": int64[n], "income": float64[n], ..., "decision": float64[n]}
+    where decision is 1.0 approved / 0.0 denied.
+    """
+    sql = f"SELECT {', '.join(DECISION_COLUMNS)} FROM action_logs WHERE id > ?"
+    params = [after_id]
+    if upto_id is not None:
+        sql += " AND id <= ?"
+        params.append(upto_id)
+    sql += " ORDER BY id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    conn = get_connection(path)
+    k = len(DECISION_COLUMNS)
+    try:
+        flat = np.fromiter(itertools.chain.from_iterable(conn.execute(sql, params)), dtype=np.float64)
+        table = flat.reshape(-1, k)
+    except TypeError:
+        # a NULL column somewhere; the slower path maps it to NaN
+        rows = conn.execute(sql, params).fetchall()
+        table = np.array(rows, dtype=np.float64).reshape(-1, k)
+    out = {c: table[:, i] for i, c in enumerate(DECISION_COLUMNS)}
+    out["id"] = out["id"].astype(np.int64)
+    return out
+
+
+def iter_decision_chunks(path: str, after_id: int = 0, chunk_size: int = 100000, upto_id: int = None):
+    """Keyset-paginated load_decisions() chunks."""
+    while True:
+        cols = load_decisions(path, after_id, chunk_size, upto_id)
+        if not len(cols["id"]):
+            return
+        yield cols
+        after_id = int(cols["id"][-1])
@@ -0,0 +1,423 @@
+# storage/migrations.py
+# Versioned schema for every SQLite store. Each store has an ordered list of
+# (version, description, statements); migrate() applies the ones a database
+# file has not seen yet, each in its own transaction, and records them in
+# schema_migrations. Never edit a released step - append a new one.
+from datetime import datetime
+
+from storage.sqlite import query, transaction
+
+
+def _add_decision_columns(conn):
+    # typed copies of the JSON inputs/output so analytics can skip json parsing
+    existing = {r[1] for r in conn.execute("PRAGMA table_info(action_logs)")}
+    for col, sql_type in (("income", "REAL"), ("age", "REAL"), ("credit_score", "REAL"),
+                          ("spending_ratio", "REAL"), ("decision", "INTEGER")):
+        if col not in existing:
+            conn.execute(f"ALTER TABLE action_logs ADD COLUMN {col} {sql_type}")
+    conn.execute("""
+        UPDATE action_logs SET
+            income = json_extract(inputs, '$.income'),
+            age = json_extract(inputs, '$.age'),
+            credit_score = json_extract(inputs, '$.credit_score'),
+            spending_ratio = json_extract(inputs, '$.spending_ratio'),
+            decision = json_extract(output, '$.decision') = 'approved'
+        WHERE decision IS NULL
+    """)
+
+
+def _receipt_identity(conn):
+    # one receipt per action, addressable by a receipt_id derived from it. Receipts
+    # already handed out stay on record: every earlier row is copied, as issued,
+    # into receipts_legacy (under the "r_<row id>" the old listing showed) before
+    # an action's duplicates leave the receipts table. Canonical ids are "rc_<action
+    # id>" so that no old id can name a different action's receipt.
+    existing = {r[1] for r in conn.execute("PRAGMA table_info(receipts)")}
+    for col in ("receipt_id", "receipt_json"):
+        if col not in existing:
+            conn.execute(f"ALTER TABLE receipts ADD COLUMN {col} TEXT")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS receipts_legacy (
+            legacy_id TEXT PRIMARY KEY,
+            row_id INTEGER,
+            action_rowid INTEGER,
+            user_id TEXT,
+            summary TEXT,
+            reasons TEXT,
+            used_data TEXT,
+            alternatives TEXT,
+            audit_anchor TEXT,
+            timestamp TEXT,
+            canonical INTEGER,
+            moved_at TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_receipts_legacy_action ON receipts_legacy(action_rowid, row_id)")
+    conn.execute("""
+        INSERT OR IGNORE INTO receipts_legacy(legacy_id, row_id, action_rowid, user_id, summary, reasons, used_data,
+                                              alternatives, audit_anchor, timestamp, canonical, moved_at)
+        SELECT 'r_' || id, id, action_rowid, user_id, summary, reasons, used_data, alternatives, audit_anchor,
+               timestamp, id IN (SELECT MIN(id) FROM receipts GROUP BY action_rowid), ?
+        FROM receipts WHERE receipt_id IS NULL
+    """, (datetime.utcnow().isoformat(),))
+    conn.execute("DELETE FROM receipts WHERE id NOT IN (SELECT MIN(id) FROM receipts GROUP BY action_rowid)")
+    conn.execute("UPDATE receipts SET receipt_id = 'rc_' || action_rowid WHERE receipt_id IS NULL")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_receipts_action_unique ON receipts(action_rowid)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_receipts_receipt_id ON receipts(receipt_id)")
+
+
+def _add_epoch_lease(conn):
+    # the anchorer that is filling an open epoch, and when it last said so
+    existing = {r[1] for r in conn.execute("PRAGMA table_info(anchor_epochs)")}
+    if "owner" not in existing:
+        conn.execute("ALTER TABLE anchor_epochs ADD COLUMN owner TEXT")
+    if "heartbeat_at" not in existing:
+        conn.execute("ALTER TABLE anchor_epochs ADD COLUMN heartbeat_at REAL")
+
+
+def _add_twin_version(conn):
+    existing = {r[1] for r in conn.execute("PRAGMA table_info(twin)")}
+    if "version" not in existing:
+        conn.execute("ALTER TABLE twin ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+# parts written by storage.archive.LedgerArchive.compact()
+ARCHIVE_MANIFEST_SQL = """
+    CREATE TABLE IF NOT EXISTS archive_manifest (
+        table_name TEXT,
+        part_date TEXT,
+        first_id INTEGER,
+        last_id INTEGER,
+        row_count INTEGER,
+        format TEXT,
+        path TEXT,
+        created_at TEXT,
+        PRIMARY KEY (table_name, first_id)
+    )
+"""
+
+
+# epochs sealed by verifiable.epochs.EpochAnchorer
+ANCHOR_EPOCH_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS anchor_epochs (
+        epoch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        size INTEGER,
+        root TEXT,
+        signature TEXT,
+        opened_at TEXT,
+        closed_at TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS anchor_leaves (
+        epoch_id INTEGER,
+        leaf_index INTEGER,
+        leaf_hash TEXT,
+        receipt_id TEXT,
+        PRIMARY KEY (epoch_id, leaf_index)
+    ) WITHOUT ROWID
+    """,
+]
+
+
+MIGRATIONS = {
+    # api/action_logs.db - decisions served by api/main.py
+    "actions": [
+        (1, "action_logs table", ["""
+            CREATE TABLE IF NOT EXISTS action_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                inputs TEXT,
+                output TEXT,
+                explanation TEXT,
+                model_version TEXT,
+                created_at TEXT,
+                hash TEXT
+            )
+        """]),
+        (2, "typed feature and decision columns", [_add_decision_columns]),
+        (3, "archive manifest", [ARCHIVE_MANIFEST_SQL]),
+        (4, "append-only merkle tree over action hashes", [
+            """
+            CREATE TABLE IF NOT EXISTS merkle_nodes (
+                level INTEGER,
+                idx INTEGER,
+                hash BLOB,
+                PRIMARY KEY (level, idx)
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS merkle_leaves (
+                leaf_index INTEGER PRIMARY KEY,
+                action_id INTEGER
+            )
+            """,
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_merkle_leaves_action ON merkle_leaves(action_id)",
+            """
+            CREATE TABLE IF NOT EXISTS merkle_state (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                size INTEGER,
+                frontier BLOB,
+                root BLOB,
+                updated_at TEXT
+            )
+            """,
+        ]),
+    ],
+    # api/receipts.db
+    "receipts": [
+        (1, "receipts table", ["""
+            CREATE TABLE IF NOT EXISTS receipts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                action_rowid INTEGER,
+                user_id TEXT,
+                summary TEXT,
+                reasons TEXT,
+                used_data TEXT,
+                alternatives TEXT,
+                audit_anchor TEXT,
+                timestamp TEXT
+            )
+        """]),
+        (2, "covering index for receipts by user", [
+            "CREATE INDEX IF NOT EXISTS idx_receipts_user ON receipts(user_id, action_rowid, summary, timestamp)",
+        ]),
+        (3, "receipt anchor epochs", ANCHOR_EPOCH_SQL),
+        (4, "one receipt per action, indexed by receipt_id", [_receipt_identity]),
+        (5, "owner lease on open anchor epochs", [_add_epoch_lease]),
+    ],
+    # api/incidents.db
+    "incidents": [
+        (1, "incidents table", ["""
+            CREATE TABLE IF NOT EXISTS incidents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                test TEXT,
+                value REAL,
+                severity TEXT,
+                created_at TEXT
+            )
+        """]),
+    ],
+    # auditor_engine/incidents.db - written by EthicalAIAuditor and the scheduler
+    "auditor_incidents": [
+        (1, "incidents table", ["""
+            CREATE TABLE IF NOT EXISTS incidents (
+              id TEXT PRIMARY KEY,
+              test TEXT,
+              value REAL,
+              severity TEXT,
+              created_at TEXT
+            )
+        """]),
+        (2, "running audit statistics", ["""
+            CREATE TABLE IF NOT EXISTS audit_state (
+                name TEXT PRIMARY KEY,
+                last_rowid INTEGER,
+                state_json TEXT,
+                updated_at TEXT
+            )
+        """]),
+        (3, "drift histograms per time bucket and reference windows", [
+            """
+            CREATE TABLE IF NOT EXISTS drift_buckets (
+                name TEXT,
+                feature TEXT,
+                bucket INTEGER,
+                n INTEGER,
+                counts TEXT,
+                PRIMARY KEY (name, feature, bucket)
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS drift_reference (
+                name TEXT,
+                reference TEXT,
+                feature TEXT,
+                window_start TEXT,
+                window_end TEXT,
+                n INTEGER,
+                counts TEXT,
+                created_at TEXT,
+                PRIMARY KEY (name, reference, feature)
+            )
+            """,
+        ]),
+        (4, "scheduler job runs", [
+            """
+            CREATE TABLE IF NOT EXISTS scheduler_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job TEXT,
+                status TEXT,
+                host TEXT,
+                pid INTEGER,
+                started_at TEXT,
+                runtime REAL,
+                queued REAL,
+                error TEXT
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_scheduler_runs_job ON scheduler_runs(job, id)",
+        ]),
+    ],
+    # action_logs.db used by app.py
+    "app_actions": [
+        (1, "action_logs table", ["""
+            CREATE TABLE IF NOT EXISTS action_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                endpoint TEXT,
+                user_id TEXT,
+                payload TEXT,
+                result TEXT,
+                timestamp TEXT
+            )
+        """]),
+        (2, "archive manifest", [ARCHIVE_MANIFEST_SQL]),
+    ],
+    # receipts kept by the old auditor_engine/receipts.py helpers (now in api/receipts.db)
+    "ledger_receipts": [
+        (1, "receipts table", ["""
+            CREATE TABLE IF NOT EXISTS receipts (
+                id TEXT PRIMARY KEY,
+                action_row_id INTEGER,
+                user_id TEXT,
+                receipt_json TEXT,
+                created_at TEXT
+            )
+        """]),
+        (2, "indexes for receipts by action and by user", [
+            "CREATE INDEX IF NOT EXISTS idx_receipts_action ON receipts(action_row_id)",
+            "CREATE INDEX IF NOT EXISTS idx_receipts_user_created ON receipts(user_id, created_at)",
+        ]),
+        (3, "receipt anchor epochs", ANCHOR_EPOCH_SQL),
+        (4, "owner lease on open anchor epochs", [_add_epoch_lease]),
+    ],
+    "appeals": [
+        (1, "appeals table", ["""
+            CREATE TABLE IF NOT EXISTS appeals(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                action_id INTEGER,
+                message TEXT,
+                status TEXT,
+                created_at TEXT
+            )
+        """]),
+        (2, "index appeals by user", [
+            "CREATE INDEX IF NOT EXISTS idx_appeals_user ON appeals(user_id)",
+        ]),
+    ],
+    "twin": [
+        (1, "twin table", ["""
+            CREATE TABLE IF NOT EXISTS twin (
+                user_id TEXT PRIMARY KEY,
+                twin_json TEXT,
+                updated_at TEXT
+            )
+        """]),
+        (2, "twin versions and append-only annotations", [
+            _add_twin_version,
+            """
+            CREATE TABLE IF NOT EXISTS twin_annotations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                annotation_json TEXT,
+                created_at TEXT
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_twin_annotations_user ON twin_annotations(user_id, id)",
+        ]),
+    ],
+    # api/models.db - model routing shared by the API workers
+    "models": [
+        (1, "shared model routing state", ["""
+            CREATE TABLE IF NOT EXISTS model_routing (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                generation INTEGER NOT NULL,
+                state_json TEXT NOT NULL,
+                updated_at TEXT
+            )
+        """]),
+    ],
+    "consent": [
+        (1, "consents table", ["""
+            CREATE TABLE IF NOT EXISTS consents (
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              user_id TEXT,
+              feature TEXT,
+              allowed INTEGER,
+              expiry TEXT,
+              signature TEXT,
+              updated_at TEXT
+            )
+        """]),
+        (2, "covering index for consent history by user", [
+            "CREATE INDEX IF NOT EXISTS idx_consents_user_updated "
+            "ON consents(user_id, updated_at, feature, allowed, expiry)",
+        ]),
+        (3, "index consents by user and id for keyset pages", [
+            "CREATE INDEX IF NOT EXISTS idx_consents_user_id ON consents(user_id, id)",
+        ]),
+        (4, "materialized current consent per user and feature", [
+            """
+            CREATE TABLE IF NOT EXISTS consent_current (
+                user_id TEXT,
+                feature TEXT,
+                allowed INTEGER,
+                expiry TEXT,
+                updated_at TEXT,
+                consent_id INTEGER,
+                PRIMARY KEY (user_id, feature)
+            ) WITHOUT ROWID
+            """,
+            """
+            INSERT OR REPLACE INTO consent_current (user_id, feature, allowed, expiry, updated_at, consent_id)
+            SELECT user_id, feature, allowed, expiry, updated_at, id FROM consents
+            WHERE id IN (SELECT MAX(id) FROM consents GROUP BY user_id, feature)
+            """,
+        ]),
+    ],
+}
+
+
+def _ensure_ledger(path: str):
+    with transaction(path) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name TEXT,
+                version INTEGER,
+                description TEXT,
+                applied_at TEXT,
+                PRIMARY KEY (name, version)
+            )
+        """)
+
+
+def schema_version(path: str, name: str) -> int:
+    _ensure_ledger(path)
+    row = query(path, "SELECT MAX(version) FROM schema_migrations WHERE name=?", (name,))
+    return row[0][0] or 0
+
+
+def migrate(path: str, name: str) -> int:
+    """Bring the `name` schema in `path` up to date; returns the resulting version."""
+    current = schema_version(path, name)
+    for version, description, steps in MIGRATIONS[name]:
+        if version <= current:
+            continue
+        with transaction(path, immediate=True) as conn:
+            # another process may have applied it while we waited for the lock
+            done = conn.execute("SELECT 1 FROM schema_migrations WHERE name=? AND version=?",
+                                (name, version)).fetchone()
+            if done:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                "INSERT INTO schema_migrations(name, version, description, applied_at) VALUES (?,?,?,?)",
+                (name, version, description, datetime.utcnow().isoformat()))
+        current = version
+    return current
@@ -0,0 +1,62 @@
+# storage/pagination.py
+# Keyset (cursor) pagination for list endpoints. A page is "the next `limit`
+# rows past the last key the client saw", so every page is one index range
+# scan however deep the client is - OFFSET would re-read all skipped rows.
+# iter_rows() walks the same ranges lazily, a page at a time, which is what
+# the NDJSON variants stream: memory stays at one page and the first line is
+# sent after the first page, whatever the table size. Pages are separate
+# reads, so a long stream never pins a read transaction (and the WAL).
+import json
+
+from storage.sqlite import query
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+STREAM_PAGE = 500
+
+
+def page(path: str, select: str, key: str, where: str = "", params=(), after_id: int = None,
+         limit: int = DEFAULT_LIMIT, desc: bool = False) -> list:
+    """Up to `limit` rows of `select` ordered by the integer column `key`, past after_id.
+
+    `where` is an extra condition (with `params`); with desc=True the order is
+    descending and "past" means smaller keys.
+    """
+    conds, args = ([where], list(params)) if where else ([], [])
+    if after_id is not None:
+        conds.append(f"{key} {'<' if desc else '>'} ?")
+        args.append(after_id)
+    sql = select
+    if conds:
+        sql += " WHERE " + " AND ".join(conds)
+    sql += f" ORDER BY {key} {'DESC' if desc else 'ASC'} LIMIT ?"
+    return query(path, sql, args + [limit])
+
+
+def iter_rows(path: str, select: str, key: str, where: str = "", params=(), after_id: int = None,
+              limit: int = None, desc: bool = False, key_index: int = 0, page_size: int = STREAM_PAGE):
+    """Every row past after_id (at most `limit`), fetched one page at a time.
+
+    key_index is the position of `key` in the selected columns.
+    """
+    left = limit
+    while left is None or left > 0:
+        n = page_size if left is None else min(page_size, left)
+        rows = page(path, select, key, where, params, after_id, n, desc)
+        yield from rows
+        if len(rows) < n:
+            return
+        after_id = rows[-1][key_index]
+        if left is not None:
+            left -= len(rows)
+
+
+def next_cursor(items: list, limit: int, key):
+    """after_id for the following page, or None when this page was the last."""
+    return items[-1][key] if items and len(items) >= limit else None
+
+
+def ndjson(items):
+    """One JSON document per line."""
+    for item in items:
+        yield json.dumps(item) + "\n"
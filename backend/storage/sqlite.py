@@ -0,0 +1,96 @@
+# storage/sqlite.py
+# Shared SQLite access: one pooled connection per (thread, database file),
+# WAL journaling and a statement cache so repeated SQL is not re-prepared.
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",     # survives a process crash; power-loss durable at checkpoints
+    "PRAGMA cache_size=-16000",      # ~16 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_all_connections = []
+_all_lock = threading.Lock()
+_generation = 0     # bumped by close_all() so every thread reopens
+
+
+def _open(path: str) -> sqlite3.Connection:
+    # autocommit mode; transaction() issues BEGIN/COMMIT explicitly
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    with _all_lock:
+        _all_connections.append(conn)
+    return conn
+
+
+def get_connection(path: str) -> sqlite3.Connection:
+    """This thread's connection to `path`, opened on first use."""
+    pool = getattr(_local, "pool", None)
+    if pool is None or _local.generation != _generation:
+        pool = _local.pool = {}
+        _local.generation = _generation
+    conn = pool.get(path)
+    if conn is None:
+        conn = pool[path] = _open(path)
+    return conn
+
+
+@contextmanager
+def transaction(path: str, immediate: bool = False):
+    """BEGIN ... COMMIT on this thread's connection; rolls back on error.
+
+    immediate=True takes the write lock up front, for read-then-write blocks.
+    """
+    conn = get_connection(path)
+    if conn.in_transaction:
+        # nested use joins the outer transaction
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def execute(path: str, sql: str, params=()) -> sqlite3.Cursor:
+    """Run one write statement in its own transaction."""
+    with transaction(path) as conn:
+        return conn.execute(sql, params)
+
+
+def executemany(path: str, sql: str, rows) -> None:
+    with transaction(path) as conn:
+        conn.executemany(sql, rows)
+
+
+def query(path: str, sql: str, params=()) -> list:
+    return get_connection(path).execute(sql, params).fetchall()
+
+
+def query_one(path: str, sql: str, params=()):
+    return get_connection(path).execute(sql, params).fetchone()
+
+
+def close_all() -> None:
+    """Close every pooled connection (shutdown / tests)."""
+    global _generation
+    with _all_lock:
+        conns = list(_all_connections)
+        _all_connections.clear()
+        _generation += 1
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
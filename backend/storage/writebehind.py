@@ -0,0 +1,185 @@
+# storage/writebehind.py
+# Group-commit queue: request threads enqueue rows, one background writer
+# flushes them in batches (by size or time) inside a single transaction.
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from storage.sqlite import get_connection, transaction
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindLogger:
+    """Batched, ordered inserts into one table of one SQLite file.
+
+    submit()/submit_many() return immediately with Futures that resolve to
+    the inserted rowids once the batch has committed; pass wait=True to block
+    until then ("wait for durable"). A batch with a waiting caller in it is
+    committed with synchronous=FULL, so it survives power loss and OS
+    crashes, not only a crash of this process; other batches commit with
+    the default synchronous=NORMAL and become that durable at the next
+    FULL commit or checkpoint. Batches linger up to flush_interval to
+    collect more rows unless a waiting caller is in them. Rows of one
+    submit_many() call are always committed together. close() drains the
+    queue and stops the writer.
+
+    after_insert(conn, rows, rowids), if given, runs inside the batch
+    transaction after the inserts, so derived writes commit atomically
+    with the rows.
+    """
+
+    def __init__(self, path: str, insert_sql: str, batch_size: int = 500,
+                 flush_interval: float = 0.02, max_retries: int = 3, after_insert=None):
+        self.path = path
+        self.insert_sql = insert_sql
+        self.after_insert = after_insert
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.enqueued = self.written = self.batches = self.failed = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        # guards _closed, the counters and enqueueing, so nothing lands behind _STOP
+        self._state = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name=f"write-behind:{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, row, wait: bool = False, timeout: float = None):
+        result = self.submit_many([row], wait=wait, timeout=timeout)
+        return result[0]
+
+    def submit_many(self, rows, wait: bool = False, timeout: float = None):
+        rows = list(rows)
+        futures = [Future() for _ in rows]
+        with self._state:
+            if self._closed:
+                raise RuntimeError("write-behind logger is closed")
+            self.enqueued += len(rows)
+            self._queue.put((rows, futures, wait))
+        if wait:
+            return [f.result(timeout) for f in futures]
+        return futures
+
+    def flush(self, timeout: float = None):
+        """Block until everything submitted so far has been committed."""
+        barrier = Future()
+        with self._state:
+            closed = self._closed
+            if not closed:
+                self._queue.put(([], [barrier], True))
+        if closed:
+            # close() queued the final drain; wait for the writer to finish it
+            self._thread.join(timeout)
+            return
+        barrier.result(timeout)
+
+    def close(self, timeout: float = 10.0):
+        with self._state:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            # the writer has drained and exited; nothing may be left waiting on it
+            self._fail_pending(RuntimeError("write-behind logger is closed"))
+
+    def _fail_pending(self, exc):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is _STOP:
+                continue
+            rows, futures, _ = item
+            with self._state:
+                self.failed += len(rows)
+            for f in futures:
+                f.set_exception(exc)
+
+    def stats(self):
+        with self._state:
+            return {
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "batches": self.batches,
+                "failed": self.failed,
+                "pending": self._queue.qsize()
+            }
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch, n, urgent = [item], len(item[0]), item[2]
+            deadline = time.monotonic() + self.flush_interval
+            while n < self.batch_size:
+                # take what is already queued; only linger when nobody is waiting
+                remaining = 0 if urgent else deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                n += len(item[0])
+                urgent = urgent or item[2]
+            self._write(batch)
+
+        # drain anything that raced with close()
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        if leftover:
+            self._write(leftover)
+
+    def _write(self, batch):
+        # FULL fsyncs the WAL at COMMIT, which also covers every earlier NORMAL commit
+        durable = any(wait for _, _, wait in batch)
+        get_connection(self.path).execute(f"PRAGMA synchronous={'FULL' if durable else 'NORMAL'}")
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                rowids = []
+                with transaction(self.path) as conn:
+                    for rows, _, _ in batch:
+                        rowids.append([conn.execute(self.insert_sql, r).lastrowid for r in rows])
+                    if self.after_insert:
+                        self.after_insert(conn, [r for rows, _, _ in batch for r in rows],
+                                          [i for ids in rowids for i in ids])
+                break
+            except Exception as exc:
+                if attempt == self.max_retries:
+                    log.exception("write-behind flush to %s failed", self.path)
+                    with self._state:
+                        self.failed += sum(len(rows) for rows, _, _ in batch)
+                    for _, futures, _ in batch:
+                        for f in futures:
+                            f.set_exception(exc)
+                    return
+                time.sleep(0.05 * attempt)
+
+        with self._state:
+            self.batches += 1
+            self.written += sum(len(rows) for rows, _, _ in batch)
+        for (rows, futures, _), ids in zip(batch, rowids):
+            for f, rowid in zip(futures, ids + [None] * (len(futures) - len(ids))):
+                f.set_result(rowid)
@@ -0,0 +1,191 @@
+# verifiable/accumulator.py
+# Append-only RFC 6962 Merkle tree over the decision log. Only the right-edge
+# frontier (one perfect subtree per set bit of the tree size) is needed to
+# append, so each new leaf costs O(log n) hashes and the current root is a
+# single row read. Every perfect subtree ever completed is kept in
+# merkle_nodes, which is enough to rebuild the root of any earlier tree size,
+# and any inclusion or consistency proof, from O(log n) stored nodes.
+import heapq
+import itertools
+from datetime import datetime
+
+from storage.sqlite import query, query_one, transaction
+from verifiable.merkle import (
+    EMPTY_ROOT, audit_path_ranges, consistency_ranges, fold_frontier, leaf_hash, node_hash,
+)
+
+
+class MerkleLog:
+    """Merkle tree whose leaves are action_logs hashes, in action id order.
+
+    append() runs inside the caller's transaction (the write-behind flush
+    that inserts the rows), so a decision and its leaf commit together.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    # ---------------- writing ----------------
+    @staticmethod
+    def _load(conn):
+        row = conn.execute("SELECT size, frontier FROM merkle_state WHERE id=0").fetchone()
+        if not row:
+            return 0, []
+        frontier = row[1] or b""
+        return row[0], [frontier[i:i + 32] for i in range(0, len(frontier), 32)]
+
+    def append(self, conn, leaves, action_ids):
+        """Append leaves (action hashes) for action_ids; returns their leaf indices."""
+        size, frontier = self._load(conn)
+        first = size
+        nodes, leaf_rows = [], []
+        for leaf, action_id in zip(leaves, action_ids):
+            node = leaf_hash(leaf)
+            nodes.append((0, size, node))
+            leaf_rows.append((size, action_id))
+            # each trailing 1 bit of size is a finished subtree to merge with
+            n, level = size, 0
+            while n & 1:
+                node = node_hash(frontier.pop(), node)
+                level += 1
+                n >>= 1
+                nodes.append((level, size >> level, node))
+            frontier.append(node)
+            size += 1
+
+        if size == first:
+            return range(first, first)
+        conn.executemany("INSERT INTO merkle_nodes(level, idx, hash) VALUES (?,?,?)", nodes)
+        conn.executemany("INSERT INTO merkle_leaves(leaf_index, action_id) VALUES (?,?)", leaf_rows)
+        conn.execute(
+            "INSERT OR REPLACE INTO merkle_state(id, size, frontier, root, updated_at) VALUES (0,?,?,?,?)",
+            (size, b"".join(frontier), fold_frontier(frontier), datetime.utcnow().isoformat()))
+        return range(first, size)
+
+    def sync(self, archive=None, chunk: int = 50000):
+        """Append every logged decision not yet in the tree (archived ones included).
+
+        Used to seed the tree from an existing action_logs table; afterwards
+        the write-behind flush keeps it current.
+        """
+        added = 0
+        after_id = query_one(self.path, "SELECT MAX(action_id) FROM merkle_leaves")[0] or 0
+        pending = heapq.merge(archive.iter_hashes(after_id) if archive else (), self._hot_hashes(after_id))
+        while True:
+            batch = list(itertools.islice(pending, chunk))
+            if not batch:
+                return added
+            with transaction(self.path, immediate=True) as conn:
+                # another writer may have appended some of them meanwhile
+                last = conn.execute("SELECT MAX(action_id) FROM merkle_leaves").fetchone()[0] or 0
+                batch = [(i, h) for i, h in batch if i > last]
+                self.append(conn, [h for _, h in batch], [i for i, _ in batch])
+            added += len(batch)
+
+    def _hot_hashes(self, after_id: int, chunk: int = 50000):
+        while True:
+            rows = query(self.path, "SELECT id, hash FROM action_logs WHERE id > ? ORDER BY id LIMIT ?",
+                         (after_id, chunk))
+            if not rows:
+                return
+            yield from rows
+            after_id = rows[-1][0]
+
+    # ---------------- reading ----------------
+    def head(self):
+        """(tree size, root) as of the last committed append - one row read."""
+        row = query_one(self.path, "SELECT size, root FROM merkle_state WHERE id=0")
+        return tuple(row) if row else (0, EMPTY_ROOT)
+
+    def size(self) -> int:
+        return self.head()[0]
+
+    def root(self, tree_size: int = None) -> bytes:
+        """Current root, or the root the tree had at tree_size."""
+        size, current = self.head()
+        if tree_size is None or tree_size == size:
+            return current
+        self._check_size(tree_size, size)
+        return self.range_hashes([(0, tree_size)])[0]
+
+    @staticmethod
+    def _check_size(tree_size, size):
+        if not 0 <= tree_size <= size:
+            raise ValueError(f"tree_size must be between 0 and {size}")
+
+    @staticmethod
+    def _tiling(start: int, end: int):
+        # perfect subtrees covering [start, end), largest first; every range an
+        # RFC 6962 proof asks for is aligned this way
+        keys, offset = [], start
+        for level in range((end - start).bit_length() - 1, -1, -1):
+            if (end - start) >> level & 1:
+                keys.append((level, offset >> level))
+                offset += 1 << level
+        return keys
+
+    def range_hashes(self, ranges):
+        """Merkle root of each leaf range [lo, hi), all from stored nodes in one pass."""
+        tilings = [self._tiling(lo, hi) for lo, hi in ranges]
+        nodes = self.nodes({k for t in tilings for k in t})
+        return [fold_frontier([nodes[k] for k in t]) for t in tilings]
+
+    def nodes(self, keys, chunk: int = 400):
+        """{(level, idx): hash} for the given stored nodes."""
+        keys, out = list(keys), {}
+        by_level = {}
+        for level, idx in keys:
+            by_level.setdefault(level, []).append(idx)
+        # one primary-key range probe per level (row-value IN lists are not indexed)
+        for level, idxs in by_level.items():
+            for i in range(0, len(idxs), chunk):
+                part = idxs[i:i + chunk]
+                rows = query(self.path,
+                             f"SELECT idx, hash FROM merkle_nodes WHERE level=? AND idx IN ({','.join('?' * len(part))})",
+                             [level] + part)
+                out.update(((level, r[0]), r[1]) for r in rows)
+        missing = [k for k in keys if k not in out]
+        if missing:
+            raise KeyError(f"merkle nodes not stored: {missing[:5]}")
+        return out
+
+    def inclusion_proofs(self, leaf_indices, tree_size: int = None):
+        """{leaf_index: audit path} against the tree of tree_size leaves (default: current)."""
+        size = self.size()
+        tree_size = size if tree_size is None else tree_size
+        self._check_size(tree_size, size)
+        paths = {}
+        for i in leaf_indices:
+            if not 0 <= i < tree_size:
+                raise ValueError(f"leaf {i} is not in a tree of size {tree_size}")
+            paths[i] = audit_path_ranges(i, tree_size)
+        # neighbouring leaves share most of their siblings; fetch each once
+        ranges = sorted({r for p in paths.values() for r in p})
+        hashes = dict(zip(ranges, self.range_hashes(ranges)))
+        return {i: [hashes[r] for r in p] for i, p in paths.items()}
+
+    def inclusion_proof(self, leaf_index: int, tree_size: int = None):
+        return self.inclusion_proofs([leaf_index], tree_size)[leaf_index]
+
+    def consistency_proof(self, first: int, second: int = None):
+        size = self.size()
+        second = size if second is None else second
+        self._check_size(second, size)
+        if not 0 <= first <= second:
+            raise ValueError("first must be between 0 and second")
+        return self.range_hashes(consistency_ranges(first, second))
+
+    def leaf_index(self, action_id: int):
+        row = query_one(self.path, "SELECT leaf_index FROM merkle_leaves WHERE action_id=?", (action_id,))
+        return row[0] if row else None
+
+    def leaf_indices(self, action_ids, chunk: int = 500):
+        """{action_id: leaf_index} for the ids that are in the tree."""
+        action_ids, out = list(action_ids), {}
+        for i in range(0, len(action_ids), chunk):
+            part = action_ids[i:i + chunk]
+            rows = query(self.path,
+                         f"SELECT action_id, leaf_index FROM merkle_leaves "
+                         f"WHERE action_id IN ({','.join('?' * len(part))})", part)
+            out.update(rows)
+        return out
@@ -0,0 +1,97 @@
+# verifiable/builder.py
+# One-shot Merkle root over many leaves. Each tree level lives in a single
+# bytes buffer of fixed-size records, and a parent is hashed straight from a
+# memoryview slice of its two children, so there are no per-node string
+# objects or concatenations.
+#
+#   scheme="rfc6962"  32-byte digests, 0x00/0x01 domain separation, an
+#                     unpaired last node is promoted (same root as MerkleLog)
+#   scheme="legacy"   records are the 64-char ASCII hex digests merkle_root()
+#                     hashes, so a parent is sha256 of a 128-byte slice and
+#                     the unpaired last node is duplicated - same hex root as
+#                     verifiable.merkle.merkle_root()
+#
+# With workers > 1 the lower levels are built as independent aligned
+# subtrees in a process pool. Threads do not help here: hashlib only drops
+# the GIL for inputs of 2 KiB or more, and nodes are 64-129 bytes.
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+SCHEMES = ("rfc6962", "legacy")
+_sha256 = hashlib.sha256
+# records are hashed in blocks so at most BLOCK small bytes objects are alive
+BLOCK = 1 << 14
+
+
+def _encode(leaf) -> bytes:
+    return leaf.encode("utf-8") if isinstance(leaf, str) else bytes(leaf)
+
+
+def leaf_buffer(leaves, scheme: str = "rfc6962") -> bytes:
+    """The leaf level as one contiguous buffer of records."""
+    out = []
+    for start in range(0, len(leaves), BLOCK):
+        block = leaves[start:start + BLOCK]
+        if scheme == "rfc6962":
+            out.append(b"".join([_sha256(b"\x00" + _encode(l)).digest() for l in block]))
+        else:
+            out.append(b"".join([_sha256(_encode(l)).hexdigest().encode() for l in block]))
+    return b"".join(out)
+
+
+def reduce_levels(buf: bytes, scheme: str = "rfc6962", levels: int = None) -> bytes:
+    """Hash a level buffer upwards `levels` times (default: down to one record)."""
+    rec = 32 if scheme == "rfc6962" else 64
+    while (levels is None and len(buf) > rec) or (levels is not None and levels > 0):
+        n = len(buf) // rec
+        mv = memoryview(buf)
+        paired = n // 2 * 2 * rec
+        out = []
+        for start in range(0, paired, 2 * rec * BLOCK):
+            stop = min(start + 2 * rec * BLOCK, paired)
+            if scheme == "rfc6962":
+                out.append(b"".join([_sha256(b"\x01" + mv[i:i + 2 * rec]).digest()
+                                     for i in range(start, stop, 2 * rec)]))
+            else:
+                out.append(b"".join([_sha256(mv[i:i + 2 * rec]).hexdigest().encode()
+                                     for i in range(start, stop, 2 * rec)]))
+        if n % 2:
+            last = bytes(mv[paired:])
+            out.append(last if scheme == "rfc6962" else _sha256(last + last).hexdigest().encode())
+        mv.release()
+        buf = b"".join(out)
+        if levels is not None:
+            levels -= 1
+    return buf
+
+
+def _subtree(leaves, scheme, levels):
+    return reduce_levels(leaf_buffer(leaves, scheme), scheme, levels)
+
+
+def merkle_root_fast(leaves, scheme: str = "rfc6962", workers: int = 1, chunk_leaves: int = 1 << 17) -> str:
+    """Hex Merkle root of leaves (str or bytes) under `scheme`.
+
+    chunk_leaves must be a power of two; it is the subtree size handed to
+    each worker when workers > 1.
+    """
+    if scheme not in SCHEMES:
+        raise ValueError(f"scheme must be one of {SCHEMES}")
+    if chunk_leaves & (chunk_leaves - 1):
+        raise ValueError("chunk_leaves must be a power of two")
+    leaves = leaves if isinstance(leaves, (list, tuple)) else list(leaves)
+    if not leaves:
+        return hashlib.sha256(b"").hexdigest() if scheme == "rfc6962" else ""
+
+    if workers <= 1 or len(leaves) <= chunk_leaves:
+        buf = reduce_levels(leaf_buffer(leaves, scheme), scheme)
+    else:
+        # aligned subtrees of chunk_leaves leaves are independent; reducing each
+        # by exactly log2(chunk_leaves) levels yields the level above them
+        height = chunk_leaves.bit_length() - 1
+        chunks = [leaves[i:i + chunk_leaves] for i in range(0, len(leaves), chunk_leaves)]
+        with ProcessPoolExecutor(workers) as pool:
+            roots = pool.map(_subtree, chunks, [scheme] * len(chunks), [height] * len(chunks))
+            buf = reduce_levels(b"".join(roots), scheme)
+
+    return buf.hex() if scheme == "rfc6962" else buf.decode()
@@ -0,0 +1,238 @@
+# verifiable/epochs.py
+# Batch anchoring of receipts. Receipts issued while an epoch is open become
+# its leaves; the epoch is sealed after max_receipts leaves or max_seconds,
+# whichever comes first, with one RFC 6962 tree build. Each receipt carries
+# (epoch_id, leaf_index) and can later be checked against the sealed root
+# with an audit path.
+import atexit
+import hashlib
+import hmac
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from storage.sqlite import get_connection, query, query_one, transaction
+from verifiable.builder import merkle_root_fast
+from verifiable.merkle import audit_path_ranges, verify_inclusion
+
+log = logging.getLogger(__name__)
+
+
+def sign_epoch(key: str, epoch_id: int, size: int, root: str) -> str:
+    """HMAC-SHA256 over the sealed epoch header."""
+    msg = f"{epoch_id}:{size}:{root}".encode()
+    return hmac.new(key.encode(), msg, hashlib.sha256).hexdigest()
+
+
+class EpochAnchorer:
+    """Groups receipt leaves into epochs and seals each one into a signed root.
+
+    Several anchorers (one per API worker) can share a database file. Each
+    open epoch is leased to the anchorer filling it (owner + heartbeat_at,
+    refreshed every tick); an epoch whose lease has lapsed for
+    lease_seconds - its owner crashed or exited - is sealed by whichever
+    anchorer notices first, at startup or on a later tick. Leaves are
+    persisted as they arrive, so such an epoch loses nothing.
+
+    Lock order is always `lock` first, then the database write lock; callers
+    that anchor inside their own IMMEDIATE transaction must hold `lock`
+    before they begin it.
+    """
+
+    def __init__(self, path: str, max_receipts: int = 1000, max_seconds: float = 60.0,
+                 signing_key: str = None, tick: float = 1.0, lease_seconds: float = 30.0):
+        self.path = path
+        self.max_receipts = max_receipts
+        self.max_seconds = max_seconds
+        self.signing_key = signing_key
+        self.tick = tick
+        self.lease_seconds = max(lease_seconds, 3 * tick)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lock = threading.RLock()
+        self._epoch_id = None
+        self._leaves = []
+        self._opened = 0.0
+        self._beat = self._reaped = 0.0
+        self._stop = threading.Event()
+
+        self.seal_stale()
+
+        self._thread = threading.Thread(target=self._run, name="epoch-anchorer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---------------- writing ----------------
+    def add(self, leaf_hash: str, receipt_id: str = None):
+        """Put one receipt leaf (hex) into the open epoch; returns (epoch_id, leaf_index)."""
+        return self.add_many([leaf_hash], [receipt_id])[0]
+
+    def add_many(self, leaf_hashes, receipt_ids=None):
+        """Anchor many leaves in one transaction (joins the caller's, if any).
+
+        Epochs that fill up on the way are sealed in the same transaction.
+        Returns [(epoch_id, leaf_index)] in input order. A caller whose outer
+        transaction rolls back must call reload() afterwards.
+        """
+        receipt_ids = receipt_ids or [None] * len(leaf_hashes)
+        out = []
+        nested = get_connection(self.path).in_transaction
+        with self.lock:
+            try:
+                with transaction(self.path, immediate=True) as conn:
+                    if self._epoch_id is not None and not self._still_owned(conn):
+                        # sealed under us after our lease lapsed; its leaves are covered by that seal
+                        log.warning("anchor epoch %s was sealed by another anchorer", self._epoch_id)
+                        self._epoch_id, self._leaves = None, []
+                    i = 0
+                    while i < len(leaf_hashes):
+                        if self._epoch_id is None:
+                            now = time.time()
+                            self._epoch_id = conn.execute(
+                                "INSERT INTO anchor_epochs(opened_at, owner, heartbeat_at) VALUES (?,?,?)",
+                                (datetime.utcnow().isoformat(), self.owner, now)).lastrowid
+                            self._leaves = []
+                            self._opened = time.monotonic()
+                            self._beat = now
+                        base = len(self._leaves)
+                        take = min(self.max_receipts - base, len(leaf_hashes) - i)
+                        conn.executemany(
+                            "INSERT INTO anchor_leaves(epoch_id, leaf_index, leaf_hash, receipt_id) VALUES (?,?,?,?)",
+                            [(self._epoch_id, base + j, leaf_hashes[i + j], receipt_ids[i + j]) for j in range(take)])
+                        out += [(self._epoch_id, base + j) for j in range(take)]
+                        self._leaves += leaf_hashes[i:i + take]
+                        i += take
+                        if len(self._leaves) >= self.max_receipts:
+                            self._seal_open()
+            except BaseException:
+                if not nested:
+                    self.reload()
+                raise
+        return out
+
+    def _still_owned(self, conn):
+        row = conn.execute("SELECT closed_at IS NULL AND owner=? FROM anchor_epochs WHERE epoch_id=?",
+                           (self.owner, self._epoch_id)).fetchone()
+        return bool(row and row[0])
+
+    def reload(self):
+        """Re-read our open epoch from the database, e.g. after a rolled-back transaction."""
+        with self.lock:
+            row = query_one(self.path, "SELECT epoch_id FROM anchor_epochs WHERE closed_at IS NULL AND owner=? "
+                                       "ORDER BY epoch_id DESC LIMIT 1", (self.owner,))
+            self._epoch_id = row[0] if row else None
+            self._leaves = self._stored_leaves(self._epoch_id) if row else []
+            self._opened = time.monotonic()
+
+    def seal_due(self):
+        """Seal the open epoch if it has been open for max_seconds; otherwise renew its lease."""
+        with self.lock:
+            if self._epoch_id is None:
+                return
+            if time.monotonic() - self._opened >= self.max_seconds:
+                self._seal_open()
+            elif time.time() - self._beat >= self.lease_seconds / 3:
+                self._beat = time.time()
+                with transaction(self.path, immediate=True) as conn:
+                    conn.execute("UPDATE anchor_epochs SET heartbeat_at=? WHERE epoch_id=? AND owner=? "
+                                 "AND closed_at IS NULL", (self._beat, self._epoch_id, self.owner))
+
+    def seal_stale(self):
+        """Seal open epochs whose owner has not renewed its lease for lease_seconds; returns their ids."""
+        self._reaped = time.monotonic()
+        cutoff = time.time() - self.lease_seconds
+        rows = query(self.path, "SELECT epoch_id FROM anchor_epochs WHERE closed_at IS NULL "
+                                "AND (owner IS NULL OR heartbeat_at IS NULL OR heartbeat_at < ?)", (cutoff,))
+        return [epoch_id for (epoch_id,) in rows if self._seal(epoch_id, stale_before=cutoff)]
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(self.tick * 2)
+        with self.lock:
+            if self._epoch_id is not None:
+                self._seal_open()
+
+    def _seal_open(self):
+        self._seal(self._epoch_id, self._leaves)
+        self._epoch_id, self._leaves = None, []
+
+    def _seal(self, epoch_id, leaves=None, stale_before=None):
+        """Seal one open epoch: ours (leaves in hand), or a stale one (leaves read here).
+
+        Never touches an epoch that is already sealed - its root may be
+        published - nor, when reaping, one whose lease was renewed meanwhile.
+        Returns whether the epoch was sealed.
+        """
+        with transaction(self.path, immediate=True) as conn:
+            if stale_before is None:
+                claim, args = "owner=?", (self.owner,)
+            else:
+                claim, args = "(owner IS NULL OR heartbeat_at IS NULL OR heartbeat_at < ?)", (stale_before,)
+                leaves = [r[0] for r in conn.execute(
+                    "SELECT leaf_hash FROM anchor_leaves WHERE epoch_id=? ORDER BY leaf_index", (epoch_id,))]
+            # the one tree build this epoch costs
+            root = merkle_root_fast(leaves)
+            signature = sign_epoch(self.signing_key, epoch_id, len(leaves), root) if self.signing_key else None
+            sealed = conn.execute(
+                f"UPDATE anchor_epochs SET size=?, root=?, signature=?, closed_at=? "
+                f"WHERE epoch_id=? AND closed_at IS NULL AND {claim}",
+                (len(leaves), root, signature, datetime.utcnow().isoformat(), epoch_id) + args).rowcount
+        if not sealed and stale_before is None:
+            log.warning("anchor epoch %s was already sealed or is no longer ours; left as it is", epoch_id)
+        return bool(sealed)
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            try:
+                self.seal_due()
+                if time.monotonic() - self._reaped >= self.lease_seconds:
+                    self.seal_stale()
+            except Exception:
+                log.exception("sealing anchor epoch failed")
+
+    # ---------------- reading ----------------
+    def _stored_leaves(self, epoch_id):
+        rows = query(self.path, "SELECT leaf_hash FROM anchor_leaves WHERE epoch_id=? ORDER BY leaf_index",
+                     (epoch_id,))
+        return [r[0] for r in rows]
+
+    def epoch(self, epoch_id: int):
+        row = query_one(self.path, "SELECT epoch_id, size, root, signature, opened_at, closed_at "
+                                   "FROM anchor_epochs WHERE epoch_id=?", (epoch_id,))
+        if not row:
+            return None
+        return {
+            "epoch_id": row[0],
+            "size": row[1],
+            "root": row[2],
+            "signature": row[3],
+            "opened_at": row[4],
+            "closed_at": row[5],
+            "sealed": row[5] is not None
+        }
+
+    def proof(self, epoch_id: int, leaf_index: int):
+        """Audit path of a leaf in a sealed epoch, or None if the epoch is open or unknown."""
+        epoch = self.epoch(epoch_id)
+        if not epoch or not epoch["sealed"] or not 0 <= leaf_index < epoch["size"]:
+            return None
+        leaves = self._stored_leaves(epoch_id)
+        path = [merkle_root_fast(leaves[lo:hi]) for lo, hi in audit_path_ranges(leaf_index, len(leaves))]
+        return {**epoch, "leaf_index": leaf_index, "leaf_hash": leaves[leaf_index], "audit_path": path}
+
+    def verify(self, epoch_id: int, leaf_index: int, leaf_hash: str):
+        """True/False for a sealed epoch, None while it is still open."""
+        p = self.proof(epoch_id, leaf_index)
+        if p is None:
+            epoch = self.epoch(epoch_id)
+            return None if epoch and not epoch["sealed"] else False
+        if self.signing_key and not hmac.compare_digest(
+                p["signature"] or "", sign_epoch(self.signing_key, epoch_id, p["size"], p["root"])):
+            return False
+        return verify_inclusion(leaf_index, p["size"], leaf_hash,
+                                [bytes.fromhex(h) for h in p["audit_path"]], bytes.fromhex(p["root"]))
@@ -2,6 +2,8 @@ import hashlib
 import json
 from typing import List, Union
 
+from verifiable.builder import merkle_root_fast
+
 
 def sha256(data: Union[str, bytes, dict, list]) -> str:
     """Safe hashing for strings, bytes, dicts, lists."""
@@ -23,6 +25,10 @@ def merkle_root(leaves: List[Union[str, bytes]]) -> str:
     if not leaves:
         return ""
 
+    # plain str/bytes leaves take the buffer-based builder (same root)
+    if all(isinstance(l, (str, bytes)) for l in leaves):
+        return merkle_root_fast(leaves, scheme="legacy")
+
     # Normalize leaves into SHA hashes
     level = [sha256(l) for l in leaves]
 
@@ -40,3 +46,144 @@ def merkle_root(leaves: List[Union[str, bytes]]) -> str:
         level = new_level
 
     return level[0]
+
+
+# ------------------------------------------------------------
+# RFC 6962 (Certificate Transparency) hashing, used by the append-only
+# decision log in verifiable/accumulator.py. Digests are raw 32-byte values;
+# leaves and interior nodes are domain-separated so a leaf can never be
+# passed off as a node.
+# ------------------------------------------------------------
+EMPTY_ROOT = hashlib.sha256(b"").digest()
+
+
+def leaf_hash(leaf: Union[str, bytes]) -> bytes:
+    if isinstance(leaf, str):
+        leaf = leaf.encode("utf-8")
+    return hashlib.sha256(b"\x00" + leaf).digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def fold_frontier(frontier: List[bytes]) -> bytes:
+    """Root of a tree given its perfect subtrees, largest (leftmost) first."""
+    if not frontier:
+        return EMPTY_ROOT
+    root = frontier[-1]
+    for left in reversed(frontier[:-1]):
+        root = node_hash(left, root)
+    return root
+
+
+def _split(n: int) -> int:
+    # largest power of two strictly below n (n >= 2)
+    return 1 << ((n - 1).bit_length() - 1)
+
+
+def audit_path_ranges(leaf_index: int, tree_size: int):
+    """Leaf ranges [lo, hi) whose roots make up the RFC 6962 audit path, leaf to root."""
+    out, lo, hi = [], 0, tree_size
+    while hi - lo > 1:
+        k = _split(hi - lo)
+        if leaf_index < lo + k:
+            out.append((lo + k, hi))
+            hi = lo + k
+        else:
+            out.append((lo, lo + k))
+            lo += k
+    return out[::-1]
+
+
+def consistency_ranges(first: int, second: int):
+    """Leaf ranges whose roots make up the RFC 6962 consistency proof first -> second."""
+    def sub(m, lo, hi, whole):
+        if m == hi - lo:
+            return [] if whole else [(lo, hi)]
+        k = _split(hi - lo)
+        if m <= k:
+            return sub(m, lo, lo + k, whole) + [(lo + k, hi)]
+        return sub(m - k, lo + k, hi, False) + [(lo, lo + k)]
+
+    if first == 0 or first == second:
+        return []
+    return sub(first, 0, second, True)
+
+
+def verify_inclusions(root: bytes, tree_size: int, items):
+    """Check many (leaf_index, leaf, audit_path) against one root; returns a list of bools.
+
+    Nodes proven by earlier items are remembered, so an item stops hashing
+    as soon as it reaches a node already tied to the root: k leaves cost
+    about k * log(n / k) hashes instead of k * log(n).
+    """
+    known = {(0, tree_size): root}
+    results = []
+    for leaf_index, leaf, audit_path in items:
+        if not 0 <= leaf_index < tree_size:
+            results.append(False)
+            continue
+        siblings = audit_path_ranges(leaf_index, tree_size)
+        if len(audit_path) != len(siblings):
+            results.append(False)
+            continue
+
+        lo, hi = leaf_index, leaf_index + 1
+        node = leaf_hash(leaf)
+        seen = {}
+        ok = False
+        for i in range(len(siblings) + 1):
+            # (0, tree_size) is always known, so this ends at the root at the latest
+            if (lo, hi) in known:
+                ok = known[(lo, hi)] == node
+                break
+            seen[(lo, hi)] = node
+            (s_lo, s_hi), sibling = siblings[i], audit_path[i]
+            if s_lo < lo:
+                node, lo = node_hash(sibling, node), s_lo
+            else:
+                node, hi = node_hash(node, sibling), s_hi
+        if ok:
+            known.update(seen)
+        results.append(ok)
+    return results
+
+
+def verify_inclusion(leaf_index: int, tree_size: int, leaf, audit_path, root: bytes) -> bool:
+    return verify_inclusions(root, tree_size, [(leaf_index, leaf, audit_path)])[0]
+
+
+def verify_consistency(first: int, second: int, first_root: bytes, second_root: bytes, proof) -> bool:
+    """RFC 9162 section 2.1.4.2: is the tree of size `second` an append-only extension of `first`?"""
+    if first > second:
+        return False
+    if first == second:
+        return not proof and first_root == second_root
+    if first == 0:
+        return not proof
+    proof = list(proof)
+    if first & (first - 1) == 0:
+        proof = [first_root] + proof
+    if not proof:
+        return False
+    fn, sn = first - 1, second - 1
+    while fn & 1:
+        fn >>= 1
+        sn >>= 1
+    fr = sr = proof[0]
+    for c in proof[1:]:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            fr = node_hash(c, fr)
+            sr = node_hash(c, sr)
+            if not fn & 1:
+                while not fn & 1 and fn != 0:
+                    fn >>= 1
+                    sn >>= 1
+        else:
+            sr = node_hash(sr, c)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and fr == first_root and sr == second_root
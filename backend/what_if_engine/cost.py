@@ -0,0 +1,45 @@
+import numpy as np
+
+# per-feature actionability:
+#   mutable     - can the applicant change it at all
+#   bounds      - allowed range of the new value (None = open)
+#   max_change  - largest change the search will propose
+#   scale       - size of change that counts as one unit of effort
+DEFAULT_ACTIONABILITY = {
+    "income": {"mutable": True, "bounds": (0, None), "max_change": 300000, "scale": 20000},
+    "age": {"mutable": False},
+    "credit_score": {"mutable": True, "bounds": (300, 900), "max_change": 400, "scale": 50},
+    "spending_ratio": {"mutable": True, "bounds": (0.01, 1.0), "max_change": 0.7, "scale": 0.1},
+}
+
+
+class CostModel:
+    """Effort of moving from x to x + delta; subclass and override cost() to plug in another.
+
+    The default is the L2 norm of the per-feature deltas divided by their
+    scale, so spreading a change over several features is cheaper than
+    pushing one feature a long way. It scales linearly along a ray
+    (cost(t * delta) == t * cost(delta)), which the search relies on when
+    it shrinks a candidate back to the decision boundary.
+    """
+
+    def __init__(self, feature_names, actionability=None):
+        self.feature_names = list(feature_names)
+        spec = actionability or DEFAULT_ACTIONABILITY
+        self.spec = {f: spec.get(f, {"mutable": False}) for f in self.feature_names}
+        self.scale = np.array([self.spec[f].get("scale", 1.0) for f in self.feature_names],
+                              dtype=np.float64)
+
+    def mutable(self, feature) -> bool:
+        return bool(self.spec[feature].get("mutable", False))
+
+    def bounds(self, feature):
+        lo, hi = self.spec[feature].get("bounds", (None, None))
+        return (-np.inf if lo is None else lo, np.inf if hi is None else hi)
+
+    def max_change(self, feature) -> float:
+        return float(self.spec[feature].get("max_change", np.inf))
+
+    def cost(self, deltas: np.ndarray) -> np.ndarray:
+        """(n, d) deltas -> (n,) costs."""
+        return np.sqrt(((deltas / self.scale) ** 2).sum(axis=1))
@@ -1,49 +1,240 @@
-import pandas as pd
+import numpy as np
+
+from explain_service.model import DECISION_LABELS
+from what_if_engine.cost import CostModel
+
+# Extended ranges to ensure a flip
+SEARCH_SPACE = {
+    "income": range(0, 300000, 5000),        # up to 3 lakh
+    "credit_score": range(-200, 400, 20),     # explore negative & positive shifts
+    "spending_ratio": [-0.70, -0.60, -0.50, -0.40, -0.30, -0.20, -0.10],
+    "age": range(-5, 15, 2)                   # age shifts
+}
+
+# bisect mode: (min change, max change, resolution) per feature
+SEARCH_BOUNDS = {
+    "income": (0, 300000, 1),
+    "credit_score": (-200, 400, 1),
+    "spending_ratio": (-0.70, 0.0, 0.001),
+    "age": (-5, 15, 1)
+}
+
+SEARCH_MODES = ("bisect", "grid")
+
+
+def apply_change(feature: str, value: float, adj: float) -> float:
+    new_value = value + adj
+    # SPECIAL CASES
+    if feature == "spending_ratio":
+        return 0.01 if new_value <= 0 else new_value
+    return 0 if new_value < 0 else new_value
+
 
 class WhatIfEngine:
     def __init__(self, model):
         self.model = model
+        self.feature_index = {f: i for i, f in enumerate(model.feature_names)}
+
+    def _counterfactual(self, input_data: dict, feature: str, adj, code: int):
+        new = input_data.copy()
+        new[feature] = apply_change(feature, new[feature], adj)
+        return {
+            "changed_feature": feature,
+            "change": adj,
+            "new_input": new,
+            "new_prediction": DECISION_LABELS[code]
+        }
 
-    def search_counterfactuals(self, input_data: dict):
-        df = pd.DataFrame([input_data])
-        original_pred = self.model.predict(df)[0]
+    def search_counterfactuals(self, input_data: dict, mode: str = "bisect"):
+        """Smallest single-feature change that flips the decision, per feature.
 
-        counterfactuals = []
+        mode="bisect" uses the model's monotone direction for each feature to
+        bisect to the exact flip point (at SEARCH_BOUNDS resolution) in
+        O(log n) batched model calls. mode="grid" walks SEARCH_SPACE, scoring
+        every probe in one batch. Models without monotone_directions always
+        use the grid.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+        if mode == "bisect" and getattr(self.model, "monotone_directions", None):
+            return self._search_bisect(input_data)
+        return self._search_grid(input_data)
 
-        # Extended ranges to ensure a flip
-        search_space = {
-            "income": range(0, 300000, 5000),        # up to 3 lakh
-            "credit_score": range(-200, 400, 20),     # explore negative & positive shifts
-            "spending_ratio": [-0.70, -0.60, -0.50, -0.40, -0.30, -0.20, -0.10],
-            "age": range(-5, 15, 2)                   # age shifts
-        }
+    def _search_grid(self, input_data: dict):
+        x0 = self.model.to_matrix(input_data)[0]
+        original_code = self.model.predict_codes(x0)[0]
 
-        for feature, adjustments in search_space.items():
+        probes, owners = [], []
+        for feature, adjustments in SEARCH_SPACE.items():
+            j = self.feature_index[feature]
             for adj in adjustments:
-                new = input_data.copy()
-
-                # SPECIAL CASES
-                if feature == "spending_ratio":
-                    new_value = new[feature] + adj
-                    if new_value <= 0: 
-                        new_value = 0.01
-                    new[feature] = new_value
-                else:
-                    new_value = new[feature] + adj
-                    if new_value < 0:
-                        new_value = 0
-                    new[feature] = new_value
-
-                df_new = pd.DataFrame([new])
-                new_pred = self.model.predict(df_new)[0]
-
-                if new_pred != original_pred:
-                    counterfactuals.append({
-                        "changed_feature": feature,
-                        "change": adj,
-                        "new_input": new,
-                        "new_prediction": new_pred
-                    })
-                    break   # stop searching further for this feature
+                row = x0.copy()
+                row[j] = apply_change(feature, x0[j], adj)
+                probes.append(row)
+                owners.append((feature, adj))
+        codes = self.model.predict_codes(np.array(probes))
 
+        counterfactuals = []
+        found = set()
+        for (feature, adj), code in zip(owners, codes):
+            if feature not in found and code != original_code:
+                found.add(feature)   # stop searching further for this feature
+                counterfactuals.append(self._counterfactual(input_data, feature, adj, code))
         return counterfactuals
+
+    def _search_bisect(self, input_data: dict):
+        x0 = self.model.to_matrix(input_data)[0]
+        original_code = self.model.predict_codes(x0)[0]
+        # denied -> push the score up, approved -> push it down
+        push = 1 if original_code == 0 else -1
+
+        features, cols, steps, res, hi = [], [], [], [], []
+        for feature, (lo_adj, hi_adj, resolution) in SEARCH_BOUNDS.items():
+            direction = push * self.model.monotone_directions.get(feature, 0)
+            limit = hi_adj if direction > 0 else lo_adj
+            n = int(round(abs(limit) / resolution))
+            if direction == 0 or n == 0:
+                continue
+            features.append(feature)
+            cols.append(self.feature_index[feature])
+            steps.append(direction * resolution)
+            res.append(resolution)
+            hi.append(n)
+        if not features:
+            return []
+
+        cols = np.array(cols)
+        steps = np.array(steps, dtype=np.float64)
+        hi = np.array(hi)
+
+        def probe(k):
+            # one row per feature, that feature moved by k steps
+            rows = np.repeat(x0[None, :], len(k), axis=0)
+            for i, j in enumerate(cols):
+                rows[i, j] = apply_change(features[i], x0[j], k[i] * steps[i])
+            return self.model.predict_codes(rows)
+
+        # features whose full-range change does not flip are dropped up front
+        flips = probe(hi) != original_code
+        lo = np.zeros_like(hi)
+        # invariant: lo steps keeps the decision, hi steps flips it
+        while True:
+            active = flips & (hi - lo > 1)
+            if not active.any():
+                break
+            mid = np.where(active, (lo + hi) // 2, hi)
+            moved = probe(mid) != original_code
+            hi = np.where(active & moved, mid, hi)
+            lo = np.where(active & ~moved, mid, lo)
+
+        counterfactuals = []
+        for i, feature in enumerate(features):
+            if not flips[i]:
+                continue
+            adj = hi[i] * steps[i]
+            adj = int(adj) if float(res[i]).is_integer() else round(float(adj), 6)
+            counterfactuals.append(
+                self._counterfactual(input_data, feature, adj, 1 - original_code))
+        return counterfactuals
+
+    def search_joint_counterfactuals(self, input_data: dict, k: int = 3, max_features: int = 3,
+                                     cost_model: CostModel = None, levels: int = 12,
+                                     chunk: int = 512):
+        """Top-k cheapest counterfactuals that may change several features at once.
+
+        Candidates come from a per-feature grid over the actionable range.
+        Immutable features and bounds come from the cost model. Candidates
+        are scored in cost order, chunk by chunk, and the walk stops once k
+        distinct sets of changed features are found and the next chunk is
+        already dearer. Each survivor is then shrunk along its ray back to
+        the decision boundary by a batched bisection.
+        """
+        if k < 1 or max_features < 1:
+            raise ValueError("k and max_features must be >= 1")
+        cost_model = cost_model or CostModel(self.model.feature_names)
+        features = self.model.feature_names
+        x0 = self.model.to_matrix(input_data)[0]
+        original_code = self.model.predict_codes(x0)[0]
+        push = 1 if original_code == 0 else -1
+        directions = getattr(self.model, "monotone_directions", None)
+
+        axes = []
+        for j, feature in enumerate(features):
+            if not cost_model.mutable(feature):
+                axes.append(np.zeros(1))
+                continue
+            lo, hi = cost_model.bounds(feature)
+            cap = cost_model.max_change(feature)
+            reach = {1: max(0.0, min(cap, hi - x0[j])), -1: -max(0.0, min(cap, x0[j] - lo))}
+            if directions:
+                sign = push * directions.get(feature, 0)
+                reach = {sign: reach[sign]} if sign else {}
+            grid = [np.zeros(1)]
+            grid += [r * np.arange(1, levels + 1) / levels for r in reach.values() if r != 0]
+            axes.append(np.concatenate(grid))
+
+        mesh = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, len(features))
+        n_changed = (mesh != 0).sum(axis=1)
+        mesh = mesh[(n_changed > 0) & (n_changed <= max_features)]
+        if not len(mesh):
+            return []
+        costs = cost_model.cost(mesh)
+        order = np.argsort(costs, kind="stable")
+
+        # cheapest grid candidate per distinct set of changed features
+        best = {}
+        for start in range(0, len(order), chunk):
+            idx = order[start:start + chunk]
+            if len(best) >= k and costs[idx[0]] > sorted(c for c, _ in best.values())[k - 1]:
+                break
+            codes = self.model.predict_codes(x0 + mesh[idx])
+            for i in idx[codes != original_code]:
+                support = tuple(mesh[i] != 0)
+                if support not in best:
+                    best[support] = (costs[i], mesh[i])
+        if not best:
+            return []
+
+        deltas = self._shrink_to_boundary(x0, np.array([d for _, d in best.values()]), original_code)
+        deltas = self._round_deltas(x0, deltas, cost_model)
+        flipped = self.model.predict_codes(x0 + deltas) != original_code
+        deltas = deltas[flipped]
+        final_costs = cost_model.cost(deltas)
+
+        counterfactuals = []
+        for i in np.argsort(final_costs, kind="stable")[:k]:
+            changes = {f: round(deltas[i, j].item(), 6) for j, f in enumerate(features) if deltas[i, j] != 0}
+            new = input_data.copy()
+            for f, adj in changes.items():
+                new[f] = round(new[f] + adj, 6)
+            counterfactuals.append({
+                "changed_features": list(changes),
+                "changes": changes,
+                "new_input": new,
+                "new_prediction": DECISION_LABELS[1 - original_code],
+                "cost": round(float(final_costs[i]), 6)
+            })
+        return counterfactuals
+
+    def _shrink_to_boundary(self, x0, deltas, original_code, iterations=24):
+        # smallest t in (0, 1] such that x0 + t * delta still flips; all rows bisected together
+        lo = np.zeros(len(deltas))
+        hi = np.ones(len(deltas))
+        for _ in range(iterations):
+            mid = (lo + hi) / 2
+            moved = self.model.predict_codes(x0 + mid[:, None] * deltas) != original_code
+            hi = np.where(moved, mid, hi)
+            lo = np.where(moved, lo, mid)
+        return hi[:, None] * deltas
+
+    def _round_deltas(self, x0, deltas, cost_model):
+        # round magnitudes up to SEARCH_BOUNDS resolution, keeping the flip and the bounds
+        out = deltas.copy()
+        for j, feature in enumerate(self.model.feature_names):
+            resolution = SEARCH_BOUNDS.get(feature, (0, 0, None))[2]
+            if resolution:
+                out[:, j] = np.sign(out[:, j]) * np.ceil(np.round(np.abs(out[:, j]) / resolution, 9)) * resolution
+            lo, hi = cost_model.bounds(feature)
+            out[:, j] = np.clip(x0[j] + out[:, j], lo, hi) - x0[j]
+            out[deltas[:, j] == 0, j] = 0
+        return out